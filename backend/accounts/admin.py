@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import CustomerProfile, EmailVerificationCode
+from .models import CustomerProfile, EmailVerificationCode, OutboxEmail
 
 
 @admin.register(CustomerProfile)
@@ -14,3 +14,11 @@ class EmailVerificationCodeAdmin(admin.ModelAdmin):
     list_display = ("user", "code", "used", "created_at", "expires_at")
     search_fields = ("user__email", "code")
     list_filter = ("used",)
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ("to_email", "subject", "status", "attempts", "next_attempt_at", "sent_at")
+    search_fields = ("to_email",)
+    list_filter = ("status",)
+    readonly_fields = ("claim_token", "created_at", "sent_at")
@@ -0,0 +1,91 @@
+"""
+Purging of expired rows that nothing else deletes.
+
+Verification codes, trusted devices, sessions and sent outbox emails only
+ever accumulate; ``purge_expired`` removes the ones past their retention.
+Other apps add their own tables with ``register`` from a ``housekeeping``
+module of their own, which ``purge_expired`` imports (as the admin does
+with ``admin`` modules).
+
+Each table is emptied in small batches, each deleted in its own short
+transaction, so the purge holds row locks briefly and can run alongside
+live traffic (``manage.py purge_expired --loop``). A row is only deleted if
+it still matches when its batch is deleted, so one refreshed meanwhile is
+kept. Trusted devices are judged by ``last_used_at``, which trusted
+sign-ins keep current (see ``accounts.models.record_device_use``).
+"""
+
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from .models import EmailVerificationCode, OutboxEmail, TrustedDevice
+
+# label -> (model, function of "now" returning the expiry condition)
+_registry = {}
+
+
+def register(label, model, expired):
+    """Purge ``model`` rows matching ``expired(now)`` (a Q) as ``label``."""
+    _registry[label] = (model, expired)
+
+
+register(
+    "verification codes",
+    EmailVerificationCode,
+    # Used codes expire too, within minutes of being created.
+    lambda now: Q(
+        expires_at__lt=now - timedelta(hours=settings.VERIFICATION_CODE_RETENTION_HOURS)
+    ),
+)
+register(
+    "trusted devices",
+    TrustedDevice,
+    lambda now: Q(
+        last_used_at__lt=now - timedelta(days=settings.TRUSTED_DEVICE_RETENTION_DAYS)
+    ),
+)
+register("sessions", Session, lambda now: Q(expire_date__lt=now))
+register(
+    "outbox emails",
+    OutboxEmail,
+    lambda now: Q(
+        status__in=[OutboxEmail.STATUS_SENT, OutboxEmail.STATUS_FAILED],
+        created_at__lt=now - timedelta(days=settings.OUTBOX_EMAIL_RETENTION_DAYS),
+    ),
+)
+
+
+def purge_in_batches(model, condition, batch_size=1000, pause=0.0):
+    """Delete ``model`` rows matching ``condition``; returns how many."""
+    expired = model.objects.filter(condition)
+    deleted = 0
+    while True:
+        ids = list(expired.values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        with transaction.atomic():
+            count, _ = expired.filter(pk__in=ids).delete()
+        deleted += count
+        if len(ids) < batch_size:
+            return deleted
+        if pause:
+            time.sleep(pause)
+
+
+def purge_expired(batch_size=1000, pause=0.0, log=None) -> dict[str, int]:
+    """Purge every registered table; returns rows deleted per table label."""
+    autodiscover_modules("housekeeping")
+    now = timezone.now()
+    stats = {}
+    for label, (model, expired) in _registry.items():
+        stats[label] = purge_in_batches(model, expired(now), batch_size, pause)
+        if log:
+            log(f"Purged {stats[label]} {label}.")
+    return stats
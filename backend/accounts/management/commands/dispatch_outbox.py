@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.outbox import dispatch_outbox
+
+
+class Command(BaseCommand):
+    help = "Send queued outbox emails over one SMTP connection per batch."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--loop", action="store_true", help="Keep polling for new messages."
+        )
+        parser.add_argument(
+            "--interval", type=float, default=2.0, help="Seconds between polls."
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = dispatch_outbox(limit=options["batch_size"])
+            if sent or failed:
+                self.stdout.write(f"Sent {sent} email(s), {failed} failed.")
+            if not options["loop"]:
+                return
+            if sent + failed < options["batch_size"]:
+                time.sleep(options["interval"])
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts.housekeeping import purge_expired
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete expired verification codes, stale trusted devices, expired "
+        "sessions, old outbox emails and other apps' registered expired rows, "
+        "in batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--pause",
+            type=float,
+            default=0.0,
+            help="Seconds to wait between batches, to spread out the load.",
+        )
+        parser.add_argument(
+            "--loop", action="store_true", help="Purge again every --interval seconds."
+        )
+        parser.add_argument(
+            "--interval", type=float, default=3600.0, help="Seconds between purges."
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            stats = purge_expired(
+                batch_size=options["batch_size"],
+                pause=options["pause"],
+                log=self.stdout.write if options["verbosity"] > 1 else None,
+            )
+            self.stdout.write(
+                f"Purged {sum(stats.values())} row(s): "
+                + ", ".join(f"{count} {label}" for label, count in stats.items())
+                + "."
+            )
+            if not options["loop"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Index
+from django.db.models.functions import Lower
+
+# auth_user belongs to django.contrib.auth, so its indexes for
+# accounts.models.find_user() are added here rather than in a model's Meta.
+# This runs after auth's own migrations: on SQLite those rebuild the table,
+# which would drop indexes Django's model state does not know about.
+USER_LOOKUP_INDEXES = [
+    Index(Lower("email"), name="auth_user_email_lower"),
+    Index(Lower("username"), name="auth_user_username_lower"),
+]
+
+
+def add_indexes(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    for index in USER_LOOKUP_INDEXES:
+        schema_editor.add_index(User, index)
+
+
+def remove_indexes(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    for index in USER_LOOKUP_INDEXES:
+        schema_editor.remove_index(User, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_outbox_email'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_indexes, remove_indexes),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:51
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_user_lookup_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='emailverificationcode',
+            index=models.Index(fields=['expires_at'], name='email_code_expires'),
+        ),
+        migrations.AddIndex(
+            model_name='trusteddevice',
+            index=models.Index(fields=['last_used_at'], name='trusted_device_last_used'),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0007_housekeeping_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='emailverificationcode',
+            index=models.Index(fields=['user', 'purpose', 'code', '-created_at'], name='email_code_lookup'),
+        ),
+    ]
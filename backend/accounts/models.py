@@ -1,18 +1,83 @@
 from datetime import timedelta
+import atexit
+import hashlib
+import logging
 import random
+import re
+import threading
 import uuid
 
 from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.validators import RegexValidator
-from django.db import models
+from django.db import close_old_connections, models, transaction
+from django.db.models import Case, Q, Subquery, Value, When
+from django.db.models.functions import Lower
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils import timezone
 
+logger = logging.getLogger(__name__)
+
+
+GHANA_PHONE_REGEX = r"^(\+233|0)\d{9}$"
 
 ghana_phone_validator = RegexValidator(
-    regex=r"^(\+233|0)\d{9}$",
+    regex=GHANA_PHONE_REGEX,
     message="Enter a valid Ghana phone number (e.g., +233241234567 or 0241234567).",
 )
 
+_PHONE_SEPARATORS = re.compile(r"[\s\-().]")
+
+
+def normalize_ghana_phone(value):
+    """
+    Canonical ``+233XXXXXXXXX`` form of a Ghana number, or None.
+
+    Accepts what ghana_phone_validator accepts, after dropping spaces,
+    dashes, dots and brackets, so ``024 123 4567`` and ``+233 24-123-4567``
+    normalize to the same value.
+    """
+    if not value:
+        return None
+    compact = _PHONE_SEPARATORS.sub("", value)
+    if not re.match(GHANA_PHONE_REGEX, compact):
+        return None
+    return "+233" + compact[-9:]
+
+
+def find_user(identifier, fields=("email", "username")):
+    """
+    The user whose ``fields`` match ``identifier`` case-insensitively, or None.
+
+    One query, served by the ``LOWER(email)`` and ``LOWER(username)``
+    indexes from migration 0006 (plain indexes cannot serve ``iexact``).
+    When several users match, an earlier field wins (an email match beats a
+    username match), then the oldest account.
+    """
+    identifier = (identifier or "").strip().lower()
+    if not identifier:
+        return None
+    matches = Q()
+    for field in fields:
+        matches |= Q(**{f"{field}_lower": identifier})
+    return (
+        get_user_model()
+        .objects.annotate(**{f"{field}_lower": Lower(field) for field in fields})
+        .filter(matches)
+        .order_by(
+            Case(
+                *(
+                    When(**{f"{field}_lower": identifier}, then=Value(position))
+                    for position, field in enumerate(fields)
+                )
+            ),
+            "pk",
+        )
+        .first()
+    )
+
 
 class CustomerProfile(models.Model):
     GENDER_MALE = "male"
@@ -64,6 +129,14 @@ class EmailVerificationCode(models.Model):
     expires_at = models.DateTimeField()
     used = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["user", "purpose", "code", "-created_at"], name="email_code_lookup"
+            ),
+            models.Index(fields=["expires_at"], name="email_code_expires"),
+        ]
+
     @staticmethod
     def generate_code() -> str:
         return f"{random.randint(0, 999999):06d}"
@@ -88,6 +161,25 @@ class EmailVerificationCode(models.Model):
             expires_at=timezone.now() + timedelta(minutes=ttl_minutes),
         )
 
+    @classmethod
+    def consume(cls, user, code: str, purpose: str, challenge_token=None) -> bool:
+        """
+        Mark the newest live ``code`` for ``user`` and ``purpose`` used.
+
+        A single conditional UPDATE, so of two concurrent requests with the
+        same code only one gets True. ``challenge_token``, when given, must
+        match the one the code was issued with.
+        """
+        live = cls.objects.filter(
+            user=user, purpose=purpose, code=code, used=False, expires_at__gte=timezone.now()
+        )
+        if challenge_token is not None:
+            live = live.filter(challenge_token=challenge_token)
+        newest = live.order_by("-created_at").values("pk")[:1]
+        # used=False is repeated on the outer query so that a request which
+        # waited for a concurrent one's row lock re-checks it and misses.
+        return cls.objects.filter(pk__in=Subquery(newest), used=False).update(used=True) == 1
+
     def is_valid(self) -> bool:
         return (not self.used) and self.expires_at >= timezone.now()
 
@@ -108,6 +200,142 @@ class TrustedDevice(models.Model):
 
     class Meta:
         unique_together = ("user", "device_id")
+        indexes = [
+            models.Index(fields=["last_used_at"], name="trusted_device_last_used"),
+        ]
 
     def __str__(self):
         return f"{self.user.email} - {self.device_id}"
+
+    @staticmethod
+    def cache_key(user_id, device_id: str) -> str:
+        digest = hashlib.sha256(device_id.encode()).hexdigest()
+        return f"trusted-device:{user_id}:{digest}"
+
+    @classmethod
+    def lookup(cls, user, device_id: str):
+        """
+        pk of ``user``'s trusted device ``device_id``, or None.
+
+        Hits are cached for TRUSTED_DEVICE_CACHE_TIMEOUT and invalidated when
+        the device is deleted. Misses are not cached, so a device trusted a
+        moment ago is found straight away.
+        """
+        key = cls.cache_key(user.pk, device_id)
+        pk = cache.get(key)
+        if pk is None:
+            pk = (
+                cls.objects.filter(user=user, device_id=device_id)
+                .values_list("pk", flat=True)
+                .first()
+            )
+            if pk is not None:
+                cache.set(key, pk, timeout=settings.TRUSTED_DEVICE_CACHE_TIMEOUT)
+        return pk
+
+
+@receiver(post_save, sender=TrustedDevice)
+@receiver(post_delete, sender=TrustedDevice)
+def _invalidate_trusted_device(sender, instance, **kwargs):
+    key = TrustedDevice.cache_key(instance.user_id, instance.device_id)
+    # Again after commit, so a lookup that read the old row before commit
+    # cannot leave it cached.
+    cache.delete(key)
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+# Sign-ins from trusted devices record when each device was last used.
+# Rather than writing a row per sign-in, uses are collected here, one entry
+# per device, and written in one bulk UPDATE by a timer thread
+# TRUSTED_DEVICE_USAGE_FLUSH_INTERVAL seconds after the first use buffered
+# (per process), and again when the process exits. Only a crash loses
+# timestamps, at most one interval's worth.
+_device_usage = {}
+_device_usage_lock = threading.Lock()
+_device_usage_timer = None
+
+
+def record_device_use(device_pk):
+    global _device_usage_timer
+    with _device_usage_lock:
+        _device_usage[device_pk] = timezone.now()
+        if _device_usage_timer is None:
+            _device_usage_timer = threading.Timer(
+                settings.TRUSTED_DEVICE_USAGE_FLUSH_INTERVAL, _flush_device_usage_in_thread
+            )
+            _device_usage_timer.daemon = True
+            _device_usage_timer.start()
+
+
+def _flush_device_usage_in_thread():
+    close_old_connections()
+    try:
+        flush_device_usage()
+    except Exception:
+        logger.exception("Flushing trusted device usage failed")
+    finally:
+        close_old_connections()
+
+
+def flush_device_usage() -> int:
+    """Write buffered ``last_used_at`` values; returns how many devices."""
+    global _device_usage_timer
+    with _device_usage_lock:
+        pending = dict(_device_usage)
+        _device_usage.clear()
+        if _device_usage_timer is not None:
+            _device_usage_timer.cancel()
+            _device_usage_timer = None
+    if pending:
+        # bulk_update() skips auto_now, so the buffered times are kept.
+        # Devices deleted meanwhile simply match no row.
+        TrustedDevice.objects.bulk_update(
+            [TrustedDevice(pk=pk, last_used_at=used_at) for pk, used_at in pending.items()],
+            ["last_used_at"],
+            batch_size=500,
+        )
+    return len(pending)
+
+
+atexit.register(_flush_device_usage_in_thread)
+
+
+class OutboxEmail(models.Model):
+    """
+    An email waiting to be sent by accounts.outbox.
+
+    Rows are written in the same transaction as whatever they announce, so
+    a code is never mailed for a request that rolled back, and requests
+    never wait on the mail server.
+    """
+
+    STATUS_PENDING = "pending"
+    STATUS_SENT = "sent"
+    STATUS_FAILED = "failed"
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "Pending"),
+        (STATUS_SENT, "Sent"),
+        (STATUS_FAILED, "Failed"),
+    ]
+
+    to_email = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # When a dispatcher may next pick the row up; also pushed forward while
+    # one is sending it, so a crashed dispatcher's rows are retried later.
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim_token = models.CharField(max_length=32, blank=True, default="")
+    last_error = models.TextField(blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt_at"], name="outbox_email_due"),
+        ]
+
+    def __str__(self):
+        return f"{self.to_email}: {self.subject} ({self.status})"
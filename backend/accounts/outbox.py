@@ -0,0 +1,184 @@
+"""
+Transactional email outbox.
+
+Views call ``queue_email`` inside their transaction instead of sending mail
+themselves; ``dispatch_outbox`` later sends everything due over a single
+SMTP connection. Work is picked up either by an in-process thread right
+after the request commits (``EMAIL_OUTBOX_DISPATCH = "thread"``) or by the
+``dispatch_outbox`` management command (``"queue"``).
+
+Each batch is claimed with a conditional UPDATE that pushes the rows'
+``next_attempt_at`` forward, so several dispatchers can run at once without
+sending a message twice, and rows held by a dispatcher that died become due
+again once the lease runs out. In thread mode, a dispatch that leaves
+messages waiting for a retry re-arms itself with a timer for the earliest
+one. Timers do not survive a restart; messages left waiting by a stopped
+process go out with the next dispatch, or run the command as well.
+"""
+
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+# How long a dispatcher may hold a batch before others may retry it.
+CLAIM_LEASE = timedelta(minutes=5)
+MAX_RETRY_DELAY = timedelta(hours=1)
+
+_executor = None
+_timer = None
+_timer_lock = threading.Lock()
+
+
+def queue_email(to_email: str, subject: str, body: str) -> OutboxEmail:
+    message = OutboxEmail.objects.create(to_email=to_email, subject=subject, body=body)
+    schedule_dispatch()
+    return message
+
+
+def _submit():
+    global _executor
+    if _executor is None:
+        # One thread: a single SMTP connection is enough, and messages
+        # queued meanwhile are picked up by the same run.
+        _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="email-outbox")
+    _executor.submit(_dispatch_in_thread)
+
+
+def schedule_dispatch(delay: float = 0):
+    if settings.EMAIL_OUTBOX_DISPATCH != "thread":
+        return
+    if delay:
+        _start_timer(delay)
+    else:
+        transaction.on_commit(_submit)
+
+
+def _start_timer(delay: float):
+    # One timer per process, for the earliest retry: a later one is dropped,
+    # an earlier one replaces it.
+    global _timer
+    fire_at = time.monotonic() + delay
+    with _timer_lock:
+        if _timer is not None and _timer.is_alive() and _timer.fire_at <= fire_at:
+            return
+        if _timer is not None:
+            _timer.cancel()
+        _timer = threading.Timer(delay, _submit)
+        _timer.fire_at = fire_at
+        _timer.daemon = True
+        _timer.start()
+
+
+def _dispatch_in_thread():
+    close_old_connections()
+    try:
+        dispatch_outbox()
+        _rearm()
+    except Exception:
+        logger.exception("Email outbox dispatch failed")
+    finally:
+        close_old_connections()
+
+
+def _rearm():
+    """Schedule the next dispatch for the earliest message still waiting."""
+    next_at = (
+        OutboxEmail.objects.filter(status=OutboxEmail.STATUS_PENDING)
+        .order_by("next_attempt_at")
+        .values_list("next_attempt_at", flat=True)
+        .first()
+    )
+    if next_at is not None:
+        delay = (next_at - timezone.now()).total_seconds()
+        schedule_dispatch(delay=max(delay, 1))
+
+
+def retry_delay(attempts: int) -> timedelta:
+    delay = timedelta(seconds=settings.EMAIL_OUTBOX_RETRY_DELAY * 2 ** (attempts - 1))
+    return min(delay, MAX_RETRY_DELAY)
+
+
+def _claim(limit: int):
+    now = timezone.now()
+    due = OutboxEmail.objects.filter(
+        status=OutboxEmail.STATUS_PENDING, next_attempt_at__lte=now
+    )
+    ids = list(due.order_by("next_attempt_at", "pk").values_list("pk", flat=True)[:limit])
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    due.filter(pk__in=ids).update(claim_token=token, next_attempt_at=now + CLAIM_LEASE)
+    return list(OutboxEmail.objects.filter(claim_token=token).order_by("pk"))
+
+
+def _record_failure(message, error):
+    message.attempts += 1
+    message.last_error = str(error)[:2000] or error.__class__.__name__
+    if message.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        message.status = OutboxEmail.STATUS_FAILED
+        logger.error("Giving up on outbox email %s: %s", message.pk, message.last_error)
+    else:
+        message.next_attempt_at = timezone.now() + retry_delay(message.attempts)
+    message.save(update_fields=["attempts", "last_error", "status", "next_attempt_at"])
+
+
+def dispatch_outbox(limit: int = 100) -> tuple[int, int]:
+    """
+    Send up to ``limit`` due messages over one SMTP connection.
+
+    Returns ``(sent, failed)``; failed messages are rescheduled with
+    exponential backoff, or marked failed after EMAIL_OUTBOX_MAX_ATTEMPTS.
+    """
+    messages = _claim(limit)
+    if not messages:
+        return 0, 0
+
+    sent = failed = 0
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as exc:
+        # The server is unreachable: every claimed message waits for a retry.
+        for message in messages:
+            _record_failure(message, exc)
+        return 0, len(messages)
+
+    try:
+        for message in messages:
+            try:
+                EmailMessage(
+                    subject=message.subject,
+                    body=message.body,
+                    to=[message.to_email],
+                    connection=connection,
+                ).send()
+            except Exception as exc:
+                failed += 1
+                _record_failure(message, exc)
+                # Start the next message on a fresh connection in case this
+                # one was dropped.
+                connection.close()
+                try:
+                    connection.open()
+                except Exception:
+                    pass
+                continue
+            message.status = OutboxEmail.STATUS_SENT
+            message.sent_at = timezone.now()
+            message.save(update_fields=["status", "sent_at"])
+            sent += 1
+    finally:
+        connection.close()
+    return sent, failed
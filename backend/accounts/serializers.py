@@ -1,9 +1,12 @@
-from django.contrib.auth import authenticate, get_user_model
+from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.contrib.auth.password_validation import validate_password
 from django.core.validators import RegexValidator
 from rest_framework import serializers
 
-from .models import CustomerProfile, EmailVerificationCode
+from senderplus_core.images import compact_image
+
+from .models import CustomerProfile, EmailVerificationCode, find_user
 
 User = get_user_model()
 
@@ -58,6 +61,11 @@ class CustomerProfileSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ["email_verified"]
 
+    def validate_profile_picture(self, value):
+        if not value:
+            return value
+        return compact_image(value, settings.PROFILE_PICTURE_MAX_DIMENSION)
+
     def update(self, instance, validated_data):
         user_data = validated_data.pop("user", {})
         for attr, value in validated_data.items():
@@ -91,7 +99,7 @@ class SignupSerializer(serializers.Serializer):
 
     def validate_username(self, value):
         username = value.strip()
-        if User.objects.filter(username__iexact=username).exists():
+        if find_user(username, fields=("username",)):
             raise serializers.ValidationError(
                 "An account with this username already exists."
             )
@@ -99,7 +107,7 @@ class SignupSerializer(serializers.Serializer):
 
     def validate_email(self, value):
         email = value.lower().strip()
-        if User.objects.filter(email__iexact=email).exists():
+        if find_user(email, fields=("email",)):
             raise serializers.ValidationError(
                 "An account with this email already exists."
             )
@@ -139,13 +147,13 @@ class SigninSerializer(serializers.Serializer):
         if not identifier:
             raise serializers.ValidationError("Username or email is required.")
 
-        matched_user = (
-            User.objects.filter(email__iexact=identifier).first()
-            or User.objects.filter(username__iexact=identifier).first()
-        )
-        username = matched_user.get_username() if matched_user else identifier
-        user = authenticate(username=username, password=password)
-        if not user:
+        user = find_user(identifier)
+        if user is None:
+            # Hash anyway, as ModelBackend does, so response times do not
+            # reveal which identifiers exist.
+            User().set_password(password)
+            raise serializers.ValidationError("Invalid email or password.")
+        if not user.check_password(password) or not user.is_active:
             raise serializers.ValidationError("Invalid email or password.")
         attrs["user"] = user
         attrs["device_id"] = (attrs.get("device_id") or "").strip()
@@ -182,9 +190,8 @@ class SendCodeSerializer(serializers.Serializer):
                 "Email is required for this verification flow."
             )
 
-        try:
-            user = User.objects.get(email__iexact=email)
-        except User.DoesNotExist:
+        user = find_user(email, fields=("email",))
+        if user is None:
             raise serializers.ValidationError("No account found for this email.")
 
         attrs["user"] = user
@@ -217,26 +224,19 @@ class VerifyCodeSerializer(serializers.Serializer):
         purpose = attrs.get("purpose", EmailVerificationCode.PURPOSE_SIGNUP)
         challenge_token = (attrs.get("challenge_token") or "").strip()
 
-        try:
-            user = User.objects.get(email__iexact=email)
-        except User.DoesNotExist:
+        user = find_user(email, fields=("email",))
+        if user is None:
             raise serializers.ValidationError("No account found for this email.")
 
-        verification = (
-            EmailVerificationCode.objects.filter(user=user, code=code, purpose=purpose)
-            .order_by("-created_at")
-            .first()
-        )
-        if not verification or not verification.is_valid():
-            raise serializers.ValidationError("Invalid or expired verification code.")
-
         if purpose == EmailVerificationCode.PURPOSE_SIGNIN_DEVICE:
             if not challenge_token:
                 raise serializers.ValidationError("Challenge token is required.")
-            if verification.challenge_token != challenge_token:
-                raise serializers.ValidationError("Invalid challenge token.")
+        else:
+            challenge_token = None
+
+        if not EmailVerificationCode.consume(user, code, purpose, challenge_token):
+            raise serializers.ValidationError("Invalid or expired verification code.")
 
-        attrs["verification"] = verification
         attrs["user"] = user
         attrs["purpose"] = purpose
         attrs["device_id"] = (attrs.get("device_id") or "").strip()
@@ -257,19 +257,12 @@ class PasswordChangeSerializer(serializers.Serializer):
 
         validate_password(attrs["new_password"], user=user)
 
-        verification = (
-            EmailVerificationCode.objects.filter(
-                user=user,
-                code=attrs["code"],
-                purpose=EmailVerificationCode.PURPOSE_PASSWORD_CHANGE,
-            )
-            .order_by("-created_at")
-            .first()
+        consumed = EmailVerificationCode.consume(
+            user, attrs["code"], EmailVerificationCode.PURPOSE_PASSWORD_CHANGE
         )
-        if not verification or not verification.is_valid():
+        if not consumed:
             raise serializers.ValidationError(
                 "Invalid or expired password change code."
             )
 
-        attrs["verification"] = verification
         return attrs
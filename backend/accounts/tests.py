@@ -1,13 +1,46 @@
+import io
+import shutil
+import tempfile
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
 from rest_framework.authtoken.models import Token
 from rest_framework.test import APIClient
 
-from .models import CustomerProfile, EmailVerificationCode, TrustedDevice
+from .models import (
+    CustomerProfile,
+    EmailVerificationCode,
+    OutboxEmail,
+    TrustedDevice,
+    flush_device_usage,
+    record_device_use,
+)
+from .housekeeping import purge_expired, purge_in_batches
+from . import outbox
+from .outbox import dispatch_outbox
+from .serializers import SigninSerializer, VerifyCodeSerializer
+from .throttling import _local_buckets
 
 
 class AccountsApiTests(TestCase):
     def setUp(self):
+        cache.clear()
+        # Write any trusted-device uses now, not from a timer thread later.
+        self.addCleanup(flush_device_usage)
         self.client = APIClient()
         self.user_model = get_user_model()
 
@@ -189,6 +222,53 @@ class AccountsApiTests(TestCase):
         self.assertEqual(email_response.status_code, 200)
         self.assertTrue(email_response.data["requires_otp"])
 
+    def test_signin_resolves_identifier_in_one_query(self):
+        self.user_model.objects.create_user(
+            username="Kofi", email="kofi@example.com", password="securepass123"
+        )
+        # Another user whose username is the first one's email: email wins.
+        self.user_model.objects.create_user(
+            username="KOFI@example.com", email="other@example.com", password="otherpass123"
+        )
+
+        with self.assertNumQueries(1):
+            serializer = SigninSerializer(
+                data={"username": " Kofi@Example.com ", "password": "securepass123"}
+            )
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+        self.assertEqual(serializer.validated_data["user"].username, "Kofi")
+
+        with self.assertNumQueries(1):
+            serializer = SigninSerializer(data={"username": "kofi", "password": "wrong"})
+            self.assertFalse(serializer.is_valid())
+
+    def test_signin_rejects_inactive_users(self):
+        self.user_model.objects.create_user(
+            username="dormant",
+            email="dormant@example.com",
+            password="securepass123",
+            is_active=False,
+        )
+
+        response = self.client.post(
+            "/auth/signin", {"username": "dormant", "password": "securepass123"}
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_user_lookup_uses_lowercase_indexes(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("Query plan check is SQLite-specific")
+        query = self.user_model.objects.annotate(email_lower=Lower("email")).filter(
+            email_lower="kofi@example.com"
+        )
+        sql, params = query.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            plan = " ".join(str(row) for row in cursor.fetchall())
+
+        self.assertIn("auth_user_email_lower", plan)
+
     def test_signin_accepts_email_for_staff_user_with_different_username(self):
         user = self.user_model.objects.create_user(
             username="admin-user",
@@ -489,3 +569,470 @@ class AccountsApiTests(TestCase):
         )
         self.assertEqual(update_response.status_code, 200)
         self.assertEqual(update_response.data["phone_number"], "0242222222")
+
+    def test_profile_picture_is_downscaled_and_reencoded(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        user = self.user_model.objects.create_user(
+            username="pic@example.com", email="pic@example.com", password="securepass123"
+        )
+        CustomerProfile.objects.create(user=user, phone_number="0241111111", address="Accra")
+        self.client.force_authenticate(user=user)
+        buffer = io.BytesIO()
+        Image.new("RGBA", (3000, 2000), (0, 128, 255, 128)).save(buffer, format="PNG")
+        upload = SimpleUploadedFile("me.png", buffer.getvalue(), content_type="image/png")
+
+        with self.settings(MEDIA_ROOT=media_root):
+            response = self.client.patch(
+                "/auth/profile", {"profile_picture": upload}, format="multipart"
+            )
+            self.assertEqual(response.status_code, 200)
+            picture = CustomerProfile.objects.get(user=user).profile_picture
+            with Image.open(picture.path) as stored:
+                self.assertEqual(stored.format, "JPEG")
+                self.assertEqual(stored.size, (settings.PROFILE_PICTURE_MAX_DIMENSION, 341))
+
+    def test_profile_picture_over_pixel_cap_is_rejected(self):
+        user = self.user_model.objects.create_user(
+            username="big@example.com", email="big@example.com", password="securepass123"
+        )
+        self.client.force_authenticate(user=user)
+        buffer = io.BytesIO()
+        Image.new("RGB", (2000, 2000), "white").save(buffer, format="JPEG")
+        upload = SimpleUploadedFile("big.jpg", buffer.getvalue(), content_type="image/jpeg")
+
+        with self.settings(IMAGE_UPLOAD_MAX_PIXELS=1_000_000):
+            response = self.client.patch(
+                "/auth/profile", {"profile_picture": upload}, format="multipart"
+            )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("profile_picture", response.data)
+
+
+class EmailOutboxTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="mail@example.com", email="mail@example.com", password="securepass123"
+        )
+
+    def _queue(self, count=1):
+        for _ in range(count):
+            self.client.post(
+                "/auth/send-code",
+                {"email": "mail@example.com", "purpose": EmailVerificationCode.PURPOSE_SIGNUP},
+                format="json",
+            )
+
+    def test_code_is_queued_with_the_request_and_sent_by_dispatcher(self):
+        self._queue()
+
+        self.assertEqual(mail.outbox, [])
+        queued = OutboxEmail.objects.get()
+        code = EmailVerificationCode.objects.get(user=self.user)
+        self.assertIn(code.code, queued.body)
+
+        call_command("dispatch_outbox", stdout=io.StringIO())
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["mail@example.com"])
+        self.assertIn(code.code, mail.outbox[0].body)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, OutboxEmail.STATUS_SENT)
+
+    def test_mail_server_errors_do_not_reach_the_request(self):
+        with mock.patch(
+            "django.core.mail.backends.locmem.EmailBackend.send_messages",
+            side_effect=ConnectionRefusedError,
+        ):
+            response = self.client.post(
+                "/auth/send-code",
+                {"email": "mail@example.com", "purpose": EmailVerificationCode.PURPOSE_SIGNUP},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200)
+
+    def test_batch_reuses_one_connection(self):
+        self._queue(3)
+
+        with mock.patch(
+            "django.core.mail.backends.locmem.EmailBackend.open", autospec=True
+        ) as opened:
+            self.assertEqual(dispatch_outbox(), (3, 0))
+
+        self.assertEqual(opened.call_count, 1)
+        self.assertEqual(len(mail.outbox), 3)
+
+    def test_failures_back_off_then_give_up(self):
+        self._queue()
+        message = OutboxEmail.objects.get()
+
+        with self.settings(EMAIL_OUTBOX_MAX_ATTEMPTS=2, EMAIL_OUTBOX_RETRY_DELAY=30):
+            with mock.patch(
+                "django.core.mail.backends.locmem.EmailBackend.send_messages",
+                side_effect=OSError("timed out"),
+            ):
+                self.assertEqual(dispatch_outbox(), (0, 1))
+                message.refresh_from_db()
+                self.assertEqual(message.status, OutboxEmail.STATUS_PENDING)
+                self.assertEqual(message.attempts, 1)
+                self.assertGreater(message.next_attempt_at, timezone.now() + timedelta(seconds=25))
+                # Not due yet.
+                self.assertEqual(dispatch_outbox(), (0, 0))
+
+                OutboxEmail.objects.update(next_attempt_at=timezone.now())
+                with self.assertLogs("accounts.outbox", "ERROR"):
+                    self.assertEqual(dispatch_outbox(), (0, 1))
+
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboxEmail.STATUS_FAILED)
+        self.assertEqual(message.last_error, "timed out")
+
+
+    @override_settings(EMAIL_OUTBOX_DISPATCH="thread", EMAIL_OUTBOX_RETRY_DELAY=30)
+    def test_thread_dispatcher_retries_without_new_mail(self):
+        self._queue()
+
+        with (
+            mock.patch("accounts.outbox.close_old_connections"),
+            mock.patch("accounts.outbox._timer", None),
+            mock.patch("accounts.outbox.threading.Timer") as timer,
+        ):
+            with mock.patch(
+                "django.core.mail.backends.locmem.EmailBackend.send_messages",
+                side_effect=OSError("timed out"),
+            ):
+                outbox._dispatch_in_thread()
+
+            # The dispatcher re-armed itself for the retry...
+            delay, callback = timer.call_args.args
+            self.assertAlmostEqual(delay, 30, delta=2)
+            self.assertIs(callback, outbox._submit)
+            timer.return_value.start.assert_called_once()
+
+            # ...which, when it fires, sends the message.
+            OutboxEmail.objects.update(next_attempt_at=timezone.now())
+            outbox._dispatch_in_thread()
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(OutboxEmail.objects.get().status, OutboxEmail.STATUS_SENT)
+
+
+class TrustedDeviceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        flush_device_usage()
+        self.addCleanup(flush_device_usage)
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="returning", email="returning@example.com", password="securepass123"
+        )
+        self.device = TrustedDevice.objects.create(user=self.user, device_id="laptop")
+
+    def _signin(self, device_id="laptop"):
+        return self.client.post(
+            "/auth/signin",
+            {"username": "returning", "password": "securepass123", "device_id": device_id},
+            format="json",
+        )
+
+    def _device_queries(self, context):
+        return [q["sql"] for q in context.captured_queries if "accounts_trusteddevice" in q["sql"]]
+
+    def test_trusted_sign_in_is_served_from_cache(self):
+        self.assertIn("token", self._signin().data)
+
+        with CaptureQueriesContext(connection) as context:
+            response = self._signin()
+
+        self.assertIn("token", response.data)
+        self.assertEqual(self._device_queries(context), [])
+
+    def test_deleting_a_device_invalidates_the_cache(self):
+        self._signin()
+
+        self.device.delete()
+
+        self.assertTrue(self._signin().data["requires_otp"])
+
+    def test_new_device_is_trusted_immediately(self):
+        self.assertTrue(self._signin("phone").data["requires_otp"])
+
+        TrustedDevice.objects.create(user=self.user, device_id="phone")
+
+        self.assertIn("token", self._signin("phone").data)
+
+    def test_usage_is_buffered_and_flushed_in_one_update(self):
+        other = TrustedDevice.objects.create(user=self.user, device_id="tablet")
+        long_ago = timezone.now() - timedelta(days=30)
+        TrustedDevice.objects.update(last_used_at=long_ago)
+
+        with self.assertNumQueries(0):
+            for pk in (self.device.pk, other.pk, self.device.pk):
+                record_device_use(pk)
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(flush_device_usage(), 2)
+
+        self.assertEqual(len(self._device_queries(context)), 1)
+        self.assertFalse(TrustedDevice.objects.filter(last_used_at=long_ago).exists())
+
+    def test_sign_in_arms_a_flush_timer(self):
+        TrustedDevice.objects.update(last_used_at=timezone.now() - timedelta(days=30))
+
+        with mock.patch("accounts.models.threading.Timer") as timer:
+            self._signin()
+            self._signin()
+
+        # One timer for the whole interval, however many sign-ins.
+        timer.assert_called_once()
+        self.assertEqual(timer.call_args.args[0], settings.TRUSTED_DEVICE_USAGE_FLUSH_INTERVAL)
+        # The timer's callback writes the buffer.
+        with mock.patch("accounts.models.close_old_connections"):
+            timer.call_args.args[1]()
+        self.device.refresh_from_db()
+        self.assertGreater(self.device.last_used_at, timezone.now() - timedelta(minutes=1))
+
+
+class CodeConsumptionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username="otp@example.com", email="otp@example.com", password="securepass123"
+        )
+        self.signup = EmailVerificationCode.PURPOSE_SIGNUP
+
+    def test_code_can_only_be_consumed_once(self):
+        code = EmailVerificationCode.create_for_user(self.user)
+
+        with self.assertNumQueries(1):
+            self.assertTrue(EmailVerificationCode.consume(self.user, code.code, self.signup))
+        self.assertFalse(EmailVerificationCode.consume(self.user, code.code, self.signup))
+        code.refresh_from_db()
+        self.assertTrue(code.used)
+
+    def test_expired_or_mismatched_codes_are_not_consumed(self):
+        expired = EmailVerificationCode.create_for_user(self.user, ttl_minutes=-1)
+        device = EmailVerificationCode.create_for_user(
+            self.user,
+            purpose=EmailVerificationCode.PURPOSE_SIGNIN_DEVICE,
+            challenge_token="right",
+        )
+
+        self.assertFalse(EmailVerificationCode.consume(self.user, expired.code, self.signup))
+        self.assertFalse(
+            EmailVerificationCode.consume(
+                self.user, device.code, EmailVerificationCode.PURPOSE_SIGNIN_DEVICE, "wrong"
+            )
+        )
+        self.assertFalse(EmailVerificationCode.consume(self.user, device.code, self.signup))
+        self.assertFalse(EmailVerificationCode.objects.filter(used=True).exists())
+
+    def test_verify_endpoint_rejects_replayed_code(self):
+        code = EmailVerificationCode.create_for_user(self.user)
+        payload = {"email": "otp@example.com", "code": code.code, "purpose": self.signup}
+
+        first = APIClient().post("/auth/verify-code", payload, format="json")
+        second = APIClient().post("/auth/verify-code", payload, format="json")
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 400)
+
+    def test_verify_serializer_uses_two_queries(self):
+        code = EmailVerificationCode.create_for_user(self.user)
+
+        # Resolve the user, then consume the code.
+        with self.assertNumQueries(2):
+            serializer = VerifyCodeSerializer(
+                data={"email": "OTP@example.com", "code": code.code, "purpose": self.signup}
+            )
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+
+
+@override_settings(
+    AUTH_THROTTLE_IP_RATE="3/min",
+    AUTH_THROTTLE_IDENTIFIER_RATE="2/min",
+    AUTH_THROTTLE_GLOBAL_RATE="100/min",
+)
+class AuthThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        _local_buckets.clear()
+        self.client = APIClient()
+        get_user_model().objects.create_user(
+            username="limited", email="limited@example.com", password="securepass123"
+        )
+
+    def _signin(self, username="limited", ip="10.0.0.1", **extra):
+        return self.client.post(
+            "/auth/signin",
+            {"username": username, "password": "wrongpass"},
+            format="json",
+            REMOTE_ADDR=ip,
+            **extra,
+        )
+
+    def test_ip_limit_rejects_before_any_database_work(self):
+        for index in range(3):
+            self.assertEqual(self._signin(username=f"user{index}").status_code, 400)
+
+        # Even a token header is not looked up once the client is throttled.
+        with self.assertNumQueries(0):
+            response = self._signin(username="other", HTTP_AUTHORIZATION="Token abc")
+
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+
+    def test_identifier_limit_applies_across_addresses(self):
+        self.assertEqual(self._signin(ip="10.0.0.1").status_code, 400)
+        self.assertEqual(self._signin(username="LIMITED", ip="10.0.0.2").status_code, 400)
+
+        self.assertEqual(self._signin(ip="10.0.0.3").status_code, 429)
+        self.assertEqual(self._signin(username="someone", ip="10.0.0.3").status_code, 400)
+
+    def test_forged_forwarded_for_does_not_evade_ip_limit(self):
+        statuses = [
+            self._signin(username=f"user{index}", HTTP_X_FORWARDED_FOR=f"203.0.113.{index}")
+            .status_code
+            for index in range(4)
+        ]
+
+        self.assertEqual(statuses, [400, 400, 400, 429])
+
+    def test_forwarded_for_is_read_behind_trusted_proxies(self):
+        rest_framework = {**settings.REST_FRAMEWORK, "NUM_PROXIES": 1}
+        with override_settings(REST_FRAMEWORK=rest_framework):
+            for index in range(3):
+                # The proxy appends the real client address; the rest is forged.
+                self._signin(
+                    username=f"user{index}",
+                    HTTP_X_FORWARDED_FOR=f"198.51.100.{index}, 203.0.113.9",
+                )
+            blocked = self._signin(username="next", HTTP_X_FORWARDED_FOR="203.0.113.9")
+            other = self._signin(username="next", HTTP_X_FORWARDED_FOR="203.0.113.10")
+
+        self.assertEqual(blocked.status_code, 429)
+        self.assertEqual(other.status_code, 400)
+
+    def test_long_identifiers_use_short_cache_keys(self):
+        with mock.patch("accounts.throttling.cache.set", wraps=cache.set) as cache_set:
+            self._signin(username="x" * 5000)
+
+        self.assertTrue(cache_set.call_args_list)
+        for call in cache_set.call_args_list:
+            self.assertLess(len(call.args[0]), 250)
+
+    @override_settings(AUTH_THROTTLE_GLOBAL_RATE="2/min")
+    def test_global_limit_applies_across_clients(self):
+        self._signin(username="a", ip="10.0.0.1")
+        self._signin(username="b", ip="10.0.0.2")
+
+        self.assertEqual(self._signin(username="c", ip="10.0.0.3").status_code, 429)
+
+    def test_endpoints_have_separate_buckets(self):
+        for _ in range(3):
+            self._signin(username="someone")
+
+        response = self.client.post(
+            "/auth/verify-code",
+            {"email": "limited@example.com", "code": "000000", "purpose": "signup"},
+            format="json",
+            REMOTE_ADDR="10.0.0.1",
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_falls_back_to_process_buckets_when_cache_is_down(self):
+        with (
+            mock.patch("accounts.throttling.cache.get", side_effect=ConnectionError),
+            self.assertLogs("accounts.throttling", "WARNING"),
+        ):
+            statuses = [self._signin(username=f"user{index}").status_code for index in range(4)]
+
+        self.assertEqual(statuses, [400, 400, 400, 429])
+
+
+class HousekeepingTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="keeper", email="keeper@example.com", password="securepass123"
+        )
+        self.now = timezone.now()
+
+    def _code(self, expires_ago, used=False):
+        code = EmailVerificationCode.create_for_user(self.user)
+        EmailVerificationCode.objects.filter(pk=code.pk).update(
+            expires_at=self.now - expires_ago, used=used
+        )
+        return code
+
+    def _device(self, device_id, unused_for):
+        device = TrustedDevice.objects.create(user=self.user, device_id=device_id)
+        TrustedDevice.objects.filter(pk=device.pk).update(last_used_at=self.now - unused_for)
+        return device
+
+    def test_purges_only_rows_past_retention(self):
+        old_codes = [self._code(timedelta(days=2)), self._code(timedelta(days=3), used=True)]
+        recent_code = self._code(timedelta(hours=1), used=True)
+        live_code = self._code(-timedelta(minutes=5))
+        self._device("stale", timedelta(days=120))
+        fresh_device = self._device("fresh", timedelta(days=10))
+        for key, offset in (("old", -1), ("live", 1)):
+            Session.objects.create(
+                session_key=key, session_data="", expire_date=self.now + timedelta(days=offset)
+            )
+        sent = OutboxEmail.objects.create(to_email="a@example.com", subject="s", body="b")
+        OutboxEmail.objects.filter(pk=sent.pk).update(
+            status=OutboxEmail.STATUS_SENT, created_at=self.now - timedelta(days=60)
+        )
+        pending = OutboxEmail.objects.create(to_email="b@example.com", subject="s", body="b")
+        OutboxEmail.objects.filter(pk=pending.pk).update(created_at=self.now - timedelta(days=60))
+
+        stats = purge_expired(batch_size=1)
+
+        self.assertEqual(
+            stats,
+            {
+                "verification codes": 2,
+                "trusted devices": 1,
+                "sessions": 1,
+                "idempotency keys": 0,
+                "outbox emails": 1,
+            },
+        )
+        self.assertFalse(
+            EmailVerificationCode.objects.filter(pk__in=[code.pk for code in old_codes]).exists()
+        )
+        self.assertEqual(
+            set(EmailVerificationCode.objects.values_list("pk", flat=True)),
+            {recent_code.pk, live_code.pk},
+        )
+        self.assertEqual(list(TrustedDevice.objects.all()), [fresh_device])
+        self.assertEqual(list(Session.objects.values_list("session_key", flat=True)), ["live"])
+        self.assertEqual(list(OutboxEmail.objects.all()), [pending])
+
+    def test_device_used_during_purge_is_kept(self):
+        device = self._device("racing", timedelta(days=120))
+        real_atomic = transaction.atomic
+
+        def sign_in_then_atomic(*args, **kwargs):
+            # The device is used between selecting the batch and deleting it.
+            TrustedDevice.objects.filter(pk=device.pk).update(last_used_at=timezone.now())
+            return real_atomic(*args, **kwargs)
+
+        with mock.patch("accounts.housekeeping.transaction.atomic", sign_in_then_atomic):
+            deleted = purge_in_batches(
+                TrustedDevice, Q(last_used_at__lt=self.now - timedelta(days=90))
+            )
+
+        self.assertEqual(deleted, 0)
+        self.assertTrue(TrustedDevice.objects.filter(pk=device.pk).exists())
+
+    def test_command_reports_stats(self):
+        self._code(timedelta(days=2))
+        out = io.StringIO()
+
+        call_command("purge_expired", stdout=out)
+
+        self.assertIn("Purged 1 row(s): 1 verification codes", out.getvalue())
@@ -0,0 +1,151 @@
+"""
+Token-bucket throttles for the credential endpoints.
+
+Sign-in hashes a password (PBKDF2) and the code endpoints look users up and
+queue mail, so a credential-stuffing burst can tie up every worker. Each
+request is checked against three buckets in turn, per client IP, per account
+identifier (username/email) and one shared by all clients, and is rejected
+at the first empty one. Throttling runs before authentication and parsing
+into serializers, so a rejected request does no hashing or database work.
+Client IPs come from DRF's ``get_ident``, which trusts X-Forwarded-For only
+as far as REST_FRAMEWORK["NUM_PROXIES"] says.
+
+Buckets use GCRA, which behaves exactly like a token bucket but stores a
+single timestamp per key. They live in the shared Django cache so all
+workers see the same counts; if the cache is unreachable each process falls
+back to its own in-memory buckets rather than failing open or closed.
+The read and write of a bucket are not atomic (Django's cache API has no
+compare-and-set), so requests racing on a key can all be admitted: a burst
+may exceed a bucket by up to one request per concurrently running worker
+thread before the stored timestamp catches up. Racing writes can only admit
+too much, never lock anyone out.
+"""
+
+import hashlib
+import logging
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.exceptions import ParseError
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "throttle"
+_PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+# In-process fallback: key -> theoretical arrival time.
+_local_buckets = {}
+_local_lock = threading.Lock()
+_LOCAL_MAX_KEYS = 10_000
+
+
+def parse_rate(rate: str):
+    """``"20/min"`` -> ``(capacity, period_seconds)``."""
+    count, period = rate.split("/")
+    return int(count), _PERIODS[period.strip()[0]]
+
+
+def _next_tat(tat, now, capacity, period):
+    """
+    Return ``(new_tat, wait)`` for one request; ``wait`` is None if the
+    request is admitted, else the seconds until a token is available.
+    """
+    interval = period / capacity
+    new_tat = max(tat or now, now) + interval
+    excess = new_tat - now - period
+    if excess > 0:
+        return tat, excess
+    return new_tat, None
+
+
+def _take_local(key, now, capacity, period):
+    with _local_lock:
+        new_tat, wait = _next_tat(_local_buckets.get(key), now, capacity, period)
+        if wait is None:
+            if len(_local_buckets) >= _LOCAL_MAX_KEYS:
+                for stale in [k for k, tat in _local_buckets.items() if tat <= now]:
+                    del _local_buckets[stale]
+            _local_buckets[key] = new_tat
+        return wait
+
+
+def take_token(key: str, rate: str):
+    """Take a token from ``key``'s bucket; returns None or seconds to wait."""
+    capacity, period = parse_rate(rate)
+    now = time.time()
+    cache_key = f"{KEY_PREFIX}:{key}"
+    try:
+        new_tat, wait = _next_tat(cache.get(cache_key), now, capacity, period)
+        if wait is None:
+            cache.set(cache_key, new_tat, timeout=math.ceil(new_tat - now) + 1)
+        return wait
+    except Exception:
+        logger.warning("Throttle cache unavailable; using in-process buckets", exc_info=True)
+        return _take_local(key, now, capacity, period)
+
+
+def _identifier(request):
+    try:
+        data = request.data
+    except ParseError:
+        return None
+    if not hasattr(data, "get"):
+        return None
+    value = data.get("username") or data.get("email") or ""
+    if not isinstance(value, str):
+        return None
+    value = value.strip().lower()
+    # Hashed: cache keys must stay short however long the submitted value.
+    return hashlib.sha256(value.encode()).hexdigest() if value else None
+
+
+class AuthThrottle(BaseThrottle):
+    """
+    Layered IP / identifier / global buckets for ``view.throttle_scope``.
+
+    Layers are checked in that order and checking stops at the first empty
+    bucket, so requests already refused per IP do not drain the global one.
+    """
+
+    def allow_request(self, request, view):
+        scope = view.throttle_scope
+        layers = [
+            (f"{scope}:ip:{self.get_ident(request)}", settings.AUTH_THROTTLE_IP_RATE),
+        ]
+        identifier = _identifier(request)
+        if identifier:
+            layers.append(
+                (f"{scope}:id:{identifier}", settings.AUTH_THROTTLE_IDENTIFIER_RATE)
+            )
+        layers.append((f"{scope}:global", settings.AUTH_THROTTLE_GLOBAL_RATE))
+
+        for key, rate in layers:
+            self._wait = take_token(key, rate)
+            if self._wait is not None:
+                return False
+        return True
+
+    def wait(self):
+        return self._wait
+
+
+class ThrottleFirstMixin:
+    """
+    Check throttles before authentication, so that a throttled request
+    costs no token lookup either.
+    """
+
+    throttle_classes = [AuthThrottle]
+
+    def initial(self, request, *args, **kwargs):
+        super().check_throttles(request)
+        self._throttles_checked = True
+        super().initial(request, *args, **kwargs)
+
+    def check_throttles(self, request):
+        if not getattr(self, "_throttles_checked", False):
+            super().check_throttles(request)
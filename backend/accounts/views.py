@@ -1,11 +1,12 @@
 from django.contrib.auth import login
-from django.core.mail import send_mail
+from django.db import transaction
 from rest_framework import permissions, status
 from rest_framework.authtoken.models import Token
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .models import CustomerProfile, EmailVerificationCode, TrustedDevice
+from .models import CustomerProfile, EmailVerificationCode, TrustedDevice, record_device_use
+from .outbox import queue_email
 from .serializers import (
     CustomerProfileSerializer,
     PasswordChangeSerializer,
@@ -14,6 +15,7 @@ from .serializers import (
     SignupSerializer,
     VerifyCodeSerializer,
 )
+from .throttling import ThrottleFirstMixin
 
 
 def _auth_payload(user):
@@ -25,17 +27,18 @@ def _auth_payload(user):
 
 
 def _send_verification_code(user, purpose, challenge_token=""):
-    verification = EmailVerificationCode.create_for_user(
-        user=user,
-        purpose=purpose,
-        challenge_token=challenge_token,
-    )
-    send_mail(
-        subject="Sender+ verification code",
-        message=f"Your Sender+ verification code is {verification.code}.",
-        from_email=None,
-        recipient_list=[user.email],
-    )
+    # Queued, not sent: the outbox dispatcher delivers it after commit.
+    with transaction.atomic():
+        verification = EmailVerificationCode.create_for_user(
+            user=user,
+            purpose=purpose,
+            challenge_token=challenge_token,
+        )
+        queue_email(
+            to_email=user.email,
+            subject="Sender+ verification code",
+            body=f"Your Sender+ verification code is {verification.code}.",
+        )
     return verification
 
 
@@ -57,8 +60,9 @@ class SignupView(APIView):
         )
 
 
-class SigninView(APIView):
+class SigninView(ThrottleFirstMixin, APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_scope = "signin"
 
     def post(self, request):
         serializer = SigninSerializer(data=request.data)
@@ -68,7 +72,10 @@ class SigninView(APIView):
 
         trusted = False
         if device_id:
-            trusted = TrustedDevice.objects.filter(user=user, device_id=device_id).exists()
+            device_pk = TrustedDevice.lookup(user, device_id)
+            if device_pk is not None:
+                trusted = True
+                record_device_use(device_pk)
 
         if not trusted:
             challenge_token = EmailVerificationCode.generate_challenge_token()
@@ -99,8 +106,9 @@ class SigninView(APIView):
         )
 
 
-class SendCodeView(APIView):
+class SendCodeView(ThrottleFirstMixin, APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_scope = "send-code"
 
     def post(self, request):
         serializer = SendCodeSerializer(data=request.data, context={"request": request})
@@ -123,19 +131,17 @@ class SendCodeView(APIView):
         )
 
 
-class VerifyCodeView(APIView):
+class VerifyCodeView(ThrottleFirstMixin, APIView):
     permission_classes = [permissions.AllowAny]
+    throttle_scope = "verify-code"
 
     def post(self, request):
         serializer = VerifyCodeSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        verification = serializer.validated_data["verification"]
         user = serializer.validated_data["user"]
         purpose = serializer.validated_data["purpose"]
         device_id = serializer.validated_data.get("device_id")
 
-        verification.mark_used()
-
         profile, _ = CustomerProfile.objects.get_or_create(
             user=user,
             defaults={"phone_number": "0240000000", "address": ""},
@@ -179,11 +185,9 @@ class PasswordChangeView(APIView):
     def post(self, request):
         serializer = PasswordChangeSerializer(data=request.data, context={"request": request})
         serializer.is_valid(raise_exception=True)
-        verification = serializer.validated_data["verification"]
 
         request.user.set_password(serializer.validated_data["new_password"])
         request.user.save(update_fields=["password"])
-        verification.mark_used()
 
         return Response({"message": "Password updated successfully."})
 
@@ -1,5 +1,26 @@
 from django.contrib import admin
-from .models import Package
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from .models import Package, PackageStatusEvent, STATUS_CHOICES
+from .search import search_packages
+
+
+class PackageStatusEventInline(admin.TabularInline):
+    model = PackageStatusEvent
+    fields = ("status", "created_at")
+    readonly_fields = ("status", "created_at")
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+class PackageChangeList(ChangeList):
+    def get_ordering(self, request, queryset):
+        # Best matches first when searching, unless a column sort is chosen.
+        if "search_rank" in queryset.query.annotations and ORDER_VAR not in self.params:
+            return ["-search_rank", "-created_at", "-pk"]
+        return super().get_ordering(request, queryset)
 
 
 @admin.register(Package)
@@ -15,8 +36,29 @@ class PackageAdmin(admin.ModelAdmin):
     list_filter = ("status", "created_at")
     readonly_fields = ("tracking_id", "created_at", "updated_at")
     actions = ("advance_status_action",)
+    inlines = (PackageStatusEventInline,)
+
+    def get_search_results(self, request, queryset, search_term):
+        # Use the search index (see packages.search) instead of the default
+        # icontains scan over search_fields.
+        if not search_term.strip():
+            return queryset, False
+        return search_packages(queryset, search_term), False
+
+    def get_changelist(self, request, **kwargs):
+        return PackageChangeList
 
     @admin.action(description="Advance status for selected packages")
     def advance_status_action(self, request, queryset):
-        for package in queryset:
-            package.advance_status()
+        moved = queryset.advance_status()
+        if not moved:
+            self.message_user(request, "No selected packages could be advanced.")
+            return
+
+        labels = dict(STATUS_CHOICES)
+        details = ", ".join(
+            f"{count} from \"{labels[status]}\"" for status, count in moved.items()
+        )
+        self.message_user(
+            request, f"Advanced {sum(moved.values())} package(s): {details}."
+        )
@@ -0,0 +1,85 @@
+"""
+Batched data backfills shared by migrations and management commands.
+
+Functions take the model class so migrations can pass their historical
+model. Each batch commits on its own, so a long backfill never holds locks
+on the whole table and can be stopped and resumed.
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models.functions import Lower
+
+from accounts.models import normalize_ghana_phone
+
+
+def backfill_recipient_phones(Package, batch_size=1000, log=None):
+    """Fill ``recipient_phone_normalized`` for rows that do not have it yet."""
+    last_pk = 0
+    updated = 0
+    pending = Package.objects.filter(recipient_phone_normalized__isnull=True).order_by("pk")
+    while True:
+        batch = list(pending.filter(pk__gt=last_pk).only("pk", "recipient_phone")[:batch_size])
+        if not batch:
+            return updated
+        last_pk = batch[-1].pk
+        changed = []
+        for package in batch:
+            package.recipient_phone_normalized = normalize_ghana_phone(package.recipient_phone)
+            if package.recipient_phone_normalized:
+                changed.append(package)
+        with transaction.atomic():
+            Package.objects.bulk_update(changed, ["recipient_phone_normalized"])
+        updated += len(changed)
+        if log:
+            log(f"Normalized {updated} phone number(s), up to id {last_pk}.")
+
+
+def claim_packages_by_email(Package, User, batch_size=1000, log=None):
+    """
+    Give unowned packages to the user whose verified email matches
+    ``sender_email`` (case-insensitively).
+
+    Emails shared by more than one verified account are skipped rather than
+    guessed. Returns the number of packages claimed.
+    """
+    last_pk = 0
+    claimed = 0
+    pending = (
+        Package.objects.filter(owner__isnull=True, sender_email__isnull=False)
+        .exclude(sender_email="")
+        .order_by("pk")
+    )
+    while True:
+        batch = list(pending.filter(pk__gt=last_pk).values_list("pk", "sender_email")[:batch_size])
+        if not batch:
+            return claimed
+        last_pk = batch[-1][0]
+
+        owners = defaultdict(set)
+        for email, user_id in (
+            User.objects.annotate(email_lower=Lower("email"))
+            .filter(
+                email_lower__in={email.lower() for _, email in batch},
+                customer_profile__email_verified=True,
+            )
+            .values_list("email_lower", "pk")
+        ):
+            owners[email].add(user_id)
+
+        by_owner = defaultdict(list)
+        for pk, email in batch:
+            candidates = owners.get(email.lower(), ())
+            if len(candidates) == 1:
+                by_owner[next(iter(candidates))].append(pk)
+
+        with transaction.atomic():
+            for owner_id, pks in by_owner.items():
+                # owner__isnull again: a submission may have been claimed or
+                # made by a signed-in user since the batch was read.
+                claimed += Package.objects.filter(pk__in=pks, owner__isnull=True).update(
+                    owner_id=owner_id
+                )
+        if log:
+            log(f"Claimed {claimed} package(s), up to id {last_pk}.")
@@ -0,0 +1,67 @@
+"""
+In-process fan-out of package status changes to streaming tracking clients.
+
+Each subscriber is an asyncio queue living on the ASGI event loop, so idle
+connections cost a queue and a timer rather than a thread. Publishing is
+safe from any thread (sync views run in a thread pool under ASGI) and never
+blocks: a slow subscriber only ever holds the latest message.
+"""
+
+import asyncio
+import threading
+from collections import defaultdict
+
+
+class Subscription:
+    def __init__(self, tracking_id: str):
+        self.tracking_id = tracking_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=1)
+
+    def offer(self, message):
+        # Called on the subscriber's loop. Clients only care about the newest
+        # status, so replace anything they have not read yet.
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(message)
+
+    async def get(self):
+        return await self.queue.get()
+
+
+class StatusBroadcaster:
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, tracking_id: str) -> Subscription:
+        subscription = Subscription(tracking_id)
+        with self._lock:
+            self._subscriptions[tracking_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._subscriptions.get(subscription.tracking_id)
+            if subscribers is None:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscriptions[subscription.tracking_id]
+
+    def subscriber_count(self, tracking_id: str | None = None) -> int:
+        with self._lock:
+            if tracking_id is not None:
+                return len(self._subscriptions.get(tracking_id, ()))
+            return sum(len(subscribers) for subscribers in self._subscriptions.values())
+
+    def publish(self, tracking_id: str, message: dict):
+        with self._lock:
+            subscribers = list(self._subscriptions.get(tracking_id, ()))
+        for subscription in subscribers:
+            if subscription.loop.is_closed():
+                continue
+            subscription.loop.call_soon_threadsafe(subscription.offer, message)
+
+
+broadcaster = StatusBroadcaster()
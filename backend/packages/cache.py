@@ -0,0 +1,165 @@
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404
+
+KEY_PREFIX = "track"
+HITS_KEY = f"{KEY_PREFIX}:stats:hits"
+MISSES_KEY = f"{KEY_PREFIX}:stats:misses"
+
+
+def _payload_key(tracking_id: str) -> str:
+    return f"{KEY_PREFIX}:payload:{tracking_id}"
+
+
+def _version_key(tracking_id: str) -> str:
+    return f"{KEY_PREFIX}:version:{tracking_id}"
+
+
+def _lock_key(tracking_id: str) -> str:
+    return f"{KEY_PREFIX}:lock:{tracking_id}"
+
+
+def _incr(key: str):
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Evicted between add() and incr(); start counting again.
+            cache.set(key, 1, timeout=None)
+
+
+def _lookup(tracking_id: str):
+    """
+    Return (entry, version) for a tracking ID in one cache round trip.
+
+    The entry only counts if it was stored under the current version, so a
+    payload rendered before an invalidation can never be served after it.
+    """
+    payload_key = _payload_key(tracking_id)
+    version_key = _version_key(tracking_id)
+    found = cache.get_many([payload_key, version_key])
+    version = found.get(version_key, 0)
+    entry = found.get(payload_key)
+    if entry is not None and entry["version"] != version:
+        entry = None
+    return entry, version
+
+
+def _store(tracking_id: str, version: int, loader):
+    """Render with ``loader`` and cache the result, or the 404, under ``version``."""
+    try:
+        data = loader(tracking_id)
+    except Http404:
+        cache.set(
+            _payload_key(tracking_id),
+            {"version": version, "missing": True},
+            timeout=settings.TRACKING_CACHE_MISSING_TIMEOUT,
+        )
+        raise
+    cache.set(
+        _payload_key(tracking_id),
+        {"version": version, "data": data},
+        timeout=settings.TRACKING_CACHE_TIMEOUT,
+    )
+    return data
+
+
+def _cached(entry):
+    if entry.get("missing"):
+        raise Http404
+    return entry["data"]
+
+
+def get_tracking_payload(tracking_id: str, loader):
+    """
+    Read-through cache for the tracking payload of one package.
+
+    ``loader`` is called with the tracking ID on a miss and must return the
+    data to cache (or raise Http404, which is cached briefly too). Only one
+    caller per tracking ID renders at a time; concurrent misses wait for
+    that result while the renderer holds its lock, and take over as soon as
+    it lets go without leaving a current payload behind.
+
+    Bypassed unless settings.TRACKING_CACHE_ENABLED: with a per-process cache
+    other workers' invalidations never arrive.
+    """
+    if not settings.TRACKING_CACHE_ENABLED:
+        return loader(tracking_id)
+
+    entry, version = _lookup(tracking_id)
+    if entry is not None:
+        _incr(HITS_KEY)
+        return _cached(entry)
+
+    _incr(MISSES_KEY)
+    lock_timeout = settings.TRACKING_CACHE_LOCK_TIMEOUT
+    lock_key = _lock_key(tracking_id)
+    deadline = time.monotonic() + lock_timeout
+    while not cache.add(lock_key, 1, timeout=lock_timeout):
+        if time.monotonic() >= deadline:
+            # The lock holder is slow or died; render it ourselves.
+            return _store(tracking_id, version, loader)
+        time.sleep(0.05)
+        entry, version = _lookup(tracking_id)
+        if entry is not None:
+            return _cached(entry)
+
+    try:
+        # The previous holder may have finished just before we took over.
+        entry, version = _lookup(tracking_id)
+        if entry is not None:
+            return _cached(entry)
+        return _store(tracking_id, version, loader)
+    finally:
+        cache.delete(lock_key)
+
+
+def invalidate_tracking_payloads(tracking_ids):
+    """
+    Drop cached payloads for the given tracking IDs.
+
+    Bumps each ID's version rather than deleting the payload, so a render
+    that started before the change cannot repopulate the cache with stale
+    data when it finishes.
+    """
+    # Bumped atomically one key at a time: a read-then-write of all the
+    # versions could let concurrent invalidations land on the same number.
+    for key in {_version_key(tid) for tid in tracking_ids}:
+        _incr(key)
+
+
+def invalidate_tracking_payload(tracking_id: str):
+    invalidate_tracking_payloads([tracking_id])
+
+
+def get_tracking_version(tracking_id: str) -> int:
+    """Current invalidation version; changes whenever the package does."""
+    return cache.get(_version_key(tracking_id), 0)
+
+
+async def aget_tracking_version(tracking_id: str) -> int:
+    """
+    ``get_tracking_version`` on the shared executor rather than through
+    ``cache.aget``, whose thread-sensitive call would hold a thread for the
+    calling request (and, for tracking streams, for as long as they are open).
+    """
+    return await sync_to_async(get_tracking_version, thread_sensitive=False)(tracking_id)
+
+
+def get_cache_stats() -> dict:
+    counts = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits = counts.get(HITS_KEY, 0)
+    misses = counts.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / total, 4) if total else None,
+    }
+
+
+def reset_cache_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
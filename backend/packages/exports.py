@@ -0,0 +1,119 @@
+import csv
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Package
+
+EXPORT_FIELDS = [
+    "tracking_id",
+    "sender_name",
+    "sender_phone",
+    "sender_email",
+    "sender_address",
+    "recipient_name",
+    "recipient_phone",
+    "recipient_email",
+    "recipient_address",
+    "package_name",
+    "package_type",
+    "weight",
+    "value",
+    "description",
+    "status",
+    "created_at",
+    "updated_at",
+]
+
+EXPORT_CHUNK_SIZE = 2000
+
+CONTENT_TYPES = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+
+# Spreadsheets evaluate cells starting with these as formulas; the values
+# come from public submissions.
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+class _Echo:
+    """File-like object for csv.writer that hands each line straight back."""
+
+    def write(self, value):
+        return value
+
+
+def _matching(status, created_after, created_before):
+    return Package.objects.matching(
+        status=status, created_after=created_after, created_before=created_before
+    ).order_by("pk")
+
+
+def export_rows(status=None, created_after=None, created_before=None):
+    """
+    Yield value tuples for the export, in primary key order.
+
+    Rows are fetched with ``iterator()``, which uses a server-side cursor on
+    PostgreSQL, so memory stays flat however many rows match.
+    """
+    queryset = _matching(status, created_after, created_before)
+    return queryset.values_list(*EXPORT_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+
+async def aexport_rows(status=None, created_after=None, created_before=None):
+    """
+    ``export_rows`` for ASGI, which would read a sync iterator into a list
+    before sending anything. Rows are fetched a primary key range at a time,
+    one query per chunk, so memory stays just as flat.
+    """
+    queryset = _matching(status, created_after, created_before).values_list(
+        "pk", *EXPORT_FIELDS
+    )
+    fetch = sync_to_async(
+        lambda after: list(queryset.filter(pk__gt=after)[:EXPORT_CHUNK_SIZE])
+    )
+    last_pk = 0
+    while True:
+        chunk = await fetch(last_pk)
+        for row in chunk:
+            yield row[1:]
+        if len(chunk) < EXPORT_CHUNK_SIZE:
+            return
+        last_pk = chunk[-1][0]
+
+
+def _neutralize(value):
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def _ndjson_line(row):
+    return json.dumps(dict(zip(EXPORT_FIELDS, row)), cls=DjangoJSONEncoder) + "\n"
+
+
+def _formatter(output):
+    """Return ``(header line or None, row formatter)`` for ``output``."""
+    if output == "ndjson":
+        return None, _ndjson_line
+    writer = csv.writer(_Echo())
+    return writer.writerow(EXPORT_FIELDS), lambda row: writer.writerow(map(_neutralize, row))
+
+
+def iter_export(output, rows):
+    header, format_row = _formatter(output)
+    if header is not None:
+        yield header
+    for row in rows:
+        yield format_row(row)
+
+
+async def aiter_export(output, rows):
+    header, format_row = _formatter(output)
+    if header is not None:
+        yield header
+    async for row in rows:
+        yield format_row(row)
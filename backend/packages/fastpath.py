@@ -0,0 +1,97 @@
+"""
+Precomputed serialization for tracking responses.
+
+Produces exactly what ``PackageDetailSerializer(package).data`` produces, so
+the rendered JSON is byte-identical, without building DRF fields for each
+call or dispatching through each field's ``to_representation``. Field order
+and formatting follow DRF's rules for these field types. Resolved photo URLs
+are memoized per stored file name, because some storages (Cloudinary) do
+real work to build them.
+
+``packages.tests`` checks the output against the DRF serializer; keep the
+two in step when the payload changes. Run
+``manage.py benchmark_tracking_serializer`` to compare their speed.
+"""
+
+import decimal
+from functools import lru_cache
+
+from django.utils import timezone
+
+from .models import STATUS_CHOICES, Package
+
+_STATUS_LABELS = dict(STATUS_CHOICES)
+
+_TEXT_FIELDS = (
+    "tracking_id",
+    "sender_name",
+    "sender_phone",
+    "sender_email",
+    "sender_address",
+    "recipient_name",
+    "recipient_phone",
+    "recipient_email",
+    "recipient_address",
+    "package_name",
+    "package_type",
+)
+
+_WEIGHT_QUANTUM = decimal.Decimal(".1") ** Package._meta.get_field("weight").decimal_places
+_WEIGHT_CONTEXT = decimal.Context(prec=Package._meta.get_field("weight").max_digits)
+_VALUE_QUANTUM = decimal.Decimal(".1") ** Package._meta.get_field("value").decimal_places
+_VALUE_CONTEXT = decimal.Context(prec=Package._meta.get_field("value").max_digits)
+
+
+def _decimal(value, quantum, context):
+    if value is None:
+        return None
+    if not isinstance(value, decimal.Decimal):
+        value = decimal.Decimal(str(value).strip())
+    return "{:f}".format(value.quantize(quantum, context=context))
+
+
+def _datetime(value, tz):
+    if not value:
+        return None
+    value = value.astimezone(tz).isoformat()
+    if value.endswith("+00:00"):
+        value = value[:-6] + "Z"
+    return value
+
+
+@lru_cache(maxsize=4096)
+def _file_url(field_name: str, name: str) -> str:
+    return Package._meta.get_field(field_name).storage.url(name)
+
+
+def _url(fieldfile):
+    if not fieldfile:
+        return None
+    return _file_url(fieldfile.field.name, fieldfile.name)
+
+
+def serialize_package_detail(package) -> dict:
+    """Fast equivalent of ``PackageDetailSerializer(package).data``."""
+    tz = timezone.get_current_timezone()
+    data = {name: getattr(package, name) for name in _TEXT_FIELDS}
+    data["weight"] = _decimal(package.weight, _WEIGHT_QUANTUM, _WEIGHT_CONTEXT)
+    data["value"] = _decimal(package.value, _VALUE_QUANTUM, _VALUE_CONTEXT)
+    data["description"] = package.description
+    photo_url = _url(package.photo)
+    data["photo"] = photo_url
+    data["photo_url"] = photo_url
+    data["photo_status"] = package.photo_status
+    data["thumbnail_url"] = _url(package.photo_thumbnail)
+    data["status"] = package.status
+    data["status_display"] = _STATUS_LABELS.get(package.status, package.status)
+    data["timeline"] = [
+        {
+            "status": event.status,
+            "status_display": _STATUS_LABELS.get(event.status, event.status),
+            "created_at": _datetime(event.created_at, tz),
+        }
+        for event in package.status_events.all()
+    ]
+    data["created_at"] = _datetime(package.created_at, tz)
+    data["updated_at"] = _datetime(package.updated_at, tz)
+    return data
@@ -0,0 +1,9 @@
+"""Tables of this app purged by ``manage.py purge_expired``."""
+
+from django.db.models import Q
+
+from accounts.housekeeping import register
+
+from .models import IdempotencyKey
+
+register("idempotency keys", IdempotencyKey, lambda now: Q(expires_at__lt=now))
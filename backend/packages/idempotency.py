@@ -0,0 +1,104 @@
+"""
+Idempotency-Key support for retried POSTs.
+
+A client that may retry (mobile apps on flaky networks) sends a unique
+``Idempotency-Key`` header. The first request with a key does the work and
+stores its response; repeats within IDEMPOTENCY_KEY_TTL get that response
+back, marked with ``Idempotent-Replayed: true``, instead of doing the work
+again. Reusing a key for a different request body is a client error (422).
+
+The key row is inserted before the work, in the same transaction, so a
+concurrent duplicate waits on the unique constraint until the first request
+commits and then replays it. Failed requests roll the key back, so they can
+be retried with the same key.
+"""
+
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field("key").max_length
+
+
+def request_fingerprint(request) -> str:
+    """Hash of who sent the request and everything in its body."""
+    digest = hashlib.sha256()
+    digest.update(f"user:{request.user.pk if request.user.is_authenticated else ''}".encode())
+    data = request.data
+    for name in sorted(data.keys()):
+        values = data.getlist(name) if hasattr(data, "getlist") else [data[name]]
+        for value in values:
+            digest.update(f"\0{name}=".encode())
+            if isinstance(value, UploadedFile):
+                for chunk in value.chunks():
+                    digest.update(chunk)
+                value.seek(0)
+            else:
+                digest.update(str(value).encode())
+    return digest.hexdigest()
+
+
+def _replay(record):
+    response = Response(record.response_body, status=record.response_status)
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def idempotent(request, scope: str, handler):
+    """
+    Run ``handler()`` (which returns a Response) at most once per
+    Idempotency-Key within ``scope``; requests without the header just run it.
+    """
+    key = request.headers.get(HEADER)
+    if key is None:
+        return handler()
+    key = key.strip()
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return Response(
+            {"detail": f"{HEADER} must be 1-{MAX_KEY_LENGTH} characters."},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    fingerprint = request_fingerprint(request)
+    lookup = {"scope": scope, "key": key}
+    while True:
+        with transaction.atomic():
+            now = timezone.now()
+            try:
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(
+                        fingerprint=fingerprint,
+                        expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+                        **lookup,
+                    )
+            except IntegrityError:
+                existing = IdempotencyKey.objects.select_for_update().get(**lookup)
+                if existing.expires_at <= now:
+                    # Stale: forget it and claim the key afresh.
+                    existing.delete()
+                    continue
+                if existing.fingerprint != fingerprint:
+                    return Response(
+                        {"detail": f"This {HEADER} was already used for a different request."},
+                        status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                    )
+                return _replay(existing)
+
+            response = handler()
+            if response.status_code >= 400:
+                # Errors are not remembered; roll the key back with them.
+                transaction.set_rollback(True)
+                return response
+            record.response_status = response.status_code
+            record.response_body = response.data
+            record.save(update_fields=["response_status", "response_body"])
+            return response
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from packages.backfills import backfill_recipient_phones
+from packages.models import Package
+
+
+class Command(BaseCommand):
+    help = "Fill the normalized recipient phone column for existing packages."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        updated = backfill_recipient_phones(
+            Package, batch_size=options["batch_size"], log=self.stdout.write
+        )
+        self.stdout.write(f"Done: {updated} package(s) updated.")
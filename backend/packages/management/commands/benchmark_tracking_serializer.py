@@ -0,0 +1,99 @@
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from packages.fastpath import serialize_package_detail
+from packages.models import STATUS_ORDER, Package, PackageStatusEvent
+from packages.serializers import PackageDetailSerializer
+
+
+def _build_packages(count):
+    """In-memory packages with prefetched timelines; no database needed."""
+    now = timezone.now()
+    packages = []
+    for index in range(count):
+        status_index = index % len(STATUS_ORDER)
+        package = Package(
+            pk=index + 1,
+            tracking_id=f"{index:08x}",
+            sender_name="Ama Mensah",
+            sender_phone="0241234567",
+            sender_email="ama@example.com" if index % 2 else None,
+            sender_address="Legon Hall, Accra",
+            recipient_name="Kojo Asante",
+            recipient_phone="+233201234567",
+            recipient_email=None,
+            recipient_address="Commonwealth Hall",
+            package_name="Textbooks",
+            package_type="Books",
+            weight=Decimal("2.50"),
+            value=Decimal("120.00") if index % 3 else None,
+            description="Handle with care",
+            photo=f"package_photos/{index:08x}.jpg" if index % 4 == 0 else None,
+            photo_status="ready" if index % 4 == 0 else "",
+            status=STATUS_ORDER[status_index],
+            created_at=now - timedelta(days=2),
+            updated_at=now,
+        )
+        events = PackageStatusEvent.objects.none()
+        events._result_cache = [
+            PackageStatusEvent(
+                package=package,
+                status=status,
+                created_at=now - timedelta(hours=len(STATUS_ORDER) - step),
+            )
+            for step, status in enumerate(STATUS_ORDER[: status_index + 1])
+        ]
+        events._prefetch_done = True
+        package._prefetched_objects_cache = {"status_events": events}
+        packages.append(package)
+    return packages
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare PackageDetailSerializer with the fast tracking serializer "
+        "on in-memory packages."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def _best_of(self, repeat, func, packages):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for package in packages:
+                func(package)
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    def handle(self, *args, **options):
+        packages = _build_packages(options["count"])
+        renderer = JSONRenderer()
+
+        mismatches = sum(
+            renderer.render(PackageDetailSerializer(package).data)
+            != renderer.render(serialize_package_detail(package))
+            for package in packages
+        )
+        drf = self._best_of(
+            options["repeat"], lambda p: PackageDetailSerializer(p).data, packages
+        )
+        fast = self._best_of(options["repeat"], serialize_package_detail, packages)
+
+        count = len(packages)
+        self.stdout.write(f"packages:            {count}")
+        self.stdout.write(
+            f"DRF serializer:      {drf:.3f}s ({drf / count * 1e6:.1f} us/package)"
+        )
+        self.stdout.write(
+            f"fast path:           {fast:.3f}s ({fast / count * 1e6:.1f} us/package)"
+        )
+        self.stdout.write(f"speed-up:            {drf / fast:.1f}x")
+        self.stdout.write(f"JSON mismatches:     {mismatches}")
@@ -0,0 +1,24 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from packages.backfills import claim_packages_by_email
+from packages.models import Package
+
+
+class Command(BaseCommand):
+    help = (
+        "Link anonymous packages to customers whose verified email matches "
+        "the sender email."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        claimed = claim_packages_by_email(
+            Package,
+            get_user_model(),
+            batch_size=options["batch_size"],
+            log=self.stdout.write,
+        )
+        self.stdout.write(f"Done: {claimed} package(s) claimed.")
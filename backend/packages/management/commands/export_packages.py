@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from packages.exports import export_rows, iter_export
+from packages.serializers import PackageExportFilterSerializer
+
+
+class Command(BaseCommand):
+    help = "Stream packages as CSV or NDJSON to stdout or a file."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", choices=["csv", "ndjson"], default="csv")
+        parser.add_argument("--status")
+        parser.add_argument("--created-after", help="ISO 8601 datetime.")
+        parser.add_argument("--created-before", help="ISO 8601 datetime.")
+        parser.add_argument("--file", help="Write here instead of stdout.")
+
+    def handle(self, *args, **options):
+        filters = PackageExportFilterSerializer(
+            data={
+                key: options[key]
+                for key in ("output", "status", "created_after", "created_before")
+                if options[key]
+            }
+        )
+        if not filters.is_valid():
+            raise CommandError(filters.errors)
+        criteria = dict(filters.validated_data)
+        output = criteria.pop("output")
+
+        chunks = iter_export(output, export_rows(**criteria))
+        if not options["file"]:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending="")
+            return
+
+        with open(options["file"], "w", newline="") as stream:
+            stream.writelines(chunks)
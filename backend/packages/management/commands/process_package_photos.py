@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from packages.photos import process_pending_photos
+
+
+class Command(BaseCommand):
+    help = "Upload, resize and thumbnail package photos waiting in staging."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument(
+            "--loop", action="store_true", help="Keep polling for new photos."
+        )
+        parser.add_argument(
+            "--interval", type=float, default=2.0, help="Seconds between polls."
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_pending_photos(limit=options["batch_size"])
+            if processed:
+                self.stdout.write(f"Processed {processed} photo(s).")
+            if not options["loop"]:
+                return
+            if processed < options["batch_size"]:
+                time.sleep(options["interval"])
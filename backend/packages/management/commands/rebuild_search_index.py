@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from packages.search import install_search_index
+
+
+class Command(BaseCommand):
+    help = "Create the package search index if missing and refill it."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        connection = connections[options["database"]]
+        install_search_index(connection)
+        self.stdout.write(f"Search index rebuilt ({connection.vendor}).")
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from packages.models import PackageStatusCount
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-status package counters from the package tables."
+
+    def handle(self, *args, **options):
+        PackageStatusCount.rebuild()
+        for row in PackageStatusCount.objects.order_by("status"):
+            self.stdout.write(f"{row.status}: {row.count}")
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+def seed_sequence(apps, schema_editor):
+    TrackingIdSequence = apps.get_model("packages", "TrackingIdSequence")
+    TrackingIdSequence.objects.get_or_create(name="tracking_id")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("packages", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TrackingIdSequence",
+            fields=[
+                (
+                    "name",
+                    models.CharField(max_length=32, primary_key=True, serialize=False),
+                ),
+                ("next_value", models.BigIntegerField(default=1)),
+            ],
+        ),
+        migrations.RunPython(seed_sequence, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:15
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_current_status(apps, schema_editor):
+    # Only the current status is known for existing packages, so seed each
+    # timeline with that status at the time it was last updated.
+    Package = apps.get_model("packages", "Package")
+    PackageStatusEvent = apps.get_model("packages", "PackageStatusEvent")
+    batch = []
+    for package_id, status, updated_at in Package.objects.values_list(
+        "id", "status", "updated_at"
+    ).iterator(chunk_size=2000):
+        batch.append(
+            PackageStatusEvent(package_id=package_id, status=status, created_at=updated_at)
+        )
+        if len(batch) >= 2000:
+            PackageStatusEvent.objects.bulk_create(batch)
+            batch = []
+    PackageStatusEvent.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0002_tracking_id_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PackageStatusEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('waiting_bus', 'Waiting for package to reach bus station'), ('en_route_campus', 'Package in our van en route to campus'), ('at_campus_hub', 'Package at our campus hub'), ('delivered', 'Package delivered to recipient')], max_length=50)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('package', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='status_events', to='packages.package')),
+            ],
+            options={
+                'ordering': ['created_at', 'id'],
+                'indexes': [models.Index(fields=['package', 'created_at'], name='pkg_status_event_timeline'), models.Index(fields=['created_at'], name='pkg_status_event_created')],
+            },
+        ),
+        migrations.RunPython(backfill_current_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:17
+
+from django.db import migrations, models
+
+
+def mark_existing_photos_ready(apps, schema_editor):
+    Package = apps.get_model("packages", "Package")
+    Package.objects.exclude(photo="").exclude(photo__isnull=True).update(
+        photo_status="ready"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0003_package_status_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='package',
+            name='photo_staging_name',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='package',
+            name='photo_status',
+            field=models.CharField(blank=True, choices=[('pending', 'Waiting for processing'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Processing failed')], default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='package',
+            name='photo_thumbnail',
+            field=models.ImageField(blank=True, null=True, upload_to='package_photos/thumbnails/'),
+        ),
+        migrations.RunPython(mark_existing_photos_ready, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0004_package_photo_processing'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='package_status_created'),
+        ),
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(fields=['created_at', 'id'], name='package_created'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:28
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_counts(apps, schema_editor):
+    # Same computation as PackageStatusCount.rebuild(), on historical models.
+    Package = apps.get_model("packages", "Package")
+    PackageStatusEvent = apps.get_model("packages", "PackageStatusEvent")
+    PackageStatusCount = apps.get_model("packages", "PackageStatusCount")
+    PackageDailyStatusCount = apps.get_model("packages", "PackageDailyStatusCount")
+    totals = dict(Package.objects.values_list("status").annotate(n=Count("id")).order_by())
+    PackageStatusCount.objects.bulk_create(
+        [
+            PackageStatusCount(status=status, count=totals.get(status, 0))
+            for status in ("waiting_bus", "en_route_campus", "at_campus_hub", "delivered")
+        ]
+    )
+    daily = (
+        PackageStatusEvent.objects.annotate(day=TruncDate("created_at"))
+        .values_list("day", "status")
+        .annotate(n=Count("id"))
+        .order_by()
+    )
+    PackageDailyStatusCount.objects.bulk_create(
+        [PackageDailyStatusCount(day=day, status=status, entered=n) for day, status, n in daily],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0005_package_listing_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PackageStatusCount',
+            fields=[
+                ('status', models.CharField(choices=[('waiting_bus', 'Waiting for package to reach bus station'), ('en_route_campus', 'Package in our van en route to campus'), ('at_campus_hub', 'Package at our campus hub'), ('delivered', 'Package delivered to recipient')], max_length=50, primary_key=True, serialize=False)),
+                ('count', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PackageDailyStatusCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('waiting_bus', 'Waiting for package to reach bus station'), ('en_route_campus', 'Package in our van en route to campus'), ('at_campus_hub', 'Package at our campus hub'), ('delivered', 'Package delivered to recipient')], max_length=50)),
+                ('entered', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['day', 'status'],
+                'constraints': [models.UniqueConstraint(fields=('day', 'status'), name='pkg_daily_status_count_unique')],
+            },
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,88 @@
+from django.db import migrations
+
+# The SQL is frozen here rather than taken from packages.search, so later
+# changes to the live index definition do not change what this migration did.
+
+FTS_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS packages_package_fts_ai AFTER INSERT ON packages_package "
+    "BEGIN INSERT INTO packages_package_fts(rowid, tracking_id, sender_name, sender_phone, "
+    "sender_address, recipient_name, recipient_phone, recipient_address) VALUES (new.id, "
+    "new.tracking_id, new.sender_name, new.sender_phone, new.sender_address, "
+    "new.recipient_name, new.recipient_phone, new.recipient_address); END",
+    "CREATE TRIGGER IF NOT EXISTS packages_package_fts_ad AFTER DELETE ON packages_package "
+    "BEGIN INSERT INTO packages_package_fts(packages_package_fts, rowid, tracking_id, "
+    "sender_name, sender_phone, sender_address, recipient_name, recipient_phone, "
+    "recipient_address) VALUES ('delete', old.id, old.tracking_id, old.sender_name, "
+    "old.sender_phone, old.sender_address, old.recipient_name, old.recipient_phone, "
+    "old.recipient_address); END",
+    # Only the indexed columns: status changes must not rewrite the index.
+    "CREATE TRIGGER IF NOT EXISTS packages_package_fts_au AFTER UPDATE OF tracking_id, "
+    "sender_name, sender_phone, sender_address, recipient_name, recipient_phone, "
+    "recipient_address ON packages_package "
+    "BEGIN INSERT INTO packages_package_fts(packages_package_fts, rowid, tracking_id, "
+    "sender_name, sender_phone, sender_address, recipient_name, recipient_phone, "
+    "recipient_address) VALUES ('delete', old.id, old.tracking_id, old.sender_name, "
+    "old.sender_phone, old.sender_address, old.recipient_name, old.recipient_phone, "
+    "old.recipient_address); "
+    "INSERT INTO packages_package_fts(rowid, tracking_id, sender_name, sender_phone, "
+    "sender_address, recipient_name, recipient_phone, recipient_address) VALUES (new.id, "
+    "new.tracking_id, new.sender_name, new.sender_phone, new.sender_address, "
+    "new.recipient_name, new.recipient_phone, new.recipient_address); END",
+]
+
+TRGM_FIELDS = [
+    "sender_name",
+    "sender_phone",
+    "sender_address",
+    "recipient_name",
+    "recipient_phone",
+    "recipient_address",
+]
+
+INSTALL = {
+    "sqlite": [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS packages_package_fts USING fts5(tracking_id, "
+        "sender_name, sender_phone, sender_address, recipient_name, recipient_phone, "
+        "recipient_address, content='packages_package', content_rowid='id', "
+        "tokenize='trigram')",
+        *FTS_TRIGGERS,
+        "INSERT INTO packages_package_fts(packages_package_fts) VALUES ('rebuild')",
+    ],
+    "postgresql": ["CREATE EXTENSION IF NOT EXISTS pg_trgm"]
+    + [
+        f"CREATE INDEX IF NOT EXISTS pkg_search_{field}_trgm ON packages_package "
+        f"USING gin ((UPPER({field}::text)) gin_trgm_ops)"
+        for field in TRGM_FIELDS
+    ],
+}
+
+UNINSTALL = {
+    "sqlite": [
+        "DROP TRIGGER IF EXISTS packages_package_fts_ai",
+        "DROP TRIGGER IF EXISTS packages_package_fts_ad",
+        "DROP TRIGGER IF EXISTS packages_package_fts_au",
+        "DROP TABLE IF EXISTS packages_package_fts",
+    ],
+    "postgresql": [f"DROP INDEX IF EXISTS pkg_search_{field}_trgm" for field in TRGM_FIELDS],
+}
+
+
+def install(apps, schema_editor):
+    for statement in INSTALL.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+def uninstall(apps, schema_editor):
+    for statement in UNINSTALL.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0006_package_status_counts'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
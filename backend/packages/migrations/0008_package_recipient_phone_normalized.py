@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:34
+
+import re
+
+from django.db import migrations, models, transaction
+
+# Frozen copies of accounts.models.normalize_ghana_phone and
+# packages.backfills.backfill_recipient_phones as they were when this
+# migration was written, so later changes to either do not change it.
+GHANA_PHONE_REGEX = r"^(\+233|0)\d{9}$"
+PHONE_SEPARATORS = re.compile(r"[\s\-().]")
+BATCH_SIZE = 1000
+
+
+def normalize_ghana_phone(value):
+    if not value:
+        return None
+    compact = PHONE_SEPARATORS.sub("", value)
+    if not re.match(GHANA_PHONE_REGEX, compact):
+        return None
+    return "+233" + compact[-9:]
+
+
+def backfill(apps, schema_editor):
+    Package = apps.get_model("packages", "Package")
+    pending = Package.objects.filter(recipient_phone_normalized__isnull=True).order_by("pk")
+    last_pk = 0
+    while True:
+        batch = list(pending.filter(pk__gt=last_pk).only("pk", "recipient_phone")[:BATCH_SIZE])
+        if not batch:
+            return
+        last_pk = batch[-1].pk
+        changed = []
+        for package in batch:
+            package.recipient_phone_normalized = normalize_ghana_phone(package.recipient_phone)
+            if package.recipient_phone_normalized:
+                changed.append(package)
+        with transaction.atomic():
+            Package.objects.bulk_update(changed, ["recipient_phone_normalized"])
+
+
+class Migration(migrations.Migration):
+    # Let each backfill batch commit separately on large tables.
+    atomic = False
+
+    dependencies = [
+        ('packages', '0007_package_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='package',
+            name='recipient_phone_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=13, null=True),
+        ),
+        # Before the index exists, so the backfill does not maintain it.
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='package',
+            index=models.Index(fields=['recipient_phone_normalized', 'status', 'created_at'], name='package_pickup_phone'),
+        ),
+    ]
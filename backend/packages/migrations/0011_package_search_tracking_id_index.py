@@ -0,0 +1,28 @@
+from django.db import migrations
+
+# Frozen SQL; see 0007. SQLite's FTS table already covers tracking_id.
+INDEX = "pkg_search_tracking_id_trgm"
+
+
+def install(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {INDEX} ON packages_package "
+            "USING gin ((UPPER(tracking_id::text)) gin_trgm_ops)"
+        )
+
+
+def uninstall(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        schema_editor.execute(f"DROP INDEX IF EXISTS {INDEX}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0010_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
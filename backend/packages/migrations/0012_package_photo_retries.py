@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:09
+
+from django.db import migrations, models
+
+# Adding a NOT NULL column rebuilds the table on SQLite, which drops the
+# search index triggers; recreate them as 0007 defined them.
+FTS_TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS packages_package_fts_ai AFTER INSERT ON packages_package "
+    "BEGIN INSERT INTO packages_package_fts(rowid, tracking_id, sender_name, sender_phone, "
+    "sender_address, recipient_name, recipient_phone, recipient_address) VALUES (new.id, "
+    "new.tracking_id, new.sender_name, new.sender_phone, new.sender_address, "
+    "new.recipient_name, new.recipient_phone, new.recipient_address); END",
+    "CREATE TRIGGER IF NOT EXISTS packages_package_fts_ad AFTER DELETE ON packages_package "
+    "BEGIN INSERT INTO packages_package_fts(packages_package_fts, rowid, tracking_id, "
+    "sender_name, sender_phone, sender_address, recipient_name, recipient_phone, "
+    "recipient_address) VALUES ('delete', old.id, old.tracking_id, old.sender_name, "
+    "old.sender_phone, old.sender_address, old.recipient_name, old.recipient_phone, "
+    "old.recipient_address); END",
+    # Only the indexed columns: status changes must not rewrite the index.
+    "CREATE TRIGGER IF NOT EXISTS packages_package_fts_au AFTER UPDATE OF tracking_id, "
+    "sender_name, sender_phone, sender_address, recipient_name, recipient_phone, "
+    "recipient_address ON packages_package "
+    "BEGIN INSERT INTO packages_package_fts(packages_package_fts, rowid, tracking_id, "
+    "sender_name, sender_phone, sender_address, recipient_name, recipient_phone, "
+    "recipient_address) VALUES ('delete', old.id, old.tracking_id, old.sender_name, "
+    "old.sender_phone, old.sender_address, old.recipient_name, old.recipient_phone, "
+    "old.recipient_address); "
+    "INSERT INTO packages_package_fts(rowid, tracking_id, sender_name, sender_phone, "
+    "sender_address, recipient_name, recipient_phone, recipient_address) VALUES (new.id, "
+    "new.tracking_id, new.sender_name, new.sender_phone, new.sender_address, "
+    "new.recipient_name, new.recipient_phone, new.recipient_address); END",
+]
+
+
+def reinstall_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    for statement in FTS_TRIGGERS:
+        schema_editor.execute(statement)
+    schema_editor.execute(
+        "INSERT INTO packages_package_fts(packages_package_fts) VALUES ('rebuild')"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('packages', '0011_package_search_tracking_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='package',
+            name='photo_attempts',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='package',
+            name='photo_next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(reinstall_search_index, migrations.RunPython.noop),
+    ]
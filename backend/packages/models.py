@@ -1,7 +1,19 @@
-import uuid
+from collections import Counter
 
 from django.conf import settings
-from django.db import models
+from django.db import IntegrityError, connections, models, router, transaction
+from django.db.models import Case, Count, F, Value, When
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.db.models.sql import UpdateQuery
+from django.utils import timezone
+
+from accounts.models import normalize_ghana_phone
+
+from .broadcast import broadcaster
+from .cache import invalidate_tracking_payloads
+from .tracking_ids import allocate_tracking_ids
 
 # Status lifecycle – same text as your FastAPI version
 STATUS_CHOICES = [
@@ -18,6 +30,273 @@ STATUS_ORDER = [
     "delivered",
 ]
 
+NEXT_STATUS = dict(zip(STATUS_ORDER, STATUS_ORDER[1:]))
+PREVIOUS_STATUS = {following: current for current, following in NEXT_STATUS.items()}
+
+PHOTO_PENDING = "pending"
+PHOTO_PROCESSING = "processing"
+PHOTO_READY = "ready"
+PHOTO_FAILED = "failed"
+
+PHOTO_STATUS_CHOICES = [
+    (PHOTO_PENDING, "Waiting for processing"),
+    (PHOTO_PROCESSING, "Processing"),
+    (PHOTO_READY, "Ready"),
+    (PHOTO_FAILED, "Processing failed"),
+]
+
+
+class StatusConflict(Exception):
+    """The package was no longer at the status the caller expected."""
+
+    def __init__(self, package):
+        super().__init__(
+            f"Package {package.tracking_id} is at {package.status!r}."
+        )
+        self.package = package
+
+
+def _record_transitions(packages, at, previous=None):
+    """
+    Bookkeeping for packages that have just entered ``package.status``.
+
+    ``previous`` lists the status each package left, in the same order
+    (None for new packages); omit it when all the packages are new.
+
+    Must run inside the transaction that changed the status, so the timeline
+    and the status counters can never disagree with the package rows.
+    """
+    PackageStatusEvent.objects.bulk_create(
+        [
+            PackageStatusEvent(package_id=package.pk, status=package.status, created_at=at)
+            for package in packages
+        ]
+    )
+    statuses = [package.status for package in packages]
+    _update_status_counts(statuses, previous or [], at)
+    _invalidate_after_commit([package.tracking_id for package in packages])
+
+    messages = [(package.tracking_id, package.status_message()) for package in packages]
+
+    def publish():
+        for tracking_id, message in messages:
+            broadcaster.publish(tracking_id, message)
+
+    transaction.on_commit(publish)
+
+
+def _bump_counter(model, lookup: dict, field: str, delta: int):
+    """
+    Add ``delta`` to ``field`` of the counter row matching ``lookup``,
+    creating the row if needed, in one ``INSERT ... ON CONFLICT DO UPDATE``
+    where the backend supports it (PostgreSQL, SQLite).
+    """
+    db = router.db_for_write(model)
+    connection = connections[db]
+    if connection.features.supports_update_conflicts_with_target:
+        opts = model._meta
+        quote = connection.ops.quote_name
+        columns = [opts.get_field(name) for name in lookup]
+        target = opts.get_field(field)
+        params = [
+            column.get_db_prep_save(lookup[column.name], connection) for column in columns
+        ] + [delta]
+        table = quote(opts.db_table)
+        sql = (
+            f"INSERT INTO {table} "
+            f"({', '.join(quote(column.column) for column in columns + [target])}) "
+            f"VALUES ({', '.join(['%s'] * len(params))}) "
+            f"ON CONFLICT ({', '.join(quote(column.column) for column in columns)}) "
+            f"DO UPDATE SET {quote(target.column)} = "
+            f"{table}.{quote(target.column)} + EXCLUDED.{quote(target.column)}"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+        return
+
+    rows = model._default_manager.using(db).filter(**lookup)
+    if rows.update(**{field: F(field) + delta}):
+        return
+    try:
+        with transaction.atomic(using=db):
+            model._default_manager.using(db).create(**lookup, **{field: delta})
+    except IntegrityError:
+        # Another transaction created the row first.
+        rows.update(**{field: F(field) + delta})
+
+
+def _update_status_counts(entered, left, at):
+    """
+    Apply a batch of transitions to the status counters.
+
+    One UPDATE per status touched, however many packages moved. Rows are
+    always updated in STATUS_ORDER so concurrent transactions lock them in
+    the same order and cannot deadlock.
+    """
+    totals = Counter(entered)
+    totals.subtract(status for status in left if status)
+    entered_counts = Counter(entered)
+    day = timezone.localdate(at)
+    for status in STATUS_ORDER:
+        if totals[status]:
+            _bump_counter(
+                PackageStatusCount, {"status": status}, "count", totals[status]
+            )
+    for status in STATUS_ORDER:
+        if entered_counts[status]:
+            _bump_counter(
+                PackageDailyStatusCount,
+                {"day": day, "status": status},
+                "entered",
+                entered_counts[status],
+            )
+
+
+def _supports_update_returning(connection) -> bool:
+    """
+    Whether ``connection`` runs ``UPDATE ... RETURNING``: PostgreSQL, and
+    SQLite from 3.35. Other backends (MySQL, MariaDB, Oracle) do not.
+    """
+    if connection.vendor == "postgresql":
+        return True
+    if connection.vendor == "sqlite":
+        return connection.Database.sqlite_version_info >= (3, 35)
+    return False
+
+
+def _invalidate_after_commit(tracking_ids):
+    # Invalidate now and again once the change is visible: a request that
+    # reads the old row before commit must not keep it cached afterwards.
+    invalidate_tracking_payloads(tracking_ids)
+    transaction.on_commit(lambda: invalidate_tracking_payloads(tracking_ids))
+
+
+class PackageQuerySet(models.QuerySet):
+    def matching(self, status=None, created_after=None, created_before=None):
+        """Apply the operations filters shared by listing and export."""
+        queryset = self
+        if status:
+            queryset = queryset.filter(status=status)
+        if created_after:
+            queryset = queryset.filter(created_at__gte=created_after)
+        if created_before:
+            queryset = queryset.filter(created_at__lt=created_before)
+        return queryset
+
+    def bulk_create_with_tracking(self, packages):
+        """
+        bulk_create() for new packages that also assigns their tracking IDs
+        (one allocation for the whole batch) and starts their timelines, all
+        in one transaction.
+        """
+        for package, tracking_id in zip(packages, allocate_tracking_ids(len(packages))):
+            package.tracking_id = tracking_id
+            package.recipient_phone_normalized = normalize_ghana_phone(
+                package.recipient_phone
+            )
+        with transaction.atomic(using=self.db):
+            created = self.bulk_create(packages)
+            _record_transitions(created, timezone.now())
+        return created
+
+    def update_returning(self, **values):
+        """
+        Like update(), but returns the updated rows as model instances.
+
+        Uses a single ``UPDATE ... RETURNING`` statement where the backend
+        supports it (see ``_supports_update_returning``); elsewhere the rows
+        are locked with SELECT ... FOR UPDATE, updated and read back.
+        """
+        connection = connections[self.db]
+        if not _supports_update_returning(connection):
+            rows = self.model._default_manager.using(self.db)
+            with transaction.atomic(using=self.db):
+                pks = list(self.select_for_update().values_list("pk", flat=True))
+                rows.filter(pk__in=pks).update(**values)
+                return list(rows.filter(pk__in=pks))
+
+        query = self.query.chain(UpdateQuery)
+        query.add_update_values(values)
+        compiler = query.get_compiler(self.db)
+        compiler.pre_sql_setup()
+        update_sql, params = compiler.as_sql()
+        columns = ", ".join(
+            connection.ops.quote_name(field.column)
+            for field in self.model._meta.concrete_fields
+        )
+        with transaction.atomic(using=self.db):
+            return list(
+                self.model._default_manager.using(self.db).raw(
+                    f"{update_sql} RETURNING {columns}", params
+                )
+            )
+
+    def advance_one(self, tracking_id: str, expected_status: str | None = None):
+        """
+        Atomically move one package to its next status and return the row.
+
+        The transition is a single conditional UPDATE, so concurrent scans
+        cannot double-advance or lose an update. With ``expected_status`` the
+        row only moves if it is still at that status; otherwise
+        StatusConflict is raised. A package already at the final status is
+        returned unchanged. Raises Package.DoesNotExist for unknown IDs.
+        """
+        rows = self.filter(tracking_id=tracking_id)
+        if expected_status is None:
+            candidates = rows.filter(status__in=list(NEXT_STATUS))
+            next_status = Case(
+                *(
+                    When(status=current, then=Value(following))
+                    for current, following in NEXT_STATUS.items()
+                ),
+                output_field=models.CharField(),
+            )
+        else:
+            # An expected final status can never move; fall through to the
+            # lookup below, which reports it as unchanged or conflicting.
+            candidates = rows.filter(status=expected_status, status__in=list(NEXT_STATUS))
+            next_status = NEXT_STATUS.get(expected_status, expected_status)
+
+        now = timezone.now()
+        with transaction.atomic(using=self.db):
+            updated = candidates.update_returning(status=next_status, updated_at=now)
+            if updated:
+                _record_transitions(
+                    updated, now, [PREVIOUS_STATUS[row.status] for row in updated]
+                )
+                return updated[0]
+
+        package = rows.get()
+        if expected_status is not None and package.status != expected_status:
+            raise StatusConflict(package)
+        return package
+
+    def advance_status(self):
+        """
+        Move every package in the queryset one step along STATUS_ORDER.
+
+        Runs one UPDATE per lifecycle step regardless of how many rows are
+        selected. Returns a ``{previous_status: rows_moved}`` mapping.
+        """
+        now = timezone.now()
+        moved = {}
+        transitioned = []
+        previous = []
+        with transaction.atomic(using=self.db):
+            # Walk the lifecycle backwards so rows moved by one UPDATE are not
+            # matched again by the next one.
+            for current in reversed(STATUS_ORDER[:-1]):
+                rows = self.filter(status=current).update_returning(
+                    status=NEXT_STATUS[current], updated_at=now
+                )
+                if rows:
+                    moved[current] = len(rows)
+                    transitioned.extend(rows)
+                    previous.extend([current] * len(rows))
+            if transitioned:
+                _record_transitions(transitioned, now, previous)
+        return {status: moved[status] for status in STATUS_ORDER if status in moved}
+
 
 class Package(models.Model):
     tracking_id = models.CharField(
@@ -35,6 +314,11 @@ class Package(models.Model):
     recipient_phone = models.CharField(max_length=50)
     recipient_email = models.EmailField(blank=True, null=True)
     recipient_address = models.CharField(max_length=255)
+    # recipient_phone in accounts.models.normalize_ghana_phone form, for
+    # pickup lookups; None when it is not a recognisable Ghana number.
+    recipient_phone_normalized = models.CharField(
+        max_length=13, blank=True, null=True, editable=False
+    )
 
     # Package
     package_name = models.CharField(max_length=255)
@@ -54,8 +338,29 @@ class Package(models.Model):
             blank=True,
             null=True,
         )
+        photo_thumbnail = models.ImageField(
+            upload_to="package_photos/thumbnails/",
+            storage=MediaCloudinaryStorage(),
+            blank=True,
+            null=True,
+        )
     else:
         photo = models.ImageField(upload_to="package_photos/", blank=True, null=True)
+        photo_thumbnail = models.ImageField(
+            upload_to="package_photos/thumbnails/", blank=True, null=True
+        )
+
+    # Uploaded photos are staged locally and moved to `photo` by a background
+    # worker (see packages.photos); this tracks where that stands.
+    photo_status = models.CharField(
+        max_length=20, choices=PHOTO_STATUS_CHOICES, blank=True, default=""
+    )
+    photo_staging_name = models.CharField(max_length=255, blank=True, default="")
+    photo_attempts = models.PositiveSmallIntegerField(default=0)
+    # When a worker may next pick the photo up: pushed forward while one is
+    # processing it (so a crashed worker's photo is retried) and after a
+    # failure (retry backoff). Null means straight away.
+    photo_next_attempt_at = models.DateTimeField(null=True, blank=True)
 
     status = models.CharField(
         max_length=50,
@@ -63,24 +368,222 @@ class Package(models.Model):
         default="waiting_bus",
     )
 
+    # The signed-in user who submitted (or later claimed) the package.
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        related_name="packages",
+        blank=True,
+        null=True,
+        # Covered by the (owner, created_at, id) index below.
+        db_index=False,
+    )
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = PackageQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Keyset pagination for the staff listing, with and without a
+            # status filter (see packages.pagination).
+            models.Index(
+                fields=["status", "created_at", "id"], name="package_status_created"
+            ),
+            models.Index(fields=["created_at", "id"], name="package_created"),
+            # Hub pickup lookups by phone and status, newest first.
+            models.Index(
+                fields=["recipient_phone_normalized", "status", "created_at"],
+                name="package_pickup_phone",
+            ),
+            # Keyset pagination of a customer's own packages.
+            models.Index(
+                fields=["owner", "created_at", "id"], name="package_owner_created"
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_status = instance.__dict__.get("status")
+        return instance
+
     def save(self, *args, **kwargs):
         if not self.tracking_id:
-            # mimic your uuid4()[:8] style
-            self.tracking_id = str(uuid.uuid4())[:8]
-        super().save(*args, **kwargs)
+            self.tracking_id = allocate_tracking_ids(1)[0]
+        self.recipient_phone_normalized = normalize_ghana_phone(self.recipient_phone)
+        previous = None if self._state.adding else getattr(
+            self, "_loaded_status", self.status
+        )
+        status_changed = self._state.adding or self.status != previous
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if status_changed:
+                _record_transitions([self], self.updated_at, [previous])
+            else:
+                _invalidate_after_commit([self.tracking_id])
+        self._loaded_status = self.status
+
+    def status_message(self) -> dict:
+        """Payload pushed to streaming tracking clients."""
+        return {
+            "tracking_id": self.tracking_id,
+            "status": self.status,
+            "status_display": self.get_status_display(),
+            "updated_at": self.updated_at.isoformat(),
+        }
 
     def advance_status(self):
         """
         Move to the next status in STATUS_ORDER, if possible.
+
+        Only succeeds if the stored row is still at this instance's status;
+        raises StatusConflict if someone else advanced it first.
         """
-        try:
-            idx = STATUS_ORDER.index(self.status)
-        except ValueError:
-            idx = -1
-
-        if 0 <= idx < len(STATUS_ORDER) - 1:
-            self.status = STATUS_ORDER[idx + 1]
-            self.save()
+        updated = type(self).objects.advance_one(
+            self.tracking_id, expected_status=self.status
+        )
+        self.status = updated.status
+        self.updated_at = updated.updated_at
+
+
+class TrackingIdSequence(models.Model):
+    """Counter behind packages.tracking_ids.allocate_tracking_ids."""
+
+    name = models.CharField(max_length=32, primary_key=True)
+    next_value = models.BigIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.name} @ {self.next_value}"
+
+
+class PackageStatusEvent(models.Model):
+    """Append-only record of each status a package has entered."""
+
+    package = models.ForeignKey(
+        Package,
+        on_delete=models.CASCADE,
+        related_name="status_events",
+        # Covered by the (package, created_at) index below.
+        db_index=False,
+    )
+    status = models.CharField(max_length=50, choices=STATUS_CHOICES)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["created_at", "id"]
+        indexes = [
+            models.Index(
+                fields=["package", "created_at"], name="pkg_status_event_timeline"
+            ),
+            models.Index(fields=["created_at"], name="pkg_status_event_created"),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Package status events are append-only.")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.package_id} -> {self.status} at {self.created_at}"
+
+
+class PackageStatusCount(models.Model):
+    """
+    Number of packages currently at each status.
+
+    Maintained in the same transaction as every status change (see
+    _record_transitions), so dashboards read one row per status instead of
+    counting the Package table. ``manage.py rebuild_status_counts`` recomputes
+    it from scratch.
+    """
+
+    status = models.CharField(max_length=50, choices=STATUS_CHOICES, primary_key=True)
+    count = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.status}: {self.count}"
+
+    @classmethod
+    def rebuild(cls):
+        """Recompute the current and daily counters from the package tables."""
+        with transaction.atomic():
+            totals = dict(
+                Package.objects.values_list("status").annotate(n=Count("id")).order_by()
+            )
+            cls.objects.all().delete()
+            cls.objects.bulk_create(
+                [cls(status=status, count=totals.get(status, 0)) for status in STATUS_ORDER]
+            )
+            daily = (
+                PackageStatusEvent.objects.annotate(day=TruncDate("created_at"))
+                .values_list("day", "status")
+                .annotate(n=Count("id"))
+                .order_by()
+            )
+            PackageDailyStatusCount.objects.all().delete()
+            PackageDailyStatusCount.objects.bulk_create(
+                [
+                    PackageDailyStatusCount(day=day, status=status, entered=n)
+                    for day, status, n in daily
+                ],
+                batch_size=2000,
+            )
+
+
+class PackageDailyStatusCount(models.Model):
+    """How many packages entered each status on each (local) day."""
+
+    day = models.DateField()
+    status = models.CharField(max_length=50, choices=STATUS_CHOICES)
+    entered = models.BigIntegerField(default=0)
+
+    class Meta:
+        ordering = ["day", "status"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "status"], name="pkg_daily_status_count_unique"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.status}: {self.entered}"
+
+
+@receiver(post_delete, sender=Package)
+def _uncount_deleted_package(sender, instance, **kwargs):
+    # Deletions (including the admin's bulk delete, which sends this signal
+    # per row) leave the current status; the daily history is kept.
+    status = getattr(instance, "_loaded_status", instance.status)
+    _bump_counter(PackageStatusCount, {"status": status}, "count", -1)
+
+
+class IdempotencyKey(models.Model):
+    """
+    A client-supplied Idempotency-Key and the response it produced.
+
+    The row is inserted in the same transaction as the work it guards, so
+    a concurrent request with the same key blocks on the unique constraint
+    until the first one commits, then replays its response.
+    """
+
+    scope = models.CharField(max_length=50)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    # Filled in before the guarding transaction commits.
+    response_status = models.PositiveSmallIntegerField(null=True)
+    response_body = models.JSONField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["scope", "key"], name="idempotency_key_unique"),
+        ]
+        indexes = [
+            models.Index(fields=["expires_at"], name="idempotency_key_expires"),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}:{self.key}"
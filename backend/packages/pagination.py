@@ -0,0 +1,50 @@
+"""
+Keyset (cursor) pagination over ``(created_at, id)``, newest first.
+
+Each page is an index range scan that starts where the previous one ended,
+so the cost of a page does not grow with how deep into the list it is, and
+no ``COUNT(*)`` is needed. The "after the cursor" condition
+``(created_at, id) < (c, pk)`` is written as ``created_at <= c AND
+(created_at < c OR id < pk)``: the OR alone gives the planner no bound to
+start the scan from, the ANDed ``created_at <= c`` does.
+"""
+
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers
+
+ORDERING = ("-created_at", "-id")
+
+
+def encode_cursor(row) -> str:
+    raw = f"{row.created_at.isoformat()}|{row.pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, pk = base64.urlsafe_b64decode(padded).decode().split("|")
+        created_at = parse_datetime(created_at)
+        pk = int(pk)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        created_at = None
+    if created_at is None:
+        raise serializers.ValidationError({"cursor": ["Invalid cursor."]})
+    return created_at, pk
+
+
+def keyset_page(queryset, cursor: str | None, limit: int):
+    """Return ``(rows, next_cursor)`` for the page after ``cursor``."""
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk),
+            created_at__lte=created_at,
+        )
+    rows = list(queryset.order_by(*ORDERING)[: limit + 1])
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
@@ -0,0 +1,199 @@
+"""
+Background processing for package photos.
+
+Submissions only write the upload to a local staging directory and mark the
+package ``pending``; the storage upload (Cloudinary in production), resizing
+and thumbnail generation happen here, outside the request. Work is picked up
+either by an in-process thread pool right after the submission commits
+(``PACKAGE_PHOTO_PROCESSING = "thread"``) or by the ``process_package_photos``
+management command (``"queue"``).
+
+As in accounts.outbox, a claim pushes ``photo_next_attempt_at`` forward by
+a lease, so a photo whose worker died mid-upload (a deploy, a recycled
+process) becomes due again once the lease runs out. Failures are retried
+with exponential backoff up to PACKAGE_PHOTO_MAX_ATTEMPTS; after that the
+photo is marked failed and its staged file deleted. In thread mode, a retry
+is re-armed with a timer, and each process sweeps up photos that are due
+when it first starts its pool, so photos orphaned by a restart are picked
+up again.
+"""
+
+import io
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .cache import invalidate_tracking_payloads
+from .models import (
+    PHOTO_FAILED,
+    PHOTO_PENDING,
+    PHOTO_PROCESSING,
+    PHOTO_READY,
+    Package,
+)
+
+logger = logging.getLogger(__name__)
+
+# How long a worker may hold a photo before others may retry it.
+CLAIM_LEASE = timedelta(minutes=10)
+MAX_RETRY_DELAY = timedelta(hours=1)
+
+_executor = None
+
+
+def get_staging_storage():
+    return FileSystemStorage(location=settings.PACKAGE_PHOTO_STAGING_ROOT)
+
+
+def stage_photo(upload) -> str:
+    """Write an uploaded photo to local staging and return its staged name."""
+    extension = os.path.splitext(upload.name or "")[1].lower()
+    return get_staging_storage().save(f"{uuid.uuid4().hex}{extension}", upload)
+
+
+def _submit(function, *args):
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.PACKAGE_PHOTO_WORKERS,
+            thread_name_prefix="package-photos",
+        )
+        # Catch up on photos left behind by a previous process.
+        _executor.submit(_in_thread, process_pending_photos)
+    _executor.submit(_in_thread, function, *args)
+
+
+def schedule_photo_processing(package_id: int, delay: float = 0):
+    if settings.PACKAGE_PHOTO_PROCESSING != "thread":
+        return
+    if delay:
+        timer = threading.Timer(delay, _submit, (process_package_photo, package_id))
+        timer.daemon = True
+        timer.start()
+    else:
+        transaction.on_commit(lambda: _submit(process_package_photo, package_id))
+
+
+def _in_thread(function, *args):
+    close_old_connections()
+    try:
+        function(*args)
+    except Exception:
+        logger.exception("Package photo processing failed")
+    finally:
+        close_old_connections()
+
+
+def retry_delay(attempts: int) -> timedelta:
+    delay = timedelta(seconds=settings.PACKAGE_PHOTO_RETRY_DELAY * 2 ** (attempts - 1))
+    return min(delay, MAX_RETRY_DELAY)
+
+
+def _due(now):
+    return Package.objects.filter(
+        Q(photo_next_attempt_at__isnull=True) | Q(photo_next_attempt_at__lte=now),
+        photo_status__in=[PHOTO_PENDING, PHOTO_PROCESSING],
+    )
+
+
+def _record_failure(package):
+    attempts = package.photo_attempts
+    if attempts >= settings.PACKAGE_PHOTO_MAX_ATTEMPTS:
+        logger.error("Giving up on photo for package %s", package.pk)
+        Package.objects.filter(pk=package.pk).update(
+            photo_status=PHOTO_FAILED, photo_staging_name="", photo_next_attempt_at=None
+        )
+        get_staging_storage().delete(package.photo_staging_name)
+        return
+    delay = retry_delay(attempts)
+    Package.objects.filter(pk=package.pk).update(
+        photo_status=PHOTO_PENDING, photo_next_attempt_at=timezone.now() + delay
+    )
+    schedule_photo_processing(package.pk, delay=delay.total_seconds())
+
+
+def _encode_jpeg(image, max_dimension: int) -> bytes:
+    resized = image.copy()
+    resized.thumbnail((max_dimension, max_dimension))
+    buffer = io.BytesIO()
+    resized.save(buffer, format="JPEG", quality=85, optimize=True)
+    return buffer.getvalue()
+
+
+def process_package_photo(package_id: int) -> bool:
+    """
+    Upload, resize and thumbnail one pending photo.
+
+    Claims the package with a conditional UPDATE first, so several workers
+    can run at once without processing the same photo twice. Returns True if
+    this call did the work.
+    """
+    now = timezone.now()
+    claimed = _due(now).filter(pk=package_id).update(
+        photo_status=PHOTO_PROCESSING,
+        photo_attempts=F("photo_attempts") + 1,
+        photo_next_attempt_at=now + CLAIM_LEASE,
+    )
+    if not claimed:
+        return False
+
+    package = Package.objects.only("tracking_id", "photo_staging_name", "photo_attempts").get(
+        pk=package_id
+    )
+    staging = get_staging_storage()
+    try:
+        with staging.open(package.photo_staging_name, "rb") as staged:
+            image = ImageOps.exif_transpose(Image.open(staged)).convert("RGB")
+        full = _encode_jpeg(image, settings.PACKAGE_PHOTO_MAX_DIMENSION)
+        thumbnail = _encode_jpeg(image, settings.PACKAGE_PHOTO_THUMBNAIL_SIZE)
+
+        photo_field = Package._meta.get_field("photo")
+        thumbnail_field = Package._meta.get_field("photo_thumbnail")
+        photo_name = photo_field.storage.save(
+            photo_field.generate_filename(package, f"{package.tracking_id}.jpg"),
+            ContentFile(full),
+        )
+        thumbnail_name = thumbnail_field.storage.save(
+            thumbnail_field.generate_filename(package, f"{package.tracking_id}.jpg"),
+            ContentFile(thumbnail),
+        )
+    except Exception:
+        logger.exception("Photo processing failed for package %s", package_id)
+        _record_failure(package)
+        return False
+
+    Package.objects.filter(pk=package_id).update(
+        photo=photo_name,
+        photo_thumbnail=thumbnail_name,
+        photo_status=PHOTO_READY,
+        photo_staging_name="",
+        photo_next_attempt_at=None,
+        updated_at=timezone.now(),
+    )
+    staging.delete(package.photo_staging_name)
+    invalidate_tracking_payloads([package.tracking_id])
+    return True
+
+
+def process_pending_photos(limit: int = 50) -> int:
+    """
+    Process up to ``limit`` due photos, oldest first: new ones, retries
+    whose backoff has passed, and ones whose worker's lease ran out.
+    """
+    due = _due(timezone.now()).order_by("pk")
+    processed = 0
+    for package_id in due.values_list("pk", flat=True)[:limit]:
+        if process_package_photo(package_id):
+            processed += 1
+    return processed
@@ -0,0 +1,157 @@
+"""
+Indexed search over package sender and recipient details.
+
+``icontains`` with a leading wildcard cannot use a b-tree index, so each
+backend gets a real search index instead:
+
+* PostgreSQL: pg_trgm GIN indexes on ``UPPER(column)`` for every searched
+  column, which serve the ``icontains`` filter directly (an OR can only be
+  answered from indexes if every branch has one); results are ranked by
+  trigram word similarity.
+* SQLite: an FTS5 table with the trigram tokenizer, kept in sync with
+  ``packages_package`` by triggers; results are ranked by bm25.
+
+Both match substrings of at least three characters. Shorter terms, and
+databases without either index, fall back to unranked ``icontains``.
+
+SQLite drops a table's triggers when Django rebuilds it during a
+migration; run ``manage.py rebuild_search_index`` after such migrations.
+Until then searches fall back to ``icontains`` rather than reading an
+index that no longer follows the table.
+"""
+
+from functools import reduce
+from operator import or_
+
+from django.db import connections, router
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Greatest
+
+SEARCH_FIELDS = (
+    "tracking_id",
+    "sender_name",
+    "sender_phone",
+    "sender_address",
+    "recipient_name",
+    "recipient_phone",
+    "recipient_address",
+)
+
+MIN_TERM_LENGTH = 3
+
+PACKAGE_TABLE = "packages_package"
+FTS_TABLE = "packages_package_fts"
+
+_TRIGGER_SUFFIXES = ("ai", "ad", "au")
+
+
+def _columns(prefix=""):
+    return ", ".join(f"{prefix}{field}" for field in SEARCH_FIELDS)
+
+
+def _sqlite_index_sql():
+    columns = _columns()
+    new = _columns("new.")
+    old = _columns("old.")
+    delete_old = (
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {columns}) "
+        f"VALUES ('delete', old.id, {old});"
+    )
+    insert_new = f"INSERT INTO {FTS_TABLE}(rowid, {columns}) VALUES (new.id, {new});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        f"{columns}, content='{PACKAGE_TABLE}', content_rowid='id', "
+        "tokenize='trigram')",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {PACKAGE_TABLE} "
+        f"BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {PACKAGE_TABLE} "
+        f"BEGIN {delete_old} END",
+        # Only the indexed columns: status changes must not rewrite the index.
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF {columns} "
+        f"ON {PACKAGE_TABLE} BEGIN {delete_old} {insert_new} END",
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+    ]
+
+
+def _postgresql_index_sql():
+    return ["CREATE EXTENSION IF NOT EXISTS pg_trgm"] + [
+        f"CREATE INDEX IF NOT EXISTS pkg_search_{field}_trgm ON {PACKAGE_TABLE} "
+        f"USING gin ((UPPER({field}::text)) gin_trgm_ops)"
+        for field in SEARCH_FIELDS
+    ]
+
+
+def install_search_index(connection):
+    """Create (or repair) the search index for the connection's backend."""
+    if connection.vendor == "sqlite":
+        statements = _sqlite_index_sql()
+    elif connection.vendor == "postgresql":
+        statements = _postgresql_index_sql()
+    else:
+        return
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def _has_fts(connection) -> bool:
+    # Checked on every search (sqlite_master is read from the in-memory
+    # schema): a migration in another process may have dropped the triggers.
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT COUNT(*) FROM sqlite_master WHERE name IN (%s, %s, %s, %s)",
+            [FTS_TABLE] + [f"{FTS_TABLE}_{suffix}" for suffix in _TRIGGER_SUFFIXES],
+        )
+        return cursor.fetchone()[0] == 1 + len(_TRIGGER_SUFFIXES)
+
+
+def _fts_query(term: str) -> str:
+    # Quote every word so user input is never parsed as FTS5 syntax; the
+    # words are ANDed together.
+    return " ".join(
+        '"{}"'.format(word.replace('"', '""'))
+        for word in term.split()
+        if len(word) >= MIN_TERM_LENGTH
+    )
+
+
+def _icontains(term: str) -> Q:
+    return reduce(or_, (Q(**{f"{field}__icontains": term}) for field in SEARCH_FIELDS))
+
+
+def search_packages(queryset, term: str):
+    """
+    Filter ``queryset`` to packages matching ``term``, annotated with a
+    ``search_rank`` (higher is better). The caller chooses the ordering.
+    """
+    term = term.strip()
+    connection = connections[queryset.db or router.db_for_read(queryset.model)]
+
+    if connection.vendor == "sqlite" and _fts_query(term) and _has_fts(connection):
+        match = _fts_query(term)
+        return queryset.filter(
+            pk__in=RawSQL(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]
+            )
+        ).annotate(
+            # bm25() is lower for better matches; negate it so that, as on
+            # PostgreSQL, higher ranks come first.
+            search_rank=RawSQL(
+                f"(SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = {PACKAGE_TABLE}.id)",
+                [match],
+                output_field=FloatField(),
+            )
+        )
+
+    queryset = queryset.filter(_icontains(term))
+    if connection.vendor == "postgresql" and len(term) >= MIN_TERM_LENGTH:
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        return queryset.annotate(
+            search_rank=Greatest(
+                *(TrigramWordSimilarity(Value(term), F(field)) for field in SEARCH_FIELDS)
+            )
+        )
+    return queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
@@ -1,5 +1,11 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import Package, STATUS_CHOICES
+
+from accounts.models import ghana_phone_validator, normalize_ghana_phone
+from senderplus_core.images import compact_image
+
+from .models import PHOTO_PENDING, Package, PackageStatusEvent, STATUS_CHOICES
+from .photos import schedule_photo_processing, stage_photo
 
 
 class PackageCreateSerializer(serializers.ModelSerializer):
@@ -33,10 +39,48 @@ class PackageCreateSerializer(serializers.ModelSerializer):
     )
     description = serializers.CharField(required=False, allow_blank=True)
 
+    def validate_photo(self, value):
+        # Downscale and re-encode before staging, so neither the staging
+        # disk nor the photo worker ever handles the camera original.
+        if not value:
+            return value
+        return compact_image(value, settings.PACKAGE_PHOTO_MAX_DIMENSION)
+
+    def create(self, validated_data):
+        # Keep the storage upload out of the request: stage locally and let
+        # the photo worker finish it.
+        photo = validated_data.pop("photo", None)
+        if photo:
+            validated_data["photo_status"] = PHOTO_PENDING
+            validated_data["photo_staging_name"] = stage_photo(photo)
+        package = super().create(validated_data)
+        if photo:
+            schedule_photo_processing(package.pk)
+        return package
+
+
+class PackageBulkRowSerializer(PackageCreateSerializer):
+    class Meta(PackageCreateSerializer.Meta):
+        fields = [
+            name for name in PackageCreateSerializer.Meta.fields if name != "photo"
+        ]
+
+
+class PackageStatusEventSerializer(serializers.ModelSerializer):
+    status_display = serializers.CharField(source="get_status_display")
+
+    class Meta:
+        model = PackageStatusEvent
+        fields = ["status", "status_display", "created_at"]
+
 
 class PackageDetailSerializer(serializers.ModelSerializer):
     status_display = serializers.SerializerMethodField()
     photo_url = serializers.SerializerMethodField()
+    thumbnail_url = serializers.SerializerMethodField()
+    timeline = PackageStatusEventSerializer(
+        source="status_events", many=True, read_only=True
+    )
 
     class Meta:
         model = Package
@@ -57,8 +101,11 @@ class PackageDetailSerializer(serializers.ModelSerializer):
             "description",
             "photo",
             "photo_url",
+            "photo_status",
+            "thumbnail_url",
             "status",
             "status_display",
+            "timeline",
             "created_at",
             "updated_at",
         ]
@@ -70,3 +117,89 @@ class PackageDetailSerializer(serializers.ModelSerializer):
         if obj.photo:
             return obj.photo.url
         return None
+
+    def get_thumbnail_url(self, obj):
+        if obj.photo_thumbnail:
+            return obj.photo_thumbnail.url
+        return None
+
+
+class TrackingBatchSerializer(serializers.Serializer):
+    tracking_ids = serializers.ListField(
+        child=serializers.CharField(max_length=64, allow_blank=True),
+        allow_empty=False,
+        max_length=settings.TRACKING_BATCH_MAX_IDS,
+    )
+
+
+class AdvanceStatusSerializer(serializers.Serializer):
+    # The status the client last saw; omitted or blank skips the check.
+    expected_status = serializers.ChoiceField(
+        choices=STATUS_CHOICES, required=False, allow_blank=True, allow_null=True
+    )
+
+
+class PackageFilterSerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=STATUS_CHOICES, required=False)
+    created_after = serializers.DateTimeField(required=False)
+    created_before = serializers.DateTimeField(required=False)
+
+
+class PackageExportFilterSerializer(PackageFilterSerializer):
+    output = serializers.ChoiceField(choices=["csv", "ndjson"], default="csv")
+
+
+class PackageListQuerySerializer(PackageFilterSerializer):
+    cursor = serializers.CharField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=200, default=50)
+
+
+class PackageSearchQuerySerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=100)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+
+class PickupLookupSerializer(serializers.Serializer):
+    phone = serializers.CharField(max_length=50)
+    status = serializers.ChoiceField(choices=STATUS_CHOICES, default="at_campus_hub")
+
+    def validate_phone(self, value):
+        normalized = normalize_ghana_phone(value)
+        if normalized is None:
+            raise serializers.ValidationError(ghana_phone_validator.message)
+        return normalized
+
+
+class PackageStatsQuerySerializer(serializers.Serializer):
+    days = serializers.IntegerField(min_value=0, max_value=90, default=7)
+
+
+class PackageListSerializer(serializers.ModelSerializer):
+    status_display = serializers.CharField(source="get_status_display")
+
+    # Columns loaded for the list; keeps description/photo off the wire.
+    LOAD_FIELDS = [
+        "id",
+        "tracking_id",
+        "sender_name",
+        "recipient_name",
+        "recipient_phone",
+        "package_name",
+        "status",
+        "created_at",
+        "updated_at",
+    ]
+
+    class Meta:
+        model = Package
+        fields = [
+            "tracking_id",
+            "sender_name",
+            "recipient_name",
+            "recipient_phone",
+            "package_name",
+            "status",
+            "status_display",
+            "created_at",
+            "updated_at",
+        ]
@@ -1,13 +1,81 @@
+import asyncio
+import csv
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from unittest import mock
+
+from asgiref.sync import SyncToAsync, ThreadSensitiveContext, sync_to_async
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import AsyncClient, Client, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from accounts.housekeeping import purge_expired
+from accounts.models import CustomerProfile
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APIClient
 
-from .models import Package, STATUS_ORDER
+from .broadcast import broadcaster
+from .cache import aget_tracking_version, get_cache_stats, invalidate_tracking_payloads
+from .exports import EXPORT_FIELDS
+from .fastpath import serialize_package_detail
+from .models import (
+    IdempotencyKey,
+    Package,
+    PackageDailyStatusCount,
+    PackageStatusCount,
+    STATUS_ORDER,
+    StatusConflict,
+    _supports_update_returning,
+)
+from .pagination import encode_cursor, keyset_page
+from .photos import process_package_photo, process_pending_photos
+from .search import FTS_TABLE
+from .serializers import PackageDetailSerializer
+from .views import _status_events
+from .tracking_ids import (
+    allocate_tracking_ids,
+    encode_tracking_id,
+    normalize_tracking_id,
+)
+
+
+def _create_package(**overrides):
+    fields = {
+        "sender_name": "Alice",
+        "sender_phone": "123456789",
+        "sender_address": "1 Sender Lane",
+        "recipient_name": "Bob",
+        "recipient_phone": "987654321",
+        "recipient_address": "2 Recipient Road",
+        "package_name": "Book",
+        "package_type": "Document",
+        "weight": "1.5",
+    }
+    fields.update(overrides)
+    return Package.objects.create(**fields)
 
 
 class PackageApiTests(TestCase):
     def setUp(self):
         self.client = APIClient()
+        cache.clear()
 
     def test_submit_package_creates_record(self):
         payload = {
@@ -81,3 +149,1465 @@ class PackageApiTests(TestCase):
         self.assertEqual(response.status_code, 200)
         package.refresh_from_db()
         self.assertEqual(package.status, STATUS_ORDER[1])
+
+
+class TrackingCacheTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+        # The test cache is per-process LocMem, which leaves it off by default.
+        overrides = self.settings(TRACKING_CACHE_ENABLED=True)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def test_repeat_track_is_served_from_cache(self):
+        package = _create_package()
+
+        with self.assertNumQueries(2):
+            first = self.client.get(f"/track/{package.tracking_id}")
+        with self.assertNumQueries(0):
+            second = self.client.get(f"/track/{package.tracking_id}")
+
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(get_cache_stats()["hits"], 1)
+        self.assertEqual(get_cache_stats()["misses"], 1)
+
+    def test_advance_status_invalidates_cached_payload(self):
+        package = _create_package()
+        self.client.get(f"/track/{package.tracking_id}")
+
+        package.advance_status()
+        response = self.client.get(f"/track/{package.tracking_id}")
+
+        self.assertEqual(response.data["status"], STATUS_ORDER[1])
+
+    def test_concurrent_invalidations_each_advance_the_version(self):
+        def invalidate():
+            for _ in range(200):
+                invalidate_tracking_payloads(["abcdef12", "12345678"])
+
+        threads = [threading.Thread(target=invalidate) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(asyncio.run(aget_tracking_version("abcdef12")), 800)
+        self.assertEqual(asyncio.run(aget_tracking_version("12345678")), 800)
+
+    def test_missing_package_is_cached_until_created(self):
+        response = self.client.get("/track/abcdef12")
+        self.assertEqual(response.status_code, 404)
+        with self.assertNumQueries(0):
+            response = self.client.get("/track/abcdef12")
+        self.assertEqual(response.status_code, 404)
+
+        _create_package(tracking_id="abcdef12")
+        response = self.client.get("/track/abcdef12")
+        self.assertEqual(response.status_code, 200)
+
+    def test_waiter_takes_over_as_soon_as_the_lock_is_released(self):
+        package = _create_package()
+        lock_key = f"track:lock:{package.tracking_id}"
+        cache.add(lock_key, 1)
+        sleeps = []
+
+        def holder_fails(seconds):
+            # The render holding the lock gives up without caching anything.
+            sleeps.append(seconds)
+            cache.delete(lock_key)
+
+        with mock.patch("packages.cache.time.sleep", side_effect=holder_fails):
+            response = self.client.get(f"/track/{package.tracking_id}")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(sleeps), 1)
+        self.assertIsNone(cache.get(lock_key))
+
+    def test_cache_is_bypassed_when_not_shared(self):
+        package = _create_package()
+
+        with self.settings(TRACKING_CACHE_ENABLED=False):
+            for _ in range(2):
+                with self.assertNumQueries(2):
+                    self.client.get(f"/track/{package.tracking_id}")
+
+    def test_cache_stats_require_staff(self):
+        response = self.client.get("/tracking-cache/stats")
+        self.assertIn(response.status_code, [401, 403])
+
+        admin_user = get_user_model().objects.create_user(
+            username="admin", password="password", is_staff=True
+        )
+        self.client.force_authenticate(user=admin_user)
+        response = self.client.get("/tracking-cache/stats")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("hit_ratio", response.data)
+
+
+class TrackingConditionalGetTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+        overrides = self.settings(TRACKING_CACHE_ENABLED=True)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def test_track_sets_validators_and_cache_control(self):
+        package = _create_package()
+
+        response = self.client.get(f"/track/{package.tracking_id}")
+
+        self.assertTrue(response["ETag"].startswith('"'))
+        self.assertIn("Last-Modified", response)
+        self.assertIn("must-revalidate", response["Cache-Control"])
+        self.assertIn("s-maxage", response["Cache-Control"])
+
+    def test_matching_etag_returns_304_without_body(self):
+        package = _create_package()
+        etag = self.client.get(f"/track/{package.tracking_id}")["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                f"/track/{package.tracking_id}", HTTP_IF_NONE_MATCH=etag
+            )
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], etag)
+
+    def test_status_change_invalidates_etag(self):
+        package = _create_package()
+        first = self.client.get(f"/track/{package.tracking_id}")
+
+        package.advance_status()
+        response = self.client.get(
+            f"/track/{package.tracking_id}",
+            HTTP_IF_NONE_MATCH=first["ETag"],
+            HTTP_IF_MODIFIED_SINCE=first["Last-Modified"],
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], first["ETag"])
+
+    def test_if_modified_since_returns_304(self):
+        package = _create_package()
+        first = self.client.get(f"/track/{package.tracking_id}")
+
+        response = self.client.get(
+            f"/track/{package.tracking_id}",
+            HTTP_IF_MODIFIED_SINCE=first["Last-Modified"],
+        )
+
+        self.assertEqual(response.status_code, 304)
+
+
+class BulkAdvanceStatusTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def _advance_and_count_queries(self, queryset):
+        with CaptureQueriesContext(connection) as ctx:
+            moved = queryset.advance_status()
+        return moved, len(ctx.captured_queries)
+
+    def test_bulk_advance_moves_each_package_one_step(self):
+        waiting = _create_package()
+        en_route = _create_package(status="en_route_campus")
+        delivered = _create_package(status="delivered")
+
+        moved = Package.objects.all().advance_status()
+
+        self.assertEqual(moved, {"waiting_bus": 1, "en_route_campus": 1})
+        waiting.refresh_from_db()
+        en_route.refresh_from_db()
+        delivered.refresh_from_db()
+        self.assertEqual(waiting.status, "en_route_campus")
+        self.assertEqual(en_route.status, "at_campus_hub")
+        self.assertEqual(delivered.status, "delivered")
+
+    def test_bulk_advance_query_count_is_constant(self):
+        for _ in range(3):
+            _create_package()
+        _, small = self._advance_and_count_queries(Package.objects.all())
+
+        # Same lifecycle step as before, so the same counters are touched.
+        for _ in range(20):
+            _create_package()
+        _, large = self._advance_and_count_queries(
+            Package.objects.filter(status="waiting_bus")
+        )
+
+        self.assertEqual(small, large)
+
+    def test_admin_action_reports_moved_rows(self):
+        package = _create_package()
+        get_user_model().objects.create_superuser(
+            username="root", email="root@example.com", password="password"
+        )
+        client = Client()
+        client.login(username="root", password="password")
+
+        response = client.post(
+            "/admin/packages/package/",
+            {"action": "advance_status_action", "_selected_action": [package.pk]},
+            follow=True,
+        )
+
+        package.refresh_from_db()
+        self.assertEqual(package.status, "en_route_campus")
+        self.assertContains(response, "Advanced 1 package(s)")
+
+
+class AtomicAdvanceStatusTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+        admin_user = get_user_model().objects.create_user(
+            username="admin", password="password", is_staff=True
+        )
+        self.client.force_authenticate(user=admin_user)
+
+    def test_advance_one_returns_updated_row(self):
+        package = _create_package()
+
+        updated = Package.objects.advance_one(
+            package.tracking_id, expected_status="waiting_bus"
+        )
+
+        self.assertEqual(updated.pk, package.pk)
+        self.assertEqual(updated.status, "en_route_campus")
+        self.assertGreater(updated.updated_at, package.updated_at)
+        self.assertEqual(updated.sender_name, "Alice")
+
+    def test_advance_without_update_returning_locks_and_rereads(self):
+        package = _create_package()
+
+        with mock.patch("packages.models._supports_update_returning", return_value=False):
+            updated = Package.objects.advance_one(package.tracking_id)
+
+        self.assertEqual(updated.status, "en_route_campus")
+        self.assertEqual(updated.sender_name, "Alice")
+
+    def test_update_returning_is_only_used_where_supported(self):
+        def backend(vendor, sqlite_version=None):
+            return mock.Mock(
+                vendor=vendor, Database=mock.Mock(sqlite_version_info=sqlite_version)
+            )
+
+        self.assertTrue(_supports_update_returning(backend("postgresql")))
+        self.assertTrue(_supports_update_returning(backend("sqlite", (3, 35, 0))))
+        self.assertFalse(_supports_update_returning(backend("sqlite", (3, 34, 1))))
+        self.assertFalse(_supports_update_returning(backend("mysql")))
+
+    def test_stale_instance_cannot_double_advance(self):
+        package = _create_package()
+        stale_copy = Package.objects.get(pk=package.pk)
+
+        package.advance_status()
+        with self.assertRaises(StatusConflict):
+            stale_copy.advance_status()
+
+        package.refresh_from_db()
+        self.assertEqual(package.status, "en_route_campus")
+
+    def test_view_returns_conflict_for_outdated_expected_status(self):
+        package = _create_package(status="at_campus_hub")
+
+        response = self.client.post(
+            f"/advance-status/{package.tracking_id}",
+            {"expected_status": "waiting_bus"},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["package"]["status"], "at_campus_hub")
+        package.refresh_from_db()
+        self.assertEqual(package.status, "at_campus_hub")
+
+    def test_view_advances_matching_expected_status(self):
+        package = _create_package()
+
+        response = self.client.post(
+            f"/advance-status/{package.tracking_id}",
+            {"expected_status": "waiting_bus"},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["status"], "en_route_campus")
+
+    def test_view_leaves_delivered_package_unchanged(self):
+        package = _create_package(status="delivered")
+
+        response = self.client.post(f"/advance-status/{package.tracking_id}")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["status"], "delivered")
+
+    def test_view_rejects_malformed_bodies(self):
+        package = _create_package()
+
+        for body in (["waiting_bus"], {"expected_status": "lost"}):
+            response = self.client.post(
+                f"/advance-status/{package.tracking_id}", body, format="json"
+            )
+            self.assertEqual(response.status_code, 400)
+
+        package.refresh_from_db()
+        self.assertEqual(package.status, "waiting_bus")
+
+    def test_view_returns_404_for_unknown_package(self):
+        response = self.client.post("/advance-status/abcdef12")
+        self.assertEqual(response.status_code, 404)
+
+
+class TrackingIdTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+
+    def test_allocated_ids_are_unique_and_self_checking(self):
+        ids = allocate_tracking_ids(500) + allocate_tracking_ids(500)
+
+        self.assertEqual(len(set(ids)), 1000)
+        for tracking_id in ids:
+            self.assertEqual(len(tracking_id), 9)
+            self.assertEqual(normalize_tracking_id(tracking_id), tracking_id)
+
+    def test_encoding_is_a_bijection_on_a_counter_range(self):
+        encoded = {encode_tracking_id(value) for value in range(1, 20001)}
+        self.assertEqual(len(encoded), 20000)
+
+    def test_ids_depend_on_the_secret_not_just_the_counter(self):
+        with self.settings(TRACKING_ID_SECRET="first"):
+            first = [encode_tracking_id(value) for value in range(1, 101)]
+        with self.settings(TRACKING_ID_SECRET="second"):
+            second = [encode_tracking_id(value) for value in range(1, 101)]
+            package = _create_package()
+
+        self.assertFalse(set(first) & set(second))
+        self.assertNotIn(package.tracking_id, first)
+        for tracking_id in first + second:
+            self.assertEqual(normalize_tracking_id(tracking_id), tracking_id)
+
+    def test_single_character_typos_are_rejected(self):
+        tracking_id = allocate_tracking_ids(1)[0]
+        for position in range(len(tracking_id)):
+            for replacement in "0123456789ABCDEFGHJKMNPQRSTVWXYZ":
+                if replacement == tracking_id[position]:
+                    continue
+                typo = (
+                    tracking_id[:position] + replacement + tracking_id[position + 1 :]
+                )
+                self.assertIsNone(normalize_tracking_id(typo))
+
+    def test_normalization_accepts_lowercase_and_legacy_ids(self):
+        tracking_id = allocate_tracking_ids(1)[0]
+
+        self.assertEqual(normalize_tracking_id(tracking_id.lower()), tracking_id)
+        self.assertEqual(normalize_tracking_id(" 1a2b3c4d "), "1a2b3c4d")
+        self.assertIsNone(normalize_tracking_id("not-an-id"))
+
+    def test_track_rejects_malformed_id_without_queries(self):
+        package = _create_package()
+        typo = package.tracking_id[:-1] + (
+            "0" if package.tracking_id[-1] != "0" else "1"
+        )
+
+        with self.assertNumQueries(0):
+            response = self.client.get(f"/track/{typo}")
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(
+            self.client.get(f"/track/{package.tracking_id.lower()}").status_code, 200
+        )
+
+
+class StatusTimelineTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+
+    def test_creation_and_transitions_append_events(self):
+        package = _create_package()
+        package.advance_status()
+        Package.objects.filter(pk=package.pk).advance_status()
+
+        events = list(package.status_events.values_list("status", flat=True))
+
+        self.assertEqual(events, STATUS_ORDER[:3])
+
+    def test_admin_status_edit_appends_event(self):
+        package = Package.objects.get(pk=_create_package().pk)
+        package.status = "at_campus_hub"
+        package.save()
+        package.description = "Fragile"
+        package.save()
+
+        self.assertEqual(
+            list(package.status_events.values_list("status", flat=True)),
+            ["waiting_bus", "at_campus_hub"],
+        )
+
+    def test_view_advance_appends_event(self):
+        package = _create_package()
+        admin_user = get_user_model().objects.create_user(
+            username="admin", password="password", is_staff=True
+        )
+        self.client.force_authenticate(user=admin_user)
+
+        self.client.post(f"/advance-status/{package.tracking_id}")
+
+        self.assertEqual(package.status_events.count(), 2)
+
+    def test_events_are_append_only(self):
+        event = _create_package().status_events.get()
+        event.status = "delivered"
+        with self.assertRaises(ValueError):
+            event.save()
+
+    def test_tracking_payload_includes_timeline(self):
+        package = _create_package()
+        package.advance_status()
+
+        response = self.client.get(f"/track/{package.tracking_id}")
+
+        self.assertEqual(
+            [entry["status"] for entry in response.data["timeline"]],
+            ["waiting_bus", "en_route_campus"],
+        )
+        self.assertEqual(
+            response.data["timeline"][1]["status_display"],
+            "Package in our van en route to campus",
+        )
+
+
+class TrackBatchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(
+            user=get_user_model().objects.create_user(username="desk", password="password")
+        )
+
+    def test_batch_requires_authentication(self):
+        package = _create_package()
+        self.client.force_authenticate(user=None)
+
+        response = self.client.post(
+            "/track/batch", {"tracking_ids": [package.tracking_id]}, format="json"
+        )
+
+        self.assertIn(response.status_code, [401, 403])
+
+    def test_batch_resolves_found_and_not_found_ids(self):
+        first = _create_package()
+        second = _create_package(recipient_name="Carol")
+        missing = allocate_tracking_ids(1)[0]
+
+        with self.assertNumQueries(2):
+            response = self.client.post(
+                "/track/batch",
+                {
+                    "tracking_ids": [
+                        second.tracking_id,
+                        first.tracking_id.lower(),
+                        missing,
+                        "garbage",
+                    ]
+                },
+                format="json",
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [package["tracking_id"] for package in response.data["packages"]],
+            [second.tracking_id, first.tracking_id],
+        )
+        self.assertEqual(response.data["not_found"], ["garbage", missing])
+
+    def test_batch_matches_single_track_fields(self):
+        package = _create_package()
+
+        batch = self.client.post(
+            "/track/batch", {"tracking_ids": [package.tracking_id]}, format="json"
+        )
+        single = self.client.get(f"/track/{package.tracking_id}")
+
+        self.assertEqual(batch.data["packages"][0], single.data)
+
+    def test_batch_rejects_oversized_requests(self):
+        response = self.client.post(
+            "/track/batch",
+            {"tracking_ids": ["abcdef12"] * (settings.TRACKING_BATCH_MAX_IDS + 1)},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+
+class PackageExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        admin_user = get_user_model().objects.create_user(
+            username="admin", password="password", is_staff=True
+        )
+        self.client.force_authenticate(user=admin_user)
+
+    def test_export_streams_csv_filtered_by_status(self):
+        waiting = _create_package()
+        _create_package(status="delivered")
+
+        response = self.client.get("/packages/export", {"status": "waiting_bus"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        content = b"".join(response.streaming_content).decode()
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(rows[0][0], "tracking_id")
+        self.assertEqual([row[0] for row in rows[1:]], [waiting.tracking_id])
+
+    def test_export_streams_ndjson_filtered_by_created_range(self):
+        old = _create_package()
+        Package.objects.filter(pk=old.pk).update(
+            created_at=timezone.now() - timedelta(days=30)
+        )
+        recent = _create_package()
+
+        response = self.client.get(
+            "/packages/export",
+            {
+                "output": "ndjson",
+                "created_after": (timezone.now() - timedelta(days=1)).isoformat(),
+            },
+        )
+
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertEqual(
+            [json.loads(line)["tracking_id"] for line in lines], [recent.tracking_id]
+        )
+
+    def test_csv_export_neutralizes_formulas(self):
+        _create_package(sender_name="=HYPERLINK(\"http://x\")", recipient_name="@SUM(A1)")
+
+        response = self.client.get("/packages/export")
+
+        content = b"".join(response.streaming_content).decode()
+        row = dict(zip(EXPORT_FIELDS, list(csv.reader(io.StringIO(content)))[1]))
+        self.assertEqual(row["sender_name"], "'=HYPERLINK(\"http://x\")")
+        self.assertEqual(row["recipient_name"], "'@SUM(A1)")
+        self.assertEqual(row["recipient_phone"], "987654321")
+
+    async def test_export_is_streamed_asynchronously_under_asgi(self):
+        admin_user = await get_user_model().objects.aget(username="admin")
+        packages = [await sync_to_async(_create_package)() for _ in range(5)]
+        client = AsyncClient()
+        await client.aforce_login(admin_user)
+
+        with mock.patch("packages.exports.EXPORT_CHUNK_SIZE", 2):
+            response = await client.get("/packages/export")
+            self.assertTrue(response.is_async)
+            content = b"".join([chunk async for chunk in response.streaming_content])
+
+        rows = list(csv.reader(io.StringIO(content.decode())))
+        self.assertEqual(
+            [row[0] for row in rows[1:]], [package.tracking_id for package in packages]
+        )
+
+    def test_export_requires_staff(self):
+        self.client.force_authenticate(user=None)
+        response = self.client.get("/packages/export")
+        self.assertIn(response.status_code, [401, 403])
+
+    def test_export_command_writes_csv(self):
+        package = _create_package()
+        out = io.StringIO()
+
+        call_command("export_packages", stdout=out)
+
+        self.assertIn(package.tracking_id, out.getvalue())
+
+
+def _png_upload(name="parcel.png", size=(2400, 1800)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, "orange").save(buffer, format="PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+class PhotoProcessingTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+        self.media_root = tempfile.mkdtemp()
+        self.staging_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        self.addCleanup(shutil.rmtree, self.staging_root)
+        overrides = self.settings(
+            MEDIA_ROOT=self.media_root,
+            PACKAGE_PHOTO_STAGING_ROOT=self.staging_root,
+            PACKAGE_PHOTO_PROCESSING="queue",
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def _submit_with_photo(self):
+        payload = {
+            "sender_name": "Alice",
+            "sender_phone": "123456789",
+            "sender_address": "1 Sender Lane",
+            "recipient_name": "Bob",
+            "recipient_phone": "987654321",
+            "recipient_address": "2 Recipient Road",
+            "package_name": "Book",
+            "package_type": "Document",
+            "weight": "1.5",
+            "photo": _png_upload(),
+        }
+        response = self.client.post("/submit-package", payload, format="multipart")
+        self.assertEqual(response.status_code, 200)
+        return Package.objects.get(tracking_id=response.data["tracking_id"])
+
+    def test_submission_stages_photo_without_storing_it(self):
+        package = self._submit_with_photo()
+
+        self.assertEqual(package.photo_status, "pending")
+        self.assertFalse(package.photo)
+        self.assertEqual(os.listdir(self.staging_root), [package.photo_staging_name])
+
+        response = self.client.get(f"/track/{package.tracking_id}")
+        self.assertEqual(response.data["photo_status"], "pending")
+        self.assertIsNone(response.data["photo_url"])
+
+    def test_worker_stores_resized_photo_and_thumbnail(self):
+        package = self._submit_with_photo()
+        self.client.get(f"/track/{package.tracking_id}")
+
+        call_command("process_package_photos", stdout=io.StringIO())
+
+        package.refresh_from_db()
+        self.assertEqual(package.photo_status, "ready")
+        self.assertEqual(os.listdir(self.staging_root), [])
+        with Image.open(package.photo.path) as stored:
+            self.assertEqual(max(stored.size), settings.PACKAGE_PHOTO_MAX_DIMENSION)
+        with Image.open(package.photo_thumbnail.path) as thumbnail:
+            self.assertEqual(
+                max(thumbnail.size), settings.PACKAGE_PHOTO_THUMBNAIL_SIZE
+            )
+
+        response = self.client.get(f"/track/{package.tracking_id}")
+        self.assertEqual(response.data["photo_status"], "ready")
+        self.assertEqual(response.data["photo_url"], package.photo.url)
+        self.assertEqual(response.data["thumbnail_url"], package.photo_thumbnail.url)
+
+    def test_upload_is_downscaled_and_reencoded_before_staging(self):
+        package = self._submit_with_photo()
+
+        self.assertTrue(package.photo_staging_name.endswith(".jpg"))
+        with Image.open(os.path.join(self.staging_root, package.photo_staging_name)) as staged:
+            self.assertEqual(staged.format, "JPEG")
+            self.assertEqual(max(staged.size), settings.PACKAGE_PHOTO_MAX_DIMENSION)
+
+    def test_upload_over_pixel_cap_is_rejected(self):
+        payload = dict(_bulk_row(), photo=_png_upload(size=(1200, 1000)))
+        with self.settings(IMAGE_UPLOAD_MAX_PIXELS=1_000_000):
+            response = self.client.post("/submit-package", payload, format="multipart")
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("photo", response.data)
+        self.assertEqual(os.listdir(self.staging_root), [])
+
+    def test_photo_is_processed_only_once(self):
+        package = self._submit_with_photo()
+
+        self.assertTrue(process_package_photo(package.pk))
+        self.assertFalse(process_package_photo(package.pk))
+
+    def test_failed_photo_is_retried_then_marked_failed(self):
+        package = self._submit_with_photo()
+        staged_path = os.path.join(self.staging_root, package.photo_staging_name)
+        with open(staged_path, "wb") as fh:
+            fh.write(b"not an image")
+
+        with self.settings(PACKAGE_PHOTO_MAX_ATTEMPTS=2), self.assertLogs(
+            "packages.photos", "ERROR"
+        ):
+            self.assertFalse(process_package_photo(package.pk))
+            package.refresh_from_db()
+            self.assertEqual(package.photo_status, "pending")
+            self.assertGreater(package.photo_next_attempt_at, timezone.now())
+            # Not due until the backoff has passed.
+            self.assertEqual(process_pending_photos(), 0)
+
+            Package.objects.filter(pk=package.pk).update(photo_next_attempt_at=timezone.now())
+            self.assertFalse(process_package_photo(package.pk))
+
+        package.refresh_from_db()
+        self.assertEqual(package.photo_status, "failed")
+        self.assertEqual(package.photo_attempts, 2)
+        self.assertEqual(os.listdir(self.staging_root), [])
+
+    def test_thread_mode_rearms_a_failed_photo(self):
+        package = self._submit_with_photo()
+        with open(os.path.join(self.staging_root, package.photo_staging_name), "wb") as fh:
+            fh.write(b"not an image")
+
+        with (
+            self.settings(PACKAGE_PHOTO_PROCESSING="thread"),
+            mock.patch("packages.photos.threading.Timer") as timer,
+            self.assertLogs("packages.photos", "ERROR"),
+        ):
+            process_package_photo(package.pk)
+
+        delay, function, args = timer.call_args.args
+        self.assertEqual(delay, settings.PACKAGE_PHOTO_RETRY_DELAY)
+        self.assertEqual(args, (process_package_photo, package.pk))
+        timer.return_value.start.assert_called_once()
+
+    def test_photo_held_by_a_dead_worker_is_reclaimed(self):
+        package = self._submit_with_photo()
+        # A worker claimed it and died before finishing.
+        Package.objects.filter(pk=package.pk).update(
+            photo_status="processing",
+            photo_next_attempt_at=timezone.now() + timedelta(minutes=5),
+        )
+        self.assertEqual(process_pending_photos(), 0)
+
+        Package.objects.filter(pk=package.pk).update(
+            photo_next_attempt_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        self.assertEqual(process_pending_photos(), 1)
+        package.refresh_from_db()
+        self.assertEqual(package.photo_status, "ready")
+
+
+_PEAK_MEMORY_SCRIPT = """
+import sys
+
+from django.conf import settings
+
+settings.configure(IMAGE_UPLOAD_MAX_PIXELS=50_000_000, IMAGE_UPLOAD_MAX_DECODED_PIXELS=16_000_000)
+
+from PIL import Image
+
+from senderplus_core.images import compact_image
+
+
+def peak_rss_kb():
+    # VmHWM belongs to this process image; ru_maxrss would carry over the
+    # parent's peak across fork/exec.
+    with open("/proc/self/status") as fh:
+        for line in fh:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+
+
+mode, path, warmup = sys.argv[1:]
+# Load codecs and allocator arenas first so only the big image is measured.
+with open(warmup, "rb") as fh:
+    compact_image(fh, 1600)
+before = peak_rss_kb()
+with open(path, "rb") as fh:
+    if mode == "compact":
+        compact_image(fh, 1600)
+    else:
+        Image.open(fh).load()
+print(peak_rss_kb() - before)
+"""
+
+
+@unittest.skipUnless(os.path.exists("/proc/self/status"), "needs /proc (Linux)")
+class ImageUploadMemoryTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.photo = os.path.join(self.tmp, "camera.jpg")
+        self.warmup = os.path.join(self.tmp, "warmup.jpg")
+        # A 24 megapixel phone photo: ~72 MB of RGB pixels when fully decoded.
+        Image.new("RGB", (6000, 4000), "teal").save(self.photo, quality=90)
+        Image.new("RGB", (400, 300), "teal").save(self.warmup, quality=90)
+
+    def _peak_growth_mb(self, mode):
+        # Pillow allocates pixel buffers outside Python's allocator, where
+        # tracemalloc cannot see them, so measure the peak RSS of a fresh
+        # process instead.
+        result = subprocess.run(
+            [sys.executable, "-c", _PEAK_MEMORY_SCRIPT, mode, self.photo, self.warmup],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return int(result.stdout.strip()) / 1024
+
+    def test_peak_memory_stays_well_below_a_full_decode(self):
+        full_decode = self._peak_growth_mb("decode")
+        compacted = self._peak_growth_mb("compact")
+
+        # Draft mode decodes this photo at 3000x2000 (24 MB at Pillow's
+        # 4 bytes per pixel); allow that plus the resize and encode buffers.
+        self.assertGreater(full_decode, 80, (full_decode, compacted))
+        self.assertLess(compacted, 48, (full_decode, compacted))
+
+
+class TrackEventsTests(TransactionTestCase):
+    # Streams read the database off the request's thread, so the data they
+    # read has to be committed.
+
+    async def test_stream_sends_current_status_then_pushed_updates(self):
+        package = await sync_to_async(_create_package)()
+        response = await AsyncClient().get(f"/track/{package.tracking_id}/events")
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+
+        first = await anext(stream)
+        self.assertIn('"status": "waiting_bus"', first.decode())
+        self.assertEqual(broadcaster.subscriber_count(package.tracking_id), 1)
+
+        package.status = "en_route_campus"
+        await asyncio.to_thread(
+            broadcaster.publish, package.tracking_id, package.status_message()
+        )
+        second = await asyncio.wait_for(anext(stream), timeout=5)
+        self.assertIn('"status": "en_route_campus"', second.decode())
+
+    async def test_stream_for_unknown_package_returns_404(self):
+        response = await AsyncClient().get("/track/abcdef12/events")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(broadcaster.subscriber_count("abcdef12"), 0)
+
+    async def test_stream_unsubscribes_when_client_goes_away(self):
+        package = await sync_to_async(_create_package)()
+        subscription = broadcaster.subscribe(package.tracking_id)
+        events = _status_events(subscription, package, 0)
+
+        await anext(events)
+        await events.aclose()
+
+        self.assertEqual(broadcaster.subscriber_count(package.tracking_id), 0)
+
+    def test_stream_releases_the_request_thread(self):
+        package = _create_package()
+
+        async def first_event():
+            subscription = broadcaster.subscribe(package.tracking_id)
+            async with ThreadSensitiveContext() as context:
+                # As Django's request_started receivers do under ASGI.
+                await sync_to_async(threading.get_ident)()
+                held = context in SyncToAsync.context_to_thread_executor
+                events = _status_events(subscription, package, 0)
+                await anext(events)
+                released = context not in SyncToAsync.context_to_thread_executor
+                await events.aclose()
+            return held, released
+
+        # On a fresh thread, as under an ASGI server, so thread-sensitive calls
+        # are not sent back to this test's thread instead.
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            self.assertEqual(pool.submit(asyncio.run, first_event()).result(), (True, True))
+
+    def test_wsgi_request_is_answered_as_a_bounded_long_poll(self):
+        package = _create_package()
+
+        started = time.monotonic()
+        with self.settings(TRACKING_STREAM_HEARTBEAT=1):
+            response = Client().get(f"/track/{package.tracking_id}/events")
+            body = b"".join(response).decode()
+
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertIn('"status": "waiting_bus"', body)
+        self.assertEqual(broadcaster.subscriber_count(package.tracking_id), 0)
+
+    def test_committed_advance_is_published(self):
+        package = _create_package()
+
+        with mock.patch.object(broadcaster, "publish") as publish:
+            package.advance_status()
+
+        publish.assert_called_once()
+        tracking_id, message = publish.call_args.args
+        self.assertEqual(tracking_id, package.tracking_id)
+        self.assertEqual(message["status"], "en_route_campus")
+
+
+class PackageListTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        admin_user = get_user_model().objects.create_user(
+            username="admin", password="password", is_staff=True
+        )
+        self.client.force_authenticate(user=admin_user)
+
+    def test_cursor_walks_every_package_once_newest_first(self):
+        created = [_create_package() for _ in range(7)]
+        # Force ties on created_at so the id tie-breaker is exercised.
+        Package.objects.filter(pk__in=[p.pk for p in created[2:5]]).update(
+            created_at=created[2].created_at
+        )
+        expected = list(
+            Package.objects.order_by("-created_at", "-id").values_list(
+                "tracking_id", flat=True
+            )
+        )
+
+        seen = []
+        cursor = None
+        while True:
+            params = {"limit": 3}
+            if cursor:
+                params["cursor"] = cursor
+            response = self.client.get("/packages", params)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(row["tracking_id"] for row in response.data["results"])
+            cursor = response.data["next_cursor"]
+            if not cursor:
+                break
+
+        self.assertEqual(seen, expected)
+
+    def test_later_pages_bound_the_scan_at_the_cursor(self):
+        older, newer = _create_package(), _create_package()
+
+        with CaptureQueriesContext(connection) as context:
+            rows, _ = keyset_page(Package.objects.all(), encode_cursor(newer), 10)
+
+        self.assertEqual(rows, [older])
+        # An ANDed upper bound, not only the OR, so PostgreSQL can start the
+        # index scan at the cursor instead of at the newest row.
+        self.assertIn('"packages_package"."created_at" <= ', context.captured_queries[0]["sql"])
+
+    def test_list_filters_by_status_and_skips_heavy_columns(self):
+        waiting = _create_package(description="Long description")
+        _create_package(status="delivered")
+
+        response = self.client.get("/packages", {"status": "waiting_bus"})
+
+        self.assertEqual(
+            [row["tracking_id"] for row in response.data["results"]],
+            [waiting.tracking_id],
+        )
+        self.assertNotIn("description", response.data["results"][0])
+        self.assertIsNone(response.data["next_cursor"])
+
+    def test_list_rejects_bad_cursor_and_requires_staff(self):
+        self.assertEqual(
+            self.client.get("/packages", {"cursor": "%%%"}).status_code, 400
+        )
+
+        self.client.force_authenticate(user=None)
+        self.assertIn(self.client.get("/packages").status_code, [401, 403])
+
+
+class FastPathSerializerTests(TestCase):
+    def _assert_identical_json(self, package):
+        renderer = JSONRenderer()
+        self.assertEqual(
+            renderer.render(serialize_package_detail(package)),
+            renderer.render(PackageDetailSerializer(package).data),
+        )
+
+    def test_matches_drf_serializer_byte_for_byte(self):
+        plain = _create_package()
+        detailed = _create_package(
+            sender_email="alice@example.com",
+            value="1234.5",
+            description="Fragile",
+            weight="12",
+        )
+        detailed.advance_status()
+        Package.objects.filter(pk=detailed.pk).update(
+            photo="package_photos/x.jpg",
+            photo_thumbnail="package_photos/thumbnails/x.jpg",
+            photo_status="ready",
+        )
+
+        for package in Package.objects.prefetch_related("status_events").filter(
+            pk__in=[plain.pk, detailed.pk]
+        ):
+            self._assert_identical_json(package)
+
+    def test_matches_drf_serializer_in_another_timezone(self):
+        package = Package.objects.prefetch_related("status_events").get(
+            pk=_create_package().pk
+        )
+        with timezone.override("Africa/Lagos"):
+            self._assert_identical_json(package)
+
+    def test_photo_urls_are_memoized_per_file_name(self):
+        package = _create_package()
+        Package.objects.filter(pk=package.pk).update(photo="package_photos/memo.jpg")
+        package.refresh_from_db()
+        storage = Package._meta.get_field("photo").storage
+
+        with mock.patch.object(
+            storage, "url", return_value="/uploads/memo.jpg"
+        ) as url:
+            first = serialize_package_detail(package)
+            second = serialize_package_detail(package)
+
+        self.assertEqual(first["photo_url"], "/uploads/memo.jpg")
+        self.assertEqual(second["photo_url"], "/uploads/memo.jpg")
+        self.assertEqual(url.call_count, 1)
+
+
+def _bulk_row(**overrides):
+    row = {
+        "sender_name": "Campus Shop",
+        "sender_phone": "0241234567",
+        "sender_address": "Shop 4, Night Market",
+        "recipient_name": "Bob",
+        "recipient_phone": "0201234567",
+        "recipient_address": "Volta Hall",
+        "package_name": "Shoes",
+        "package_type": "Parcel",
+        "weight": "2.0",
+    }
+    row.update(overrides)
+    return row
+
+
+class BulkSubmitPackagesTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="shop", password="password"
+        )
+        self.client.force_authenticate(user=self.user)
+
+    def test_json_rows_are_inserted_and_errors_reported(self):
+        rows = [
+            _bulk_row(),
+            _bulk_row(weight="heavy"),
+            _bulk_row(recipient_name="Ama"),
+        ]
+
+        response = self.client.post("/submit-packages/bulk", rows, format="json")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["tracking_ids"]), 2)
+        self.assertEqual([row["row"] for row in response.data["created"]], [1, 3])
+        self.assertEqual(response.data["errors"][0]["row"], 2)
+        self.assertIn("weight", response.data["errors"][0]["errors"])
+        for tracking_id in response.data["tracking_ids"]:
+            package = Package.objects.get(tracking_id=tracking_id)
+            self.assertEqual(package.status_events.count(), 1)
+
+    def test_insert_cost_does_not_grow_with_row_count(self):
+        def queries_for(count):
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.post(
+                    "/submit-packages/bulk", [_bulk_row()] * count, format="json"
+                )
+            return len(ctx.captured_queries)
+
+        self.assertEqual(queries_for(2), queries_for(25))
+
+    def test_csv_upload(self):
+        content = (
+            "sender_name,sender_phone,sender_address,recipient_name,"
+            "recipient_phone,recipient_address,package_name,package_type,weight,value\n"
+            "Shop,0241234567,Market,Bob,0201234567,Volta Hall,Shoes,Parcel,2.0,\n"
+            "Shop,0241234567,Market,Ama,0201234568,Legon Hall,Bag,Parcel,1.0,50\n"
+        ).encode()
+        upload = SimpleUploadedFile("manifest.csv", content, content_type="text/csv")
+
+        response = self.client.post(
+            "/submit-packages/bulk", {"file": upload}, format="multipart"
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["errors"], [])
+        self.assertEqual(Package.objects.count(), 2)
+        self.assertIsNone(Package.objects.get(recipient_name="Bob").value)
+
+    def test_csv_upload_that_is_not_utf8_returns_400(self):
+        content = (
+            "sender_name,sender_phone,sender_address,recipient_name,"
+            "recipient_phone,recipient_address,package_name,package_type,weight\n"
+            "Café,0241234567,Market,Bob,0201234567,Volta Hall,Shoes,Parcel,2.0\n"
+        ).encode("cp1252")
+        upload = SimpleUploadedFile("manifest.csv", content, content_type="text/csv")
+
+        response = self.client.post(
+            "/submit-packages/bulk", {"file": upload}, format="multipart"
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("manifest.csv", response.data["file"][0])
+        self.assertEqual(Package.objects.count(), 0)
+
+    def test_all_invalid_rows_return_400(self):
+        response = self.client.post(
+            "/submit-packages/bulk", [{"sender_name": "x"}], format="json"
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Package.objects.count(), 0)
+
+    def test_bulk_submission_requires_authentication(self):
+        self.client.force_authenticate(user=None)
+        response = self.client.post(
+            "/submit-packages/bulk", [_bulk_row()], format="json"
+        )
+        self.assertIn(response.status_code, [401, 403])
+
+
+class PackageStatusCountTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = get_user_model().objects.create_user(
+            username="admin", password="password", is_staff=True
+        )
+
+    def assertCountsMatchTable(self):
+        expected = {status: 0 for status in STATUS_ORDER}
+        for status in Package.objects.values_list("status", flat=True):
+            expected[status] += 1
+        self.assertEqual(
+            dict(PackageStatusCount.objects.values_list("status", "count")), expected
+        )
+
+    def test_counters_follow_every_kind_of_transition(self):
+        first = _create_package()
+        second = _create_package()
+        Package.objects.bulk_create_with_tracking(
+            [Package(**_bulk_row()) for _ in range(3)]
+        )
+        self.assertCountsMatchTable()
+
+        first.advance_status()
+        Package.objects.advance_one(second.tracking_id)
+        self.assertCountsMatchTable()
+
+        Package.objects.all().advance_status()
+        self.assertCountsMatchTable()
+
+        edited = Package.objects.get(pk=first.pk)
+        edited.status = "waiting_bus"
+        edited.save()
+        self.assertCountsMatchTable()
+
+        Package.objects.filter(pk=second.pk).delete()
+        self.assertCountsMatchTable()
+
+    def test_daily_counts_record_entries(self):
+        package = _create_package()
+        package.advance_status()
+        _create_package()
+
+        today = timezone.localdate()
+        self.assertEqual(
+            dict(
+                PackageDailyStatusCount.objects.filter(day=today).values_list(
+                    "status", "entered"
+                )
+            ),
+            {"waiting_bus": 2, "en_route_campus": 1},
+        )
+
+    def test_stats_endpoint_reads_counters_only(self):
+        for _ in range(3):
+            _create_package()
+        Package.objects.first().advance_status()
+        self.client.force_authenticate(user=self.admin_user)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/packages/stats?days=1")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["total"], 3)
+        self.assertEqual(
+            [(row["status"], row["count"]) for row in response.data["by_status"]],
+            [("waiting_bus", 2), ("en_route_campus", 1), ("at_campus_hub", 0), ("delivered", 0)],
+        )
+        self.assertEqual(len(response.data["daily"]), 2)
+        self.assertFalse(any('"packages_package"' in q["sql"] for q in queries))
+
+    def test_stats_requires_staff(self):
+        response = self.client.get("/packages/stats")
+        self.assertIn(response.status_code, [401, 403])
+
+    def test_rebuild_command_repairs_drift(self):
+        _create_package()
+        PackageStatusCount.objects.filter(status="waiting_bus").update(count=42)
+        PackageDailyStatusCount.objects.all().delete()
+
+        call_command("rebuild_status_counts", stdout=io.StringIO())
+
+        self.assertCountsMatchTable()
+        self.assertEqual(PackageDailyStatusCount.objects.get().entered, 1)
+
+
+class PackageSearchTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin_user = get_user_model().objects.create_superuser(
+            username="admin", email="admin@example.com", password="password"
+        )
+        self.client.force_authenticate(user=self.admin_user)
+
+    def _search(self, q):
+        response = self.client.get("/packages/search", {"q": q})
+        self.assertEqual(response.status_code, 200)
+        return [row["tracking_id"] for row in response.data["results"]]
+
+    def test_matches_substrings_of_names_phones_and_addresses(self):
+        kofi = _create_package(recipient_name="Kofi Mensah", recipient_phone="0244111222")
+        volta = _create_package(recipient_address="Room 12, Volta Hall")
+        _create_package()
+
+        self.assertEqual(self._search("mensa"), [kofi.tracking_id])
+        self.assertEqual(self._search("4111"), [kofi.tracking_id])
+        self.assertEqual(self._search("volta hall"), [volta.tracking_id])
+        self.assertEqual(self._search(kofi.tracking_id[2:7]), [kofi.tracking_id])
+
+    def test_results_are_ranked(self):
+        weak = _create_package(sender_name="Ama", sender_address="Accra Mall, Accra")
+        strong = _create_package(
+            sender_name="Accra Traders", recipient_name="Accra Hostel", sender_address="Accra"
+        )
+        _create_package()
+
+        self.assertEqual(self._search("accra"), [strong.tracking_id, weak.tracking_id])
+
+    def test_index_follows_updates_and_deletes(self):
+        package = _create_package(recipient_name="Yaw")
+        package.recipient_name = "Esi Owusu"
+        package.save()
+
+        self.assertEqual(self._search("owusu"), [package.tracking_id])
+        self.assertEqual(self._search("Yaw"), [])
+
+        package.delete()
+        self.assertEqual(self._search("owusu"), [])
+
+    def test_search_syntax_in_terms_is_literal(self):
+        package = _create_package(recipient_name='The "Quote" Shop OR NOT')
+        self.assertEqual(self._search('"quote" OR'), [package.tracking_id])
+        self.assertEqual(self._search("a*(b"), [])
+
+    def test_short_terms_fall_back_to_icontains(self):
+        package = _create_package(recipient_name="Jo")
+        self.assertEqual(self._search("jo"), [package.tracking_id])
+
+    def test_admin_search_uses_ranked_index(self):
+        weak = _create_package(sender_address="Accra")
+        strong = _create_package(sender_name="Accra", recipient_name="Accra")
+        self.client.force_login(self.admin_user)
+
+        response = self.client.get("/admin/packages/package/", {"q": "accra"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [package.tracking_id for package in response.context["cl"].result_list],
+            [strong.tracking_id, weak.tracking_id],
+        )
+
+    @unittest.skipUnless(connection.vendor == "sqlite", "FTS5 index is SQLite-only")
+    def test_falls_back_to_icontains_when_triggers_are_missing(self):
+        # Rolled back with the test, like any other DDL on SQLite.
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TRIGGER {FTS_TABLE}_ai")
+        package = _create_package(recipient_name="Abena Serwaa")
+
+        self.assertEqual(self._search("serwaa"), [package.tracking_id])
+
+    def test_search_requires_staff(self):
+        self.client.force_authenticate(user=None)
+        response = self.client.get("/packages/search", {"q": "bob"})
+        self.assertIn(response.status_code, [401, 403])
+
+
+class PickupLookupTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(
+            user=get_user_model().objects.create_user(
+                username="hub", password="password", is_staff=True
+            )
+        )
+
+    def test_phone_is_normalized_on_save_and_bulk_create(self):
+        package = _create_package(recipient_phone="024 123 4567")
+        bulk = Package.objects.bulk_create_with_tracking(
+            [Package(**_bulk_row(recipient_phone="+233-24-123-4567"))]
+        )[0]
+        other = _create_package(recipient_phone="12345")
+
+        self.assertEqual(package.recipient_phone_normalized, "+233241234567")
+        bulk.refresh_from_db()
+        self.assertEqual(bulk.recipient_phone_normalized, "+233241234567")
+        self.assertIsNone(other.recipient_phone_normalized)
+
+    def test_lookup_finds_waiting_packages_in_any_phone_format(self):
+        older = _create_package(recipient_phone="0241234567", status="at_campus_hub")
+        newer = _create_package(recipient_phone="+233 24 123 4567", status="at_campus_hub")
+        _create_package(recipient_phone="0241234567", status="delivered")
+        _create_package(recipient_phone="0200000000", status="at_campus_hub")
+
+        response = self.client.get("/packages/pickup", {"phone": "024-123-4567"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["phone"], "+233241234567")
+        self.assertEqual(
+            [row["tracking_id"] for row in response.data["results"]],
+            [newer.tracking_id, older.tracking_id],
+        )
+
+    def test_lookup_rejects_invalid_phone(self):
+        response = self.client.get("/packages/pickup", {"phone": "12345"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("phone", response.data)
+
+    def test_backfill_command_fills_existing_rows(self):
+        package = _create_package(recipient_phone="0241234567")
+        Package.objects.filter(pk=package.pk).update(recipient_phone_normalized=None)
+
+        call_command("backfill_recipient_phones", batch_size=1, stdout=io.StringIO())
+
+        package.refresh_from_db()
+        self.assertEqual(package.recipient_phone_normalized, "+233241234567")
+
+
+class MyPackagesTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            username="ama@example.com", email="Ama@example.com", password="password"
+        )
+
+    def _customer(self, email, verified=True):
+        user = get_user_model().objects.create_user(
+            username=email, email=email, password="password"
+        )
+        CustomerProfile.objects.create(
+            user=user, phone_number="0241234567", address="Accra", email_verified=verified
+        )
+        return user
+
+    def test_token_submissions_are_owned_and_anonymous_ones_are_not(self):
+        payload = {key: value for key, value in _bulk_row().items()}
+        self.client.post("/submit-package", payload)
+        self.client.force_authenticate(user=self.user)
+        self.client.post("/submit-package", payload)
+        self.client.post("/submit-packages/bulk", [_bulk_row()], format="json")
+
+        self.assertEqual(Package.objects.filter(owner__isnull=True).count(), 1)
+        self.assertEqual(Package.objects.filter(owner=self.user).count(), 2)
+
+    def test_listing_pages_through_own_packages_only(self):
+        mine = [_create_package(owner=self.user) for _ in range(5)]
+        _create_package()
+        self.client.force_authenticate(user=self.user)
+
+        seen = []
+        cursor = None
+        while True:
+            params = {"limit": 2}
+            if cursor:
+                params["cursor"] = cursor
+            response = self.client.get("/my-packages", params)
+            self.assertEqual(response.status_code, 200)
+            seen += [row["tracking_id"] for row in response.data["results"]]
+            cursor = response.data["next_cursor"]
+            if not cursor:
+                break
+
+        self.assertEqual(seen, [package.tracking_id for package in reversed(mine)])
+
+    def test_listing_requires_authentication(self):
+        self.assertIn(self.client.get("/my-packages").status_code, [401, 403])
+
+    def test_claim_matches_verified_email_only(self):
+        verified = self._customer("kofi@example.com")
+        self._customer("unverified@example.com", verified=False)
+        self._customer("twin@example.com")
+        self._customer("TWIN@example.com")
+        claimable = [_create_package(sender_email="KOFI@example.com") for _ in range(3)]
+        _create_package(sender_email="unverified@example.com")
+        _create_package(sender_email="twin@example.com")
+        already_owned = _create_package(sender_email="kofi@example.com", owner=self.user)
+
+        call_command("claim_packages", batch_size=2, stdout=io.StringIO())
+
+        self.assertEqual(
+            set(Package.objects.filter(owner=verified).values_list("pk", flat=True)),
+            {package.pk for package in claimable},
+        )
+        self.assertEqual(Package.objects.filter(owner__isnull=True).count(), 2)
+        already_owned.refresh_from_db()
+        self.assertEqual(already_owned.owner, self.user)
+
+
+class IdempotentSubmissionTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def _submit(self, key=None, **overrides):
+        headers = {"Idempotency-Key": key} if key else {}
+        return self.client.post("/submit-package", _bulk_row(**overrides), headers=headers)
+
+    def test_retry_with_same_key_replays_first_response(self):
+        first = self._submit("retry-1")
+        second = self._submit("retry-1")
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertNotIn("Idempotent-Replayed", first)
+        self.assertEqual(Package.objects.count(), 1)
+
+    def test_requests_without_key_are_not_deduplicated(self):
+        self._submit()
+        self._submit()
+        self.assertEqual(Package.objects.count(), 2)
+
+    def test_key_reused_for_different_body_is_rejected(self):
+        self._submit("retry-2")
+        response = self._submit("retry-2", package_name="Laptop")
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Package.objects.count(), 1)
+
+    def test_expired_key_is_claimed_again(self):
+        self._submit("retry-3")
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+        response = self._submit("retry-3")
+
+        self.assertNotIn("Idempotent-Replayed", response)
+        self.assertEqual(Package.objects.count(), 2)
+        self.assertEqual(IdempotencyKey.objects.count(), 1)
+
+    def test_failed_request_does_not_consume_key(self):
+        invalid = self._submit("retry-4", weight="")
+        self.assertEqual(invalid.status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        valid = self._submit("retry-4")
+        self.assertEqual(valid.status_code, 200)
+        self.assertNotIn("Idempotent-Replayed", valid)
+
+    def test_replay_skips_the_insert(self):
+        self._submit("retry-5")
+        with CaptureQueriesContext(connection) as queries:
+            self._submit("retry-5")
+        self.assertFalse(
+            any(q["sql"].startswith('INSERT INTO "packages_package"') for q in queries)
+        )
+
+    def test_expired_keys_are_purged_by_housekeeping(self):
+        self._submit("old")
+        self._submit("fresh")
+        IdempotencyKey.objects.filter(key="old").update(
+            expires_at=timezone.now() - timedelta(seconds=1)
+        )
+
+        stats = purge_expired()
+
+        self.assertEqual(stats["idempotency keys"], 1)
+        self.assertEqual(list(IdempotencyKey.objects.values_list("key", flat=True)), ["fresh"])
+
@@ -1,10 +1,42 @@
 from django.urls import path
 
-from .views import AdvanceStatusView, SubmitPackageView, TrackPackageView
+from .views import (
+    AdvanceStatusView,
+    BulkSubmitPackagesView,
+    MyPackagesView,
+    PackageExportView,
+    PackageListView,
+    PackageSearchView,
+    PackageStatsView,
+    PickupLookupView,
+    SubmitPackageView,
+    TrackBatchView,
+    TrackingCacheStatsView,
+    TrackPackageView,
+    track_events,
+)
 
 urlpatterns = [
     path("submit-package", SubmitPackageView.as_view(), name="submit-package"),
+    path(
+        "submit-packages/bulk",
+        BulkSubmitPackagesView.as_view(),
+        name="submit-packages-bulk",
+    ),
+    path(
+        "tracking-cache/stats",
+        TrackingCacheStatsView.as_view(),
+        name="tracking-cache-stats",
+    ),
+    path("my-packages", MyPackagesView.as_view(), name="my-packages"),
+    path("packages", PackageListView.as_view(), name="package-list"),
+    path("packages/search", PackageSearchView.as_view(), name="package-search"),
+    path("packages/stats", PackageStatsView.as_view(), name="package-stats"),
+    path("packages/pickup", PickupLookupView.as_view(), name="package-pickup"),
+    path("packages/export", PackageExportView.as_view(), name="package-export"),
+    path("track/batch", TrackBatchView.as_view(), name="track-batch"),
     path("track/<str:tracking_id>", TrackPackageView.as_view(), name="track-package"),
+    path("track/<str:tracking_id>/events", track_events, name="track-events"),
     path(
         "advance-status/<str:tracking_id>",
         AdvanceStatusView.as_view(),
@@ -1,11 +1,71 @@
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import time
+from datetime import timedelta
+
+from asgiref.sync import SyncToAsync, sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import connection
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils import timezone
+from django.utils.http import http_date
 from rest_framework import permissions, status
-from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .models import Package
-from .serializers import PackageCreateSerializer, PackageDetailSerializer
+from .broadcast import broadcaster
+from .cache import (
+    aget_tracking_version,
+    get_cache_stats,
+    get_tracking_payload,
+    get_tracking_version,
+)
+from .exports import (
+    CONTENT_TYPES,
+    aexport_rows,
+    aiter_export,
+    export_rows,
+    iter_export,
+)
+from .fastpath import serialize_package_detail
+from .idempotency import idempotent
+from .models import (
+    NEXT_STATUS,
+    STATUS_CHOICES,
+    STATUS_ORDER,
+    Package,
+    PackageDailyStatusCount,
+    PackageStatusCount,
+    StatusConflict,
+)
+from .pagination import keyset_page
+from .search import search_packages
+from .serializers import (
+    AdvanceStatusSerializer,
+    PackageBulkRowSerializer,
+    PackageCreateSerializer,
+    PackageDetailSerializer,
+    PackageExportFilterSerializer,
+    PackageListQuerySerializer,
+    PackageListSerializer,
+    PackageSearchQuerySerializer,
+    PackageStatsQuerySerializer,
+    PickupLookupSerializer,
+    TrackingBatchSerializer,
+)
+from .tracking_ids import normalize_tracking_id
 
 
 class SubmitPackageView(APIView):
@@ -13,9 +73,15 @@ class SubmitPackageView(APIView):
     parser_classes = [FormParser, MultiPartParser]
 
     def post(self, request):
+        return idempotent(request, "submit-package", lambda: self._submit(request))
+
+    def _submit(self, request):
         serializer = PackageCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        package = serializer.save()
+        # Anonymous submissions stay allowed; signed-in senders get them
+        # listed under /my-packages.
+        owner = request.user if request.user.is_authenticated else None
+        package = serializer.save(owner=owner)
         return Response(
             {
                 "message": "Package submitted successfully",
@@ -25,20 +91,503 @@ class SubmitPackageView(APIView):
         )
 
 
+def _bulk_rows(request):
+    """Rows from a JSON array body or an uploaded CSV ``file``."""
+    upload = request.FILES.get("file")
+    if upload is not None:
+        reader = csv.DictReader(io.TextIOWrapper(upload, encoding="utf-8-sig"))
+        try:
+            # Blank cells mean "not provided", not an empty value.
+            return [
+                {key.strip(): value for key, value in row.items() if key and value}
+                for row in reader
+            ]
+        except (UnicodeDecodeError, csv.Error):
+            raise ValidationError(
+                {
+                    "file": [
+                        f"{upload.name} is not a readable CSV file; save it as "
+                        "\"CSV UTF-8\" and upload it again."
+                    ]
+                }
+            )
+
+    rows = request.data
+    if isinstance(rows, dict):
+        rows = rows.get("packages")
+    if not isinstance(rows, list):
+        raise ValidationError(
+            {"detail": "Send a JSON array of packages or a CSV upload named 'file'."}
+        )
+    return rows
+
+
+class BulkSubmitPackagesView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [JSONParser, MultiPartParser, FormParser]
+
+    def post(self, request):
+        rows = _bulk_rows(request)
+        if not rows:
+            raise ValidationError({"detail": "No packages submitted."})
+        if len(rows) > settings.BULK_SUBMISSION_MAX_ROWS:
+            raise ValidationError(
+                {
+                    "detail": f"At most {settings.BULK_SUBMISSION_MAX_ROWS} "
+                    "packages per request."
+                }
+            )
+
+        valid = []
+        errors = []
+        for number, row in enumerate(rows, start=1):
+            serializer = PackageBulkRowSerializer(
+                data=row if isinstance(row, dict) else {}
+            )
+            if serializer.is_valid():
+                valid.append(
+                    (number, Package(owner=request.user, **serializer.validated_data))
+                )
+            else:
+                errors.append({"row": number, "errors": serializer.errors})
+
+        created = Package.objects.bulk_create_with_tracking(
+            [package for _, package in valid]
+        )
+        return Response(
+            {
+                "tracking_ids": [package.tracking_id for package in created],
+                "created": [
+                    {"row": number, "tracking_id": package.tracking_id}
+                    for (number, _), package in zip(valid, created)
+                ],
+                "errors": errors,
+            },
+            status=status.HTTP_200_OK if created else status.HTTP_400_BAD_REQUEST,
+        )
+
+
+def _tracking_etag(package) -> str:
+    fingerprint = ":".join(
+        [
+            package.tracking_id,
+            package.status,
+            package.updated_at.isoformat(),
+            # Changes to the payload shape must not match old client copies.
+            ",".join(PackageDetailSerializer.Meta.fields),
+        ]
+    )
+    return '"%s"' % hashlib.sha256(fingerprint.encode()).hexdigest()[:32]
+
+
+def _render_tracking_payload(tracking_id: str):
+    package = get_object_or_404(
+        Package.objects.prefetch_related("status_events"), tracking_id=tracking_id
+    )
+    return {
+        "etag": _tracking_etag(package),
+        "last_modified": int(package.updated_at.timestamp()),
+        "data": serialize_package_detail(package),
+    }
+
+
+def _set_tracking_cache_headers(response, payload):
+    response["ETag"] = payload["etag"]
+    response["Last-Modified"] = http_date(payload["last_modified"])
+    # Browsers always revalidate (cheap 304s); shared caches may reuse the
+    # body for a short window before asking again.
+    patch_cache_control(
+        response,
+        public=True,
+        max_age=0,
+        s_maxage=settings.TRACKING_CDN_MAX_AGE,
+        must_revalidate=True,
+    )
+    patch_vary_headers(response, ["Accept"])
+    return response
+
+
 class TrackPackageView(APIView):
     permission_classes = [permissions.AllowAny]
 
     def get(self, request, tracking_id: str):
-        package = get_object_or_404(Package, tracking_id=tracking_id)
-        serializer = PackageDetailSerializer(package)
-        return Response(serializer.data)
+        tracking_id = normalize_tracking_id(tracking_id)
+        if tracking_id is None:
+            # Typo or garbage: reject before touching the cache or database.
+            raise Http404
+        payload = get_tracking_payload(tracking_id, _render_tracking_payload)
+        not_modified = get_conditional_response(
+            request,
+            etag=payload["etag"],
+            last_modified=payload["last_modified"],
+        )
+        if not_modified is not None:
+            return _set_tracking_cache_headers(not_modified, payload)
+        return _set_tracking_cache_headers(Response(payload["data"]), payload)
+
+
+def _served_over_asgi(request) -> bool:
+    # DRF wraps the Django request; plain async views get it directly.
+    return isinstance(getattr(request, "_request", request), ASGIRequest)
+
+
+def _sse(message: dict) -> str:
+    return f"event: status\ndata: {json.dumps(message)}\n\n"
+
+
+def _load_status(tracking_id: str) -> Package:
+    try:
+        return Package.objects.only("tracking_id", "status", "updated_at").get(
+            tracking_id=tracking_id
+        )
+    finally:
+        # Streams read rarely; hand the connection back rather than keep one
+        # open per executor thread between reads.
+        connection.close()
+
+
+# Not thread-sensitive: under ASGI that runs on a thread reserved for the
+# request, which an open stream would then hold (with its database
+# connection) until it closes.
+_aload_status = sync_to_async(_load_status, thread_sensitive=False)
+
+
+def _release_request_thread():
+    """
+    Let the thread Django's ASGI handler reserves for this request's
+    thread-sensitive calls (request_started receivers, sync middleware) exit.
+
+    It is idle once the response is streaming but would otherwise be kept
+    until the stream closes; calls made while the request finishes get a
+    fresh one.
+    """
+    context = SyncToAsync.thread_sensitive_context.get(None)
+    if context is None:
+        return
+    executor = SyncToAsync.context_to_thread_executor.pop(context, None)
+    if executor is not None:
+        executor.shutdown(wait=False)
+
+
+async def _status_events(subscription, package, version):
+    """
+    Yield SSE frames for one tracking ID until it is delivered.
+
+    Updates made in this process arrive through the broadcaster. Between
+    them a keep-alive is sent, and the shared tracking cache version is
+    checked (or, without a shared cache, the package re-read) so changes
+    made by other workers are picked up too.
+    """
+    tracking_id = package.tracking_id
+    last_status = package.status
+    _release_request_thread()
+    try:
+        yield _sse(package.status_message())
+        while last_status in NEXT_STATUS:
+            try:
+                message = await asyncio.wait_for(
+                    subscription.get(), timeout=settings.TRACKING_STREAM_HEARTBEAT
+                )
+            except asyncio.TimeoutError:
+                current_version = await aget_tracking_version(tracking_id)
+                # Only a shared cache carries other workers' version bumps.
+                if current_version == version and settings.TRACKING_CACHE_ENABLED:
+                    yield ": keep-alive\n\n"
+                    continue
+                version = current_version
+                package = await _aload_status(tracking_id)
+                message = package.status_message()
+            if message["status"] != last_status:
+                last_status = message["status"]
+                yield _sse(message)
+            else:
+                yield ": keep-alive\n\n"
+    finally:
+        broadcaster.unsubscribe(subscription)
+
+
+def _polled_status_events(package, version):
+    """
+    Bounded form of ``_status_events`` for WSGI, where an open stream holds a
+    worker thread: check for a status change every second for at most one
+    heartbeat, then end the response and let the client's EventSource
+    reconnect.
+    """
+    deadline = time.monotonic() + settings.TRACKING_STREAM_HEARTBEAT
+    last_status = package.status
+    yield _sse(package.status_message())
+    while last_status in NEXT_STATUS and time.monotonic() < deadline:
+        time.sleep(max(0, min(1, deadline - time.monotonic())))
+        current_version = get_tracking_version(package.tracking_id)
+        if current_version == version and settings.TRACKING_CACHE_ENABLED:
+            continue
+        version = current_version
+        package = _load_status(package.tracking_id)
+        if package.status != last_status:
+            yield _sse(package.status_message())
+            return
+
+
+async def track_events(request, tracking_id: str):
+    """
+    Server-Sent Events stream of status changes for one package.
+
+    A plain async view (DRF's APIView is sync-only) so that, under the ASGI
+    application, each open stream is a coroutine rather than a worker thread.
+    Under WSGI it answers as a bounded long poll instead.
+    """
+    tracking_id = normalize_tracking_id(tracking_id)
+    if tracking_id is None:
+        raise Http404
+
+    # Subscribe and read the version before the package, so a change in
+    # between is not missed.
+    streaming = _served_over_asgi(request)
+    subscription = broadcaster.subscribe(tracking_id) if streaming else None
+    version = await aget_tracking_version(tracking_id)
+    try:
+        package = await _aload_status(tracking_id)
+    except Package.DoesNotExist:
+        if subscription is not None:
+            broadcaster.unsubscribe(subscription)
+        raise Http404
+
+    if streaming:
+        events = _status_events(subscription, package, version)
+    else:
+        events = _polled_status_events(package, version)
+    response = StreamingHttpResponse(events, content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Stop nginx-style proxies from buffering the stream.
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
+class TrackBatchView(APIView):
+    # For reception desks and partner shops: each response carries contact
+    # details for hundreds of packages, so it is not open to anonymous clients.
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        serializer = TrackingBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        requested = {}
+        not_found = []
+        for raw in serializer.validated_data["tracking_ids"]:
+            tracking_id = normalize_tracking_id(raw)
+            if tracking_id is None:
+                not_found.append(raw)
+            else:
+                requested.setdefault(tracking_id, raw)
+
+        packages = {
+            package.tracking_id: package
+            for package in Package.objects.filter(
+                tracking_id__in=list(requested)
+            ).prefetch_related("status_events")
+        }
+        found = []
+        for tracking_id, raw in requested.items():
+            if tracking_id in packages:
+                found.append(packages[tracking_id])
+            else:
+                not_found.append(raw)
+
+        return Response(
+            {
+                "packages": [serialize_package_detail(package) for package in found],
+                "not_found": not_found,
+            }
+        )
+
+
+class TrackingCacheStatsView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(get_cache_stats())
 
 
 class AdvanceStatusView(APIView):
     permission_classes = [permissions.IsAdminUser]
 
     def post(self, request, tracking_id: str):
-        package = get_object_or_404(Package, tracking_id=tracking_id)
-        package.advance_status()
-        serializer = PackageDetailSerializer(package)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        tracking_id = normalize_tracking_id(tracking_id)
+        if tracking_id is None:
+            raise Http404
+
+        body = AdvanceStatusSerializer(data=request.data)
+        body.is_valid(raise_exception=True)
+        expected_status = body.validated_data.get("expected_status") or None
+
+        try:
+            package = Package.objects.advance_one(
+                tracking_id, expected_status=expected_status
+            )
+        except Package.DoesNotExist:
+            raise Http404
+        except StatusConflict as exc:
+            return Response(
+                {
+                    "detail": "Package status changed since it was loaded.",
+                    "package": serialize_package_detail(exc.package),
+                },
+                status=status.HTTP_409_CONFLICT,
+            )
+
+        return Response(serialize_package_detail(package), status=status.HTTP_200_OK)
+
+
+class PackageExportView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        filters = PackageExportFilterSerializer(data=request.query_params)
+        filters.is_valid(raise_exception=True)
+        options = dict(filters.validated_data)
+        output = options.pop("output")
+
+        if _served_over_asgi(request):
+            chunks = aiter_export(output, aexport_rows(**options))
+        else:
+            chunks = iter_export(output, export_rows(**options))
+        response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[output])
+        response["Content-Disposition"] = f'attachment; filename="packages.{output}"'
+        return response
+
+
+class PackageListView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        query = PackageListQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        options = dict(query.validated_data)
+        cursor = options.pop("cursor", None)
+        limit = options.pop("limit")
+
+        queryset = Package.objects.matching(**options).only(
+            *PackageListSerializer.LOAD_FIELDS
+        )
+        rows, next_cursor = keyset_page(queryset, cursor, limit)
+        return Response(
+            {
+                "results": PackageListSerializer(rows, many=True).data,
+                "next_cursor": next_cursor,
+            }
+        )
+
+
+class MyPackagesView(APIView):
+    """The signed-in user's own packages, newest first, cursor paginated."""
+
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        query = PackageListQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        options = dict(query.validated_data)
+        cursor = options.pop("cursor", None)
+        limit = options.pop("limit")
+
+        queryset = (
+            Package.objects.filter(owner=request.user)
+            .matching(**options)
+            .only(*PackageListSerializer.LOAD_FIELDS)
+        )
+        rows, next_cursor = keyset_page(queryset, cursor, limit)
+        return Response(
+            {
+                "results": PackageListSerializer(rows, many=True).data,
+                "next_cursor": next_cursor,
+            }
+        )
+
+
+class PackageSearchView(APIView):
+    """Ranked search over tracking IDs and sender/recipient details."""
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        query = PackageSearchQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+
+        queryset = Package.objects.only(*PackageListSerializer.LOAD_FIELDS)
+        rows = search_packages(queryset, query.validated_data["q"]).order_by(
+            "-search_rank", "-created_at", "-id"
+        )[: query.validated_data["limit"]]
+        return Response({"results": PackageListSerializer(rows, many=True).data})
+
+
+class PickupLookupView(APIView):
+    """
+    Packages waiting for a recipient, by phone number.
+
+    One seek on the (normalized phone, status, created_at) index; the phone
+    may be given in any format the recipient reads it out in.
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        query = PickupLookupSerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        phone = query.validated_data["phone"]
+
+        rows = (
+            Package.objects.filter(
+                recipient_phone_normalized=phone, status=query.validated_data["status"]
+            )
+            .only(*PackageListSerializer.LOAD_FIELDS)
+            .order_by("-created_at")
+        )
+        return Response(
+            {"phone": phone, "results": PackageListSerializer(rows, many=True).data}
+        )
+
+
+class PackageStatsView(APIView):
+    """
+    Package counts per status, read from the maintained counters.
+
+    Costs one row per status (plus one per status per day requested) however
+    many packages exist.
+    """
+
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        query = PackageStatsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        days = query.validated_data["days"]
+
+        labels = dict(STATUS_CHOICES)
+        counts = dict(PackageStatusCount.objects.values_list("status", "count"))
+        by_status = [
+            {
+                "status": value,
+                "status_display": labels[value],
+                "count": counts.get(value, 0),
+            }
+            for value in STATUS_ORDER
+        ]
+
+        daily = []
+        if days:
+            since = timezone.localdate() - timedelta(days=days - 1)
+            daily = [
+                {"day": day.isoformat(), "status": value, "entered": entered}
+                for day, value, entered in PackageDailyStatusCount.objects.filter(
+                    day__gte=since
+                ).values_list("day", "status", "entered")
+            ]
+
+        return Response(
+            {
+                "total": sum(row["count"] for row in by_status),
+                "by_status": by_status,
+                "daily": daily,
+            }
+        )
@@ -0,0 +1,80 @@
+"""
+Bounded-memory validation and re-encoding of uploaded images.
+
+Phone cameras produce 12-50 megapixel images; decoding one at full size
+costs 3-4 bytes per pixel. Here the header is checked against a pixel cap
+before anything is decoded, JPEGs are decoded straight to a reduced size
+(the decoder's draft mode scales by 1/2, 1/4 or 1/8 as it goes), and the
+result is re-encoded as a compact JPEG no larger than the requested
+dimension. Peak memory per upload is therefore bounded by
+IMAGE_UPLOAD_MAX_DECODED_PIXELS rather than by what the client sends.
+"""
+
+import io
+import os
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps
+
+JPEG_QUALITY = 85
+
+_INVALID = "Upload a valid image. The file you uploaded was either not an image or a corrupted image."
+
+
+def _to_rgb(image):
+    # JPEG has no alpha channel; put transparent areas on white, not black.
+    if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def compact_image(upload, max_dimension: int) -> ContentFile:
+    """
+    Validate ``upload`` and return it re-encoded as a JPEG that fits in
+    ``max_dimension`` x ``max_dimension``.
+
+    Raises ValidationError for files that are not images or are too large
+    to decode within the configured limits.
+    """
+    upload.seek(0)
+    try:
+        # Only reads the header.
+        image = Image.open(upload)
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        raise ValidationError(_INVALID, code="invalid_image")
+
+    width, height = image.size
+    if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+        raise ValidationError(
+            f"Images may be at most {settings.IMAGE_UPLOAD_MAX_PIXELS // 1_000_000} "
+            "megapixels.",
+            code="image_too_large",
+        )
+
+    # Ask the decoder for the smallest scale that still covers the final size.
+    scale = min(1.0, max_dimension / max(width, height))
+    image.draft("RGB", (max(1, int(width * scale)), max(1, int(height * scale))))
+    width, height = image.size
+    if width * height > settings.IMAGE_UPLOAD_MAX_DECODED_PIXELS:
+        raise ValidationError(
+            "This image is too large to process; upload a smaller or JPEG version.",
+            code="image_too_large",
+        )
+
+    try:
+        ImageOps.exif_transpose(image, in_place=True)
+        image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        _to_rgb(image).save(buffer, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        raise ValidationError(_INVALID, code="invalid_image")
+    finally:
+        image.close()
+
+    stem = os.path.splitext(os.path.basename(upload.name or ""))[0] or "image"
+    return ContentFile(buffer.getvalue(), name=f"{stem}.jpg")
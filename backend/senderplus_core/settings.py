@@ -6,6 +6,7 @@ import os
 from pathlib import Path
 from urllib.parse import urlsplit
 
+from corsheaders.defaults import default_headers
 from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
@@ -60,6 +61,11 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 if not SECRET_KEY:
     raise ImproperlyConfigured("SECRET_KEY environment variable must be set.")
 
+# Keys the permutation that turns tracking ID counter values into public IDs
+# (see packages.tracking_ids). Keep it secret, and fixed once IDs have been
+# issued: changing it re-maps the counter, so new IDs could collide with old.
+TRACKING_ID_SECRET = os.getenv("TRACKING_ID_SECRET") or SECRET_KEY
+
 DEBUG = env_bool("DEBUG", False)
 
 ALLOWED_HOSTS = env_hosts("ALLOWED_HOSTS")
@@ -152,6 +158,31 @@ STATIC_URL = "static/"
 MEDIA_URL = "/uploads/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "Uploads")
 
+# Package photos are staged here during submission and moved to media storage
+# by a background worker: "thread" runs it in-process after the request,
+# "queue" leaves it for `manage.py process_package_photos`.
+PACKAGE_PHOTO_STAGING_ROOT = os.getenv(
+    "PACKAGE_PHOTO_STAGING_ROOT", os.path.join(BASE_DIR, "photo_staging")
+)
+PACKAGE_PHOTO_PROCESSING = os.getenv("PACKAGE_PHOTO_PROCESSING", "thread")
+PACKAGE_PHOTO_WORKERS = int(os.getenv("PACKAGE_PHOTO_WORKERS", "2"))
+PACKAGE_PHOTO_MAX_DIMENSION = int(os.getenv("PACKAGE_PHOTO_MAX_DIMENSION", "1600"))
+PACKAGE_PHOTO_THUMBNAIL_SIZE = int(os.getenv("PACKAGE_PHOTO_THUMBNAIL_SIZE", "320"))
+# Failed photos are retried with exponential backoff starting at
+# PACKAGE_PHOTO_RETRY_DELAY seconds, then marked failed and their staged
+# file deleted.
+PACKAGE_PHOTO_MAX_ATTEMPTS = int(os.getenv("PACKAGE_PHOTO_MAX_ATTEMPTS", "3"))
+PACKAGE_PHOTO_RETRY_DELAY = int(os.getenv("PACKAGE_PHOTO_RETRY_DELAY", "60"))
+PROFILE_PICTURE_MAX_DIMENSION = int(os.getenv("PROFILE_PICTURE_MAX_DIMENSION", "512"))
+
+# Uploaded images (see senderplus_core.images): reject anything whose header
+# declares more pixels than this, and anything that would still decode to
+# more than the second limit after JPEG draft-mode downscaling.
+IMAGE_UPLOAD_MAX_PIXELS = int(os.getenv("IMAGE_UPLOAD_MAX_PIXELS", "50000000"))
+IMAGE_UPLOAD_MAX_DECODED_PIXELS = int(
+    os.getenv("IMAGE_UPLOAD_MAX_DECODED_PIXELS", "16000000")
+)
+
 CLOUDINARY_STORAGE = {
     "CLOUD_NAME": os.getenv("CLOUDINARY_CLOUD_NAME", "").strip(),
     "API_KEY": os.getenv("CLOUDINARY_API_KEY", "").strip(),
@@ -164,12 +195,85 @@ if USE_CLOUDINARY_STORAGE:
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION", "senderplus"),
+    }
+}
+
+# The /track payload cache, and the version checks live-tracking streams use
+# to see other workers' changes, need a cache all workers share (e.g. Redis).
+# With a per-process backend payloads are not cached and streams re-read the
+# package instead.
+TRACKING_CACHE_ENABLED = env_bool(
+    "TRACKING_CACHE_ENABLED",
+    not CACHES["default"]["BACKEND"].endswith(("LocMemCache", "DummyCache")),
+)
+# Seconds a rendered /track payload stays cached (it is also invalidated on
+# every save/status change), seconds an unknown tracking ID's 404 is cached,
+# and how long concurrent misses wait on the request that is already
+# rendering it.
+TRACKING_CACHE_TIMEOUT = int(os.getenv("TRACKING_CACHE_TIMEOUT", "300"))
+TRACKING_CACHE_MISSING_TIMEOUT = int(os.getenv("TRACKING_CACHE_MISSING_TIMEOUT", "30"))
+TRACKING_CACHE_LOCK_TIMEOUT = int(os.getenv("TRACKING_CACHE_LOCK_TIMEOUT", "5"))
+# s-maxage advertised to CDNs/shared caches for /track responses.
+TRACKING_CDN_MAX_AGE = int(os.getenv("TRACKING_CDN_MAX_AGE", "15"))
+# Seconds between keep-alives on /track/<id>/events streams; also how often a
+# stream checks for status changes made by other worker processes, and how
+# long the long poll that stands in for a stream under WSGI waits.
+TRACKING_STREAM_HEARTBEAT = int(os.getenv("TRACKING_STREAM_HEARTBEAT", "15"))
+# Most packages accepted by one POST /submit-packages/bulk request.
+BULK_SUBMISSION_MAX_ROWS = int(os.getenv("BULK_SUBMISSION_MAX_ROWS", "500"))
+# Most tracking IDs accepted by one POST /track/batch request.
+TRACKING_BATCH_MAX_IDS = int(os.getenv("TRACKING_BATCH_MAX_IDS", "300"))
+# Seconds a POST /submit-package response is replayed for retries that send
+# the same Idempotency-Key header.
+IDEMPOTENCY_KEY_TTL = int(os.getenv("IDEMPOTENCY_KEY_TTL", "86400"))
+
+# Token-bucket limits ("count/period", period one of s, min, h, day) on
+# sign-in and the verification-code endpoints, per client IP, per submitted
+# username/email, and across all clients. Buckets live in the default cache.
+AUTH_THROTTLE_IP_RATE = os.getenv("AUTH_THROTTLE_IP_RATE", "20/min")
+AUTH_THROTTLE_IDENTIFIER_RATE = os.getenv("AUTH_THROTTLE_IDENTIFIER_RATE", "10/min")
+AUTH_THROTTLE_GLOBAL_RATE = os.getenv("AUTH_THROTTLE_GLOBAL_RATE", "300/min")
+
 EMAIL_BACKEND = os.getenv(
     "EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend"
 )
 DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", "no-reply@senderplus.app")
 
+# Outgoing mail is queued in accounts.OutboxEmail and sent by a dispatcher:
+# "thread" runs it in-process after the request commits, "queue" leaves it
+# for `manage.py dispatch_outbox --loop`. Failed sends are retried with
+# exponential backoff starting at EMAIL_OUTBOX_RETRY_DELAY seconds.
+EMAIL_OUTBOX_DISPATCH = os.getenv("EMAIL_OUTBOX_DISPATCH", "thread")
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv("EMAIL_OUTBOX_MAX_ATTEMPTS", "5"))
+EMAIL_OUTBOX_RETRY_DELAY = int(os.getenv("EMAIL_OUTBOX_RETRY_DELAY", "30"))
+
+# Seconds a trusted-device lookup stays cached (deletions invalidate it),
+# and how often each process writes buffered trusted-device last_used_at
+# times in one bulk UPDATE.
+TRUSTED_DEVICE_CACHE_TIMEOUT = int(os.getenv("TRUSTED_DEVICE_CACHE_TIMEOUT", "3600"))
+TRUSTED_DEVICE_USAGE_FLUSH_INTERVAL = int(os.getenv("TRUSTED_DEVICE_USAGE_FLUSH_INTERVAL", "60"))
+
+# Retention for `manage.py purge_expired`: verification codes are kept this
+# many hours past expiry, trusted devices are forgotten after this many days
+# unused, and sent/failed outbox emails are deleted after this many days.
+VERIFICATION_CODE_RETENTION_HOURS = int(os.getenv("VERIFICATION_CODE_RETENTION_HOURS", "24"))
+TRUSTED_DEVICE_RETENTION_DAYS = int(os.getenv("TRUSTED_DEVICE_RETENTION_DAYS", "90"))
+OUTBOX_EMAIL_RETENTION_DAYS = int(os.getenv("OUTBOX_EMAIL_RETENTION_DAYS", "30"))
+
 REST_FRAMEWORK = {
+    # Reverse proxies in front of the app that append to X-Forwarded-For;
+    # must match the deployment. Client IPs (for throttling) are read that
+    # many hops from the end of the header; 0 ignores the header, which any
+    # client can forge, and uses the socket address. Too low and every client
+    # shares the proxy's address (and its per-IP throttle bucket); too high
+    # and clients can choose their own.
+    "NUM_PROXIES": int(os.getenv("NUM_PROXIES", "0")),
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework.authentication.TokenAuthentication",
         "rest_framework.authentication.SessionAuthentication",
@@ -182,6 +286,9 @@ REST_FRAMEWORK = {
 
 CORS_ALLOW_ALL_ORIGINS = env_bool("CORS_ALLOW_ALL_ORIGINS", False)
 CORS_ALLOWED_ORIGINS = env_origins("CORS_ALLOWED_ORIGINS")
+# Retry-safe package submission (see packages.idempotency).
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key")
+CORS_EXPOSE_HEADERS = ["Idempotent-Replayed"]
 CSRF_TRUSTED_ORIGINS = env_origins("CSRF_TRUSTED_ORIGINS")
 
 SECURE_PROXY_SSL_HEADER = ("HTTP_X_FORWARDED_PROTO", "https")
@@ -1,4 +1,4 @@
-import React, { useEffect, useMemo, useState } from "react";
+import React, { useCallback, useEffect, useMemo, useState } from "react";
 import { useLocation, useNavigate } from "react-router-dom";
 import { useAuth } from "../authContext";
 import { apiFetch } from "../api";
@@ -56,6 +56,38 @@ const ProfilePage = () => {
   const [passwordMessage, setPasswordMessage] = useState(location.state?.passwordChanged ? "Password changed successfully." : "");
   const [passwordError, setPasswordError] = useState("");
 
+  const [packages, setPackages] = useState([]);
+  const [packagesCursor, setPackagesCursor] = useState(null);
+  const [packagesLoading, setPackagesLoading] = useState(false);
+  const [packagesError, setPackagesError] = useState("");
+
+  const loadPackages = useCallback(
+    async (cursor = null) => {
+      if (!token) return;
+      setPackagesLoading(true);
+      setPackagesError("");
+      try {
+        const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : "";
+        const res = await apiFetch(`/my-packages${query}`, {}, token);
+        const data = await res.json();
+        if (!res.ok) {
+          throw new Error(data?.detail || "Failed to load your packages.");
+        }
+        setPackages((prev) => (cursor ? [...prev, ...data.results] : data.results));
+        setPackagesCursor(data.next_cursor);
+      } catch (err) {
+        setPackagesError(err.message || "Failed to load your packages.");
+      } finally {
+        setPackagesLoading(false);
+      }
+    },
+    [token]
+  );
+
+  useEffect(() => {
+    loadPackages();
+  }, [loadPackages]);
+
   const hydrateForm = (data) => {
     setForm({
       first_name: data.first_name || "",
@@ -430,6 +462,51 @@ const ProfilePage = () => {
           )}
         </div>
 
+        <div className="mt-8 border-t border-slate-200/80 pt-6">
+          <h2 className="text-xl font-semibold text-slate-900">My packages</h2>
+          <p className="mt-1 text-sm text-slate-600">Packages you submitted while signed in.</p>
+
+          {packagesError && <div className="mb-3 mt-4 rounded-xl border border-rose-200 bg-rose-50 px-3 py-2 text-sm text-rose-700">{packagesError}</div>}
+
+          {packages.length === 0 && !packagesLoading && !packagesError ? (
+            <p className="mt-4 text-sm text-slate-500">No packages yet.</p>
+          ) : (
+            <ul className="mt-4 divide-y divide-slate-200/80 rounded-2xl border border-slate-200/80 bg-white/70">
+              {packages.map((pkg) => (
+                <li key={pkg.tracking_id} className="flex flex-col gap-1 px-4 py-3 md:flex-row md:items-center md:justify-between">
+                  <div>
+                    <button
+                      type="button"
+                      onClick={() => navigate("/track", { state: { trackingId: pkg.tracking_id } })}
+                      className="font-mono text-sm font-semibold text-slate-900 underline underline-offset-4 transition hover:text-slate-600"
+                    >
+                      {pkg.tracking_id}
+                    </button>
+                    <p className="text-sm text-slate-600">
+                      {pkg.package_name} to {pkg.recipient_name}
+                    </p>
+                  </div>
+                  <div className="text-sm text-slate-600 md:text-right">
+                    <p>{pkg.status_display}</p>
+                    <p className="text-xs text-slate-500">{new Date(pkg.created_at).toLocaleDateString()}</p>
+                  </div>
+                </li>
+              ))}
+            </ul>
+          )}
+
+          {packagesCursor && (
+            <button
+              type="button"
+              onClick={() => loadPackages(packagesCursor)}
+              disabled={packagesLoading}
+              className="mt-4 rounded-xl border border-slate-200 bg-white/75 px-4 py-2 text-sm font-medium text-slate-700 transition hover:bg-slate-50 disabled:opacity-70"
+            >
+              {packagesLoading ? "Loading..." : "Load more"}
+            </button>
+          )}
+        </div>
+
         <div className="mt-8 border-t border-slate-200/80 pt-6">
           <h2 className="text-xl font-semibold text-slate-900">Change password</h2>
           <p className="mt-1 text-sm text-slate-600">Request a one-time code before changing your password.</p>
@@ -1,8 +1,9 @@
 // src/pages/SubmitPage.jsx
-import React, { useState } from "react";
+import React, { useRef, useState } from "react";
 import { useNavigate } from "react-router-dom";
 
-import { API_BASE_URL } from "../api";
+import { apiFetch } from "../api";
+import { useAuth } from "../authContext";
 import SettingsMenu from "../components/SettingsMenu";
 
 // Helper: format phone as (000) 000-0000 and strip non-digits
@@ -16,8 +17,14 @@ const formatPhoneNumber = (value) => {
   return `(${digits.slice(0, 3)}) ${digits.slice(3, 6)}-${digits.slice(6)}`;
 };
 
+const newIdempotencyKey = () =>
+  typeof crypto !== "undefined" && crypto.randomUUID
+    ? crypto.randomUUID()
+    : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+
 const SubmitPage = () => {
   const navigate = useNavigate();
+  const { token } = useAuth();
 
   const [formData, setFormData] = useState({
     senderName: "",
@@ -38,10 +45,14 @@ const SubmitPage = () => {
 
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState("");
+  // Reused when the same form is re-sent after a network failure, so the
+  // server can tell a retry from a second package.
+  const idempotencyKey = useRef(null);
 
   // Handle all input changes (including file + phone formatting)
   const handleChange = (e) => {
     const { name, value, files, type } = e.target;
+    idempotencyKey.current = null;
 
     if (type === "file") {
       setFormData((prev) => ({
@@ -72,6 +83,9 @@ const SubmitPage = () => {
     e.preventDefault();
     setError("");
     setLoading(true);
+    if (!idempotencyKey.current) {
+      idempotencyKey.current = newIdempotencyKey();
+    }
 
     try {
       const data = new FormData();
@@ -106,10 +120,17 @@ const SubmitPage = () => {
         data.append("photo", formData.photo);
       }
 
-      const response = await fetch(`${API_BASE_URL}/submit-package`, {
-        method: "POST",
-        body: data,
-      });
+      // Signed-in senders send their token so the package shows up on
+      // their profile.
+      const response = await apiFetch(
+        "/submit-package",
+        {
+          method: "POST",
+          body: data,
+          headers: { "Idempotency-Key": idempotencyKey.current },
+        },
+        token
+      );
 
       if (!response.ok) {
         const errorText = await response.text();
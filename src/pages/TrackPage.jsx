@@ -1,5 +1,5 @@
 // src/pages/TrackPage.jsx
-import React, { useState } from "react";
+import React, { useEffect, useState } from "react";
 import { useLocation, useNavigate } from "react-router-dom";
 
 import { API_BASE_URL, apiFetch } from "../api";
@@ -25,6 +25,31 @@ const TrackPage = () => {
   const [advancing, setAdvancing] = useState(false);
   const [error, setError] = useState("");
 
+  const streamTrackingId = pkg?.tracking_id;
+  const streamStatus = pkg?.status;
+
+  // Follow live status changes instead of polling; the server closes the
+  // stream once the package is delivered.
+  useEffect(() => {
+    if (!streamTrackingId || streamStatus === "delivered" || typeof EventSource === "undefined") {
+      return undefined;
+    }
+    const source = new EventSource(`${API_BASE_URL}/track/${streamTrackingId}/events`);
+    source.addEventListener("status", async (event) => {
+      const update = JSON.parse(event.data);
+      if (update.status === streamStatus) return;
+      try {
+        const res = await fetch(`${API_BASE_URL}/track/${streamTrackingId}`);
+        if (res.ok) {
+          setPkg(await res.json());
+        }
+      } catch (err) {
+        console.error("Live update error:", err);
+      }
+    });
+    return () => source.close();
+  }, [streamTrackingId, streamStatus]);
+
   const goHome = () => navigate("/home");
   const goAccount = () => navigate("/profile");
 
@@ -74,10 +99,19 @@ const TrackPage = () => {
     try {
       const res = await apiFetch(
         `/advance-status/${pkg.tracking_id}`,
-        { method: "POST" },
+        {
+          method: "POST",
+          headers: { "Content-Type": "application/json" },
+          body: JSON.stringify({ expected_status: pkg.status }),
+        },
         token
       );
       if (!res.ok) {
+        if (res.status === 409) {
+          const conflict = await res.json();
+          setPkg(conflict.package);
+          throw new Error("This package was updated by someone else. Review the latest status and try again.");
+        }
         const txt = await res.text();
         console.error("Advance status error:", res.status, txt);
         if (res.status === 401 || res.status === 403) {
@@ -178,6 +212,7 @@ const TrackPage = () => {
                   <ol className="space-y-2">
                     {STATUS_STEPS.map((step, index) => {
                       const reached = index <= currentStatusIndex;
+                      const event = (pkg.timeline || []).filter((entry) => entry.status_display === step).pop();
                       return (
                         <li key={step} className="flex items-start gap-3 text-sm">
                           <div
@@ -187,7 +222,14 @@ const TrackPage = () => {
                           >
                             {reached && <span className="text-[10px] text-white">✓</span>}
                           </div>
-                          <span className={reached ? "font-medium text-slate-900" : "text-slate-400"}>{step}</span>
+                          <span className={reached ? "font-medium text-slate-900" : "text-slate-400"}>
+                            {step}
+                            {event && (
+                              <span className="block text-xs font-normal text-slate-500">
+                                {new Date(event.created_at).toLocaleString()}
+                              </span>
+                            )}
+                          </span>
                         </li>
                       );
                     })}